@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark combining module environments with and without the ActivationCache.
+
+Each iteration creates fresh Module objects, like a new process activating
+the same modules would.
+
+Usage:
+    python benchmarks/bench_activation.py [--modules 20] [--vars 10] [--repeat 5]
+"""
+
+# Standard library imports
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Local imports
+import cpenv  # noqa: E402
+from cpenv.activation_cache import ActivationCache  # noqa: E402
+
+
+def make_modules(where, count, var_count):
+    """Create modules with a handful of environment variables each."""
+
+    module_paths = []
+    for i in range(count):
+        environment = {"MODULE_%d_ROOT" % i: "$MODULE"}
+        for j in range(var_count):
+            environment["SHARED_PATH_%d" % j] = ["$MODULE/lib/%d" % j]
+        module = cpenv.create(
+            where=os.path.join(where, "module_%d-1.0.0" % i),
+            name="module_%d" % i,
+            version="1.0.0",
+            environment=environment,
+        )
+        module_paths.append(module.path)
+
+    # Age module.yml files so they are not considered racy
+    for path in module_paths:
+        config_path = os.path.join(path, "module.yml")
+        stat = os.stat(config_path)
+        os.utime(config_path, (stat.st_atime - 60, stat.st_mtime - 60))
+
+    return module_paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--modules", type=int, default=20)
+    parser.add_argument("--vars", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="cpenv_bench_activation_")
+    try:
+        module_paths = make_modules(
+            os.path.join(root, "modules"),
+            args.modules,
+            args.vars,
+        )
+        uncached = cpenv.Activator(cache=False)
+        cached = cpenv.Activator(cache=ActivationCache(os.path.join(root, "cache")))
+
+        def combine(activator):
+            modules = [cpenv.Module(path) for path in module_paths]
+            return activator.combine_modules(modules)
+
+        assert combine(uncached) == combine(cached) == combine(cached)
+
+        print("modules: %d, vars per module: %d" % (args.modules, args.vars + 1))
+        for label, activator in [("uncached", uncached), ("cached", cached)]:
+            number = 20
+            best = min(
+                timeit.repeat(
+                    lambda: combine(activator),
+                    number=number,
+                    repeat=args.repeat,
+                )
+            )
+            milliseconds = best / number * 1000
+            print("%-10s best of %d: %7.2f ms" % (label, args.repeat, milliseconds))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark copying a module with many small files via LocalRepo.download.
+
+Compares the previous implementation, which walked the module twice and
+copied one file at a time, to the single scan and threaded copy.
+
+Threads only pay off when copies are latency bound, which is why
+CPENV_COPY_WORKERS defaults to 1. Compare --workers 1 and --workers 8 with
+--dir pointing at a network filesystem to choose a value for a share.
+
+Usage:
+    python benchmarks/bench_copy.py [--files 20000] [--workers 8] [--repeat 3]
+"""
+
+# Standard library imports
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Local imports
+import cpenv  # noqa: E402
+from cpenv import paths  # noqa: E402
+
+
+def make_module(where, file_count):
+    """Create a module with file_count small files spread over directories."""
+
+    module = cpenv.create(where=where, name="bigmod", version="1.0.0")
+    for i in range(file_count):
+        folder = os.path.join(where, "lib", "pkg_%d" % (i // 500), "sub_%d" % (i % 5))
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        with open(os.path.join(folder, "file_%d.py" % i), "w") as f:
+            f.write("# %d\n" % i * 16)
+    return module
+
+
+def legacy_copy(src, dst):
+    """The copy loop LocalRepo.download used before the threaded copy."""
+
+    size = paths.get_folder_size(src)
+    copied = 0
+    for root, _, files in paths.exclusive_walk(src):
+        for file in files:
+            src_path = os.path.join(root, file)
+            rel_path = os.path.relpath(src_path, src)
+            dst_path = os.path.join(dst, rel_path)
+
+            if os.path.islink(src_path):
+                continue
+
+            dst_dir = os.path.dirname(dst_path)
+            if not os.path.isdir(dst_dir):
+                os.makedirs(dst_dir)
+
+            shutil.copy2(src_path, dst_path)
+            copied += os.path.getsize(src_path)
+    assert copied == size
+
+
+def best_of(repeat, func, dst):
+    times = []
+    for _ in range(repeat):
+        if os.path.isdir(dst):
+            shutil.rmtree(dst)
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=20000)
+    parser.add_argument("--workers", type=int, default=paths.get_copy_workers())
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--dir", help="Parent directory, like an NFS mount")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="cpenv_bench_copy_", dir=args.dir)
+    try:
+        repo = cpenv.RemoteRepo("bench", os.path.join(root, "repo"))
+        make_module(repo.relative_path("bigmod-1.0.0"), args.files)
+        module_spec = repo.find("bigmod")[0]
+        dst = os.path.join(root, "dst")
+        os.environ["CPENV_COPY_WORKERS"] = str(args.workers)
+
+        legacy = best_of(args.repeat, lambda: legacy_copy(module_spec.path, dst), dst)
+        current = best_of(
+            args.repeat,
+            lambda: repo.download(module_spec, dst, overwrite=True),
+            dst,
+        )
+
+        print("files: %d, workers: %d" % (args.files, args.workers))
+        print("legacy best of %d:   %7.2f s" % (args.repeat, legacy))
+        print("download best of %d: %7.2f s" % (args.repeat, current))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark the time it takes to import cpenv using python -X importtime.
+
+Each sample runs a fresh interpreter with an empty CPENV_HOME. Use --max-ms
+as a regression guard, the script exits with status 1 when the median import
+time exceeds it.
+
+Usage:
+    python benchmarks/bench_import.py [--repeat 20] [--max-ms 0]
+"""
+
+# Standard library imports
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+importtime_pattern = re.compile(
+    r"^import time:\s+\d+ \|\s+(?P<cumulative>\d+) \| cpenv$"
+)
+
+
+def import_time(env):
+    """Return the cumulative import time of cpenv in milliseconds."""
+
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import cpenv"],
+        env=env,
+        cwd=env["CPENV_HOME"],
+        stderr=subprocess.PIPE,
+        check=True,
+    ).stderr.decode("utf-8")
+    for line in output.splitlines():
+        match = importtime_pattern.match(line)
+        if match:
+            return int(match.group("cumulative")) / 1000.0
+    raise RuntimeError("cpenv missing from importtime output:\n" + output)
+
+
+def first_use_time(env):
+    """Return the wall time of importing cpenv and calling get_repos."""
+
+    script = "import cpenv; cpenv.get_repos()"
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-c", script],
+        env=env,
+        cwd=env["CPENV_HOME"],
+        check=True,
+    )
+    return (time.perf_counter() - start) * 1000.0
+
+
+def report(label, samples):
+    samples = sorted(samples)
+    print(
+        "%-26s min: %7.2f ms  median: %7.2f ms"
+        % (label, samples[0], samples[len(samples) // 2])
+    )
+    return samples[len(samples) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--max-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    home = tempfile.mkdtemp(prefix="cpenv_bench_import_")
+    env = dict(os.environ, CPENV_HOME=home, PYTHONPATH=root)
+    env.pop("CPENV_ACTIVE_MODULES", None)
+    try:
+        median = report(
+            "import cpenv",
+            [import_time(env) for _ in range(args.repeat)],
+        )
+        report(
+            "import + get_repos (wall)",
+            [first_use_time(env) for _ in range(args.repeat)],
+        )
+    finally:
+        shutil.rmtree(home)
+
+    if args.max_ms and median > args.max_ms:
+        print("FAIL: median import time exceeds %.2f ms" % args.max_ms)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark merging many module environments into a large base environment.
+
+Each module prepends to PATH, appends to PYTHONPATH and sets a variable of its
+own, like the modules of a typical DCC environment. join_dicts merges every
+variable of the base environment while env_delta, used by set_env, only
+merges the variables the modules touch.
+
+Usage:
+    python benchmarks/bench_mappings.py [--modules 100] [--paths 5] [--repeat 5]
+"""
+
+# Standard library imports
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Local imports
+from cpenv import mappings  # noqa: E402
+
+
+def make_base_env(path_count, var_count):
+    """Return an environment like os.environ with a long PATH."""
+
+    env = {"PATH": ["/base/bin/%d" % i for i in range(path_count)]}
+    for i in range(var_count):
+        env["BASE_VAR_%d" % i] = "value_%d" % i
+    return env
+
+
+def make_module_envs(count, path_count):
+    """Return a module environment for each module."""
+
+    envs = []
+    for i in range(count):
+        envs.append(
+            {
+                "MODULE_%d_ROOT" % i: "/modules/module_%d" % i,
+                "PATH": [
+                    "/modules/module_%d/bin/%d" % (i, j) for j in range(path_count)
+                ],
+                "PYTHONPATH": {
+                    "append": [
+                        "/modules/module_%d/python/%d" % (i, j)
+                        for j in range(path_count)
+                    ]
+                },
+            }
+        )
+    return envs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--modules", type=int, default=100)
+    parser.add_argument("--paths", type=int, default=5)
+    parser.add_argument("--base-paths", type=int, default=500)
+    parser.add_argument("--base-vars", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    base_env = make_base_env(args.base_paths, args.base_vars)
+    module_envs = make_module_envs(args.modules, args.paths)
+
+    result = mappings.join_dicts(base_env, *module_envs)
+    expected_paths = args.base_paths + args.modules * args.paths
+    assert len(result["PATH"]) == expected_paths
+
+    print(
+        "modules: %d, base PATH entries: %d, merged PATH entries: %d"
+        % (args.modules, args.base_paths, expected_paths)
+    )
+    # env_delta applies module environments to an environment like os.environ
+    env = mappings.dict_to_env(base_env)
+    benchmarks = [
+        ("join_dicts", lambda: mappings.join_dicts(base_env, *module_envs)),
+        ("env_delta", lambda: mappings.env_delta(*module_envs, env=env)),
+    ]
+    for label, func in benchmarks:
+        number = 10
+        best = min(timeit.repeat(func, number=number, repeat=args.repeat))
+        milliseconds = best / number * 1000
+        print("%-10s best of %d: %7.2f ms" % (label, args.repeat, milliseconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark transitive dependency resolution on a synthetic repo graph.
+
+Usage:
+    python benchmarks/bench_resolver.py [--modules 80] [--versions 10] [--skew 0.1]
+        [--latency 0]
+
+Set CPENV_DISABLE_FANOUT=1 to compare against sequential repo queries.
+"""
+
+# Standard library imports
+import argparse
+import os
+import random
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Local imports
+from cpenv import Repo, Resolver  # noqa: E402
+from cpenv.module import ModuleSpec, ModuleSpecIndex  # noqa: E402
+from cpenv.versions import parse_version  # noqa: E402
+
+
+class MemoryRepo(Repo):
+    """A Repo holding a synthetic graph of ModuleSpecs in memory."""
+
+    def __init__(self, name, graph, latency=0):
+        super(MemoryRepo, self).__init__(name)
+        self.path = name
+        self.graph = graph
+        self.latency = latency
+        self.queries = 0
+        specs = []
+        for qual_name in graph:
+            module_name, version = qual_name.rsplit("-", 1)
+            specs.append(
+                ModuleSpec(
+                    name=module_name,
+                    qual_name=qual_name,
+                    version=parse_version(version),
+                    path=name + "/" + qual_name,
+                    repo=self,
+                )
+            )
+        self.index = ModuleSpecIndex(specs)
+
+    def round_trip(self):
+        self.queries += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def find(self, requirement):
+        self.round_trip()
+        return self.index.find(requirement)
+
+    def find_many(self, requirements):
+        self.round_trip()
+        return [self.index.find(requirement) for requirement in requirements]
+
+    def get_requires(self, module_spec):
+        return self.graph[module_spec.qual_name]
+
+
+def module_name(index):
+    """Return a name that can't be mistaken for a version.
+
+    Digits and trailing "v" characters are treated as part of a version by
+    parse_module_requirement.
+    """
+
+    letters = "abcdefghijklmnopqrstuwxyz"
+    size = len(letters)
+    return "mod_" + "".join(
+        [
+            letters[index // size // size % size],
+            letters[index // size % size],
+            letters[index % size],
+        ]
+    )
+
+
+def make_graph(module_count, version_count, max_requires, skew, seed=0):
+    """Generate a layered dependency graph.
+
+    Module N only depends on modules with a lower index, which creates deep
+    dependency chains. Like real release waves, version V of a module
+    usually requires a version close to V of its dependencies. A fraction of
+    requirements, set by skew, ask for a random minimum version instead so
+    that the resolver has to backtrack.
+    """
+
+    rng = random.Random(seed)
+    graph = {}
+    for index in range(module_count):
+        name = module_name(index)
+        for version in range(1, version_count + 1):
+            requires = []
+            if index:
+                deps = rng.sample(range(index), min(index, max_requires))
+                if index > 1 and 0 not in deps:
+                    deps.append(0)
+                for dep in deps:
+                    if rng.random() < skew:
+                        min_version = rng.randint(1, version_count)
+                    else:
+                        min_version = max(1, version - rng.randint(0, 2))
+                    requires.append("%s-%d.0.0" % (module_name(dep), min_version))
+            graph["%s-%d.0.0" % (name, version)] = requires
+    return graph
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--modules", type=int, default=80)
+    parser.add_argument("--versions", type=int, default=10)
+    parser.add_argument("--requires", type=int, default=4)
+    parser.add_argument("--skew", type=float, default=0.1)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0,
+        help="Milliseconds added to each query of the slow remote repos.",
+    )
+    args = parser.parse_args()
+
+    graph = make_graph(args.modules, args.versions, args.requires, args.skew)
+    latency = args.latency / 1000.0
+    repos = [
+        MemoryRepo("site", graph),
+        MemoryRepo("remote_a", {}, latency),
+        MemoryRepo("remote_b", {}, latency),
+    ]
+    requirements = [module_name(args.modules - 1), module_name(args.modules // 2)]
+
+    resolved = Resolver(repos).resolve(requirements)
+    queries = sum(repo.queries for repo in repos)
+
+    for repo in repos:
+        repo.queries = 0
+    timer = timeit.Timer(lambda: Resolver(repos).resolve(requirements))
+    best = min(timer.repeat(repeat=args.repeat, number=1))
+
+    print("graph: %d modules x %d versions" % (args.modules, args.versions))
+    print("resolved: %d modules" % len(resolved))
+    print("repo round trips: %d (%d repos)" % (queries, len(repos)))
+    print("best of %d: %.2f ms" % (args.repeat, best * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Count ShotgunRepo round trips while resolving an environment using Mockgun.
+
+Compares ShotgunRepo.find_many against the default Repo.find_many, which
+calls find once per requirement.
+
+Usage:
+    python benchmarks/bench_shotgun.py [--modules 30] [--versions 5]
+"""
+
+# Standard library imports
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Local imports
+from cpenv import Repo, Resolver, ShotgunRepo  # noqa: E402
+from tests.utils import make_mockgun  # noqa: E402
+
+
+def module_name(index):
+    letters = "abcdefghijklmnopqrstuwxyz"
+    return "mod_" + letters[index // len(letters)] + letters[index % len(letters)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--modules", type=int, default=30)
+    parser.add_argument("--versions", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    try:
+        sg = make_mockgun(tmp, "CustomNonProjectEntity01")
+        repo = ShotgunRepo("mockgun", api=sg)
+        for index in range(args.modules):
+            for version in range(1, args.versions + 1):
+                sg.create(
+                    repo.module_entity,
+                    {"code": module_name(index), "sg_version": "%d.0.0" % version},
+                )
+
+        requirements = [
+            "%s-%d.0.0" % (module_name(i), i % args.versions + 1)
+            for i in range(args.modules)
+        ]
+
+        def resolve():
+            repo.clear_cache()
+            Resolver([repo], resolve_requires=False).resolve(requirements)
+
+        print("environment: %d requirements" % len(requirements))
+        for label, find_many in [
+            ("Repo.find_many", Repo.find_many),
+            ("ShotgunRepo.find_many", ShotgunRepo.find_many),
+        ]:
+            repo.find_many = find_many.__get__(repo)
+            sg.finds = 0
+            resolve()
+            round_trips = sg.finds
+            best = min(timeit.Timer(resolve).repeat(repeat=args.repeat, number=1))
+            print(
+                "%-22s round trips: %-4d best of %d: %.2f ms"
+                % (label, round_trips, args.repeat, best * 1000)
+            )
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    main()
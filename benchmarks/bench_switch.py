@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark switching between two sets of modules in the same process.
+
+Both sets share half of their modules. Each iteration switches from one set
+to the other and back.
+
+Usage:
+    python benchmarks/bench_switch.py [--modules 40] [--vars 10] [--repeat 5]
+"""
+
+# Standard library imports
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Local imports
+import cpenv  # noqa: E402
+
+
+def make_modules(where, names, var_count):
+    """Create modules with a handful of environment variables each."""
+
+    for name in names:
+        environment = {name.upper() + "_ROOT": "$MODULE"}
+        for j in range(var_count):
+            environment["SHARED_PATH_%d" % j] = ["$MODULE/lib/%d" % j]
+        module = cpenv.create(
+            where=os.path.join(where, name + "-1.0.0"),
+            name=name,
+            version="1.0.0",
+            environment=environment,
+        )
+
+        # Age module.yml files so they are not considered racy
+        stat = os.stat(module.config_path)
+        os.utime(module.config_path, (stat.st_atime - 60, stat.st_mtime - 60))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--modules", type=int, default=40)
+    parser.add_argument("--vars", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="cpenv_bench_switch_")
+    try:
+        cpenv.set_home_path(root)
+        for repo in cpenv.get_repos():
+            if repo.name not in ["home", "user"]:
+                cpenv.remove_repo(repo)
+
+        shared = ["shared_%d_module" % i for i in range(args.modules // 2)]
+        set_a = shared + ["a_%d_module" % i for i in range(args.modules // 2)]
+        set_b = shared + ["b_%d_module" % i for i in range(args.modules // 2)]
+        names = shared + set_a[len(shared) :] + set_b[len(shared) :]
+        make_modules(cpenv.get_home_modules_path(), names, args.vars)
+
+        cpenv.activate(set_a)
+
+        def switch():
+            cpenv.switch(set_b)
+            cpenv.switch(set_a)
+
+        print("modules: %d, shared: %d" % (args.modules, len(shared)))
+        number = 5
+        best = min(timeit.repeat(switch, number=number, repeat=args.repeat))
+        milliseconds = best / (number * 2) * 1000
+        print("switch best of %d: %7.2f ms" % (args.repeat, milliseconds))
+    finally:
+        cpenv.deactivate()
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark parsing and sorting version strings.
+
+Usage:
+    python benchmarks/bench_versions.py [--count 100000] [--repeat 5]
+"""
+
+# Standard library imports
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Local imports
+from cpenv import versions  # noqa: E402
+
+
+def make_version_strings(count, seed=0):
+    """Generate a mix of the version formats supported by parse_version."""
+
+    rng = random.Random(seed)
+
+    def semver():
+        return "%d.%d.%d" % (rng.randint(0, 30), rng.randint(0, 30), rng.randint(0, 99))
+
+    formats = [
+        semver,
+        lambda: "v%s-%s" % (semver(), rng.choice(["alpha", "beta.1", "rc.2", "dev"])),
+        lambda: "%s+b%d" % (semver(), rng.randint(0, 9)),
+        lambda: "%s.%d" % (semver(), rng.randint(0, 999)),
+        lambda: "%d.%dv%d" % (rng.randint(9, 14), rng.randint(0, 5), rng.randint(1, 9)),
+        lambda: "v%d" % rng.randint(0, 99),
+        lambda: "%d.%d" % (rng.randint(0, 30), rng.randint(0, 30)),
+    ]
+    return ["module_%d-%s" % (i % 500, rng.choice(formats)()) for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    strings = make_version_strings(args.count)
+
+    def parse():
+        versions._parse_version.cache_clear()
+        return [versions.parse_version(string) for string in strings]
+
+    parsed = parse()
+
+    def sort():
+        # Copy the Versions so sort keys are computed within the benchmark
+        fresh = [versions.Version(*version) for version in parsed]
+        return sorted(fresh)
+
+    def sort_warm():
+        return sorted(parsed)
+
+    def sort_by_key():
+        return sorted(parsed, key=lambda version: version.sort_key)
+
+    print("versions: %d (%d unique)" % (len(strings), len(set(strings))))
+    for label, func in [
+        ("parse", parse),
+        ("sort (new Versions)", sort),
+        ("sort (cached keys)", sort_warm),
+        ("sort by sort_key", sort_by_key),
+    ]:
+        best = min(timeit.Timer(func).repeat(repeat=args.repeat, number=1))
+        print("%-20s best of %d: %.2f ms" % (label, args.repeat, best * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -22,7 +22,5 @@ from . import compat
 from . import mappings
 
 
-# Initialize cpenv
+# cpenv is initialized lazily on first use, see api._init
 from .api import _init
-
-_init()
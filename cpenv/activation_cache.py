@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent on-disk cache of the combined environments of activated modules.
+"""
+
+# Standard library imports
+import hashlib
+import json
+import logging
+import os
+import sys
+
+# Local imports
+from . import __version__, compat, paths
+
+__all__ = [
+    "ActivationCache",
+    "activation_cache_enabled",
+]
+_log = logging.getLogger(__name__)
+
+
+def activation_cache_enabled():
+    """Check if the activation cache is enabled via CPENV_ENABLE_ACTIVATION_CACHE."""
+
+    try:
+        return bool(int(os.getenv("CPENV_ENABLE_ACTIVATION_CACHE", 0)))
+    except Exception:
+        return False
+
+
+class ActivationCache(object):
+    """A cache of combined module environments shared by all processes.
+
+    Each entry is a json file in $CPENV_HOME/cache/activation named by a hash
+    of the ordered module paths, the mtime and size of each module.yml, the
+    platform and the python version. A hit skips reading, templating and
+    joining every module.yml.
+
+    Entries are written atomically so concurrent readers only ever see a
+    complete entry or no entry. Modules whose module.yml has a racy mtime,
+    see paths.is_racy, are not cached.
+
+    The least recently used entries are removed when there are more than
+    max_entries.
+
+    Arguments:
+        path (str): Optional path to the cache directory. Defaults to
+            $CPENV_HOME/cache/activation.
+    """
+
+    version = 1
+    max_entries = 256
+
+    def __init__(self, path=None):
+        self._path = path
+
+    @property
+    def path(self):
+        if self._path is None:
+            from .api import get_cache_path
+
+            self._path = get_cache_path("activation")
+        return self._path
+
+    def key(self, modules):
+        """Return a cache key for a list of Modules or None if they can not be
+        cached.
+        """
+
+        parts = [
+            str(self.version),
+            __version__,
+            compat.platform,
+            "%s.%s" % sys.version_info[:2],
+        ]
+        for module in modules:
+            try:
+                stat = os.stat(module.config_path)
+            except OSError:
+                return None
+            if paths.is_racy(stat.st_mtime):
+                return None
+            parts.extend([module.path, str(stat.st_mtime_ns), str(stat.st_size)])
+
+        blob = "\n".join(parts).encode("utf-8")
+        return hashlib.sha1(blob).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.path, key + ".json")
+
+    def get(self, key):
+        """Return the cached environment for a key or None."""
+
+        entry_path = self.entry_path(key)
+        try:
+            with open(entry_path, "r") as f:
+                data = json.load(f)
+        except (OSError, IOError, ValueError):
+            return None
+
+        if not isinstance(data, dict) or data.get("key") != key:
+            return None
+
+        # Mark the entry as recently used
+        try:
+            os.utime(entry_path, None)
+        except OSError:
+            pass
+
+        return data.get("environment", None)
+
+    def set(self, key, environment):
+        """Atomically write an environment to the cache."""
+
+        entry_path = self.entry_path(key)
+        try:
+            paths.write_json(entry_path, {"key": key, "environment": environment})
+        except (OSError, IOError) as e:
+            _log.debug("Failed to write activation cache %s: %s", entry_path, e)
+            return
+
+        self.prune()
+
+    def prune(self):
+        """Remove the least recently used entries over max_entries."""
+
+        try:
+            entries = [e for e in os.scandir(self.path) if e.name.endswith(".json")]
+        except OSError:
+            return
+
+        if len(entries) <= self.max_entries:
+            return
+
+        def last_used(entry):
+            try:
+                return entry.stat().st_mtime
+            except OSError:
+                return 0
+
+        entries.sort(key=last_used)
+        for entry in entries[: len(entries) - self.max_entries]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                continue
+
+    def clear(self):
+        """Remove all entries."""
+
+        try:
+            entries = list(os.scandir(self.path))
+        except OSError:
+            return
+
+        for entry in entries:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                continue
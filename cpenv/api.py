@@ -2,25 +2,40 @@
 from __future__ import absolute_import, print_function
 
 # Standard library imports
+import contextlib
 import os
+import sys
+import threading
 import warnings
 from bisect import bisect
 from collections import OrderedDict
 
 # Local imports
-from . import compat, hooks, paths, repos
-from .module import Module, ModuleSpec, module_header, sort_modules
-from .resolver import Activator, Copier, Localizer, ResolveError, Resolver
+from . import compat, export, hooks, lockfile, mappings, paths, repos
+from .module import Module, ModuleSpec, is_module, module_header, sort_modules
+from .resolver import (
+    Activator,
+    Copier,
+    Localizer,
+    Pending,
+    ResolveError,
+    Resolver,
+)
 from .vendor import appdirs, yaml
 
 __all__ = [
     "activate",
     "deactivate",
+    "switch",
     "clone",
     "create",
+    "export_env",
     "localize",
+    "lock",
+    "load_lockfile",
     "publish",
     "resolve",
+    "run",
     "set_home_path",
     "get_home_path",
     "get_home_modules_path",
@@ -32,6 +47,7 @@ __all__ = [
     "add_module_path",
     "get_active_modules",
     "add_active_module",
+    "batch_active_modules",
     "remove_active_module",
     "get_repos",
     "get_repo",
@@ -45,14 +61,25 @@ __all__ = [
 _registry = {
     "repos": OrderedDict(),
 }
-_active_modules = []
+_active_modules = OrderedDict()
+_active_modules_batch = {"depth": 0}
+_init_lock = threading.RLock()
+_init_state = {
+    "paths": None,
+    "repos": None,
+    "active_modules": None,
+}
 missing = object()
 
 
-def resolve(requirements, ignore_unresolved=False):
-    """Resolve a list of module requirements."""
+def resolve(requirements, ignore_unresolved=False, resolve_requires=True):
+    """Resolve a list of module requirements.
 
-    resolver = Resolver(get_repos())
+    Pass resolve_requires=False to resolve only the modules requested and not
+    the modules they require.
+    """
+
+    resolver = Resolver(get_repos(), resolve_requires)
     return resolver.resolve(requirements, ignore_unresolved)
 
 
@@ -72,22 +99,95 @@ def localize(requirements, to_repo="home", overwrite=False, ignore_unresolved=Fa
     return modules
 
 
-def activate(requirements, ignore_unresolved=False):
+def lock(requirements, path, ignore_unresolved=False):
+    """Resolve a list of module requirements and write them to a lockfile.
+
+    Usage:
+        >>> cpenv.lock(['moduleA', 'moduleB'], 'cpenv.lock')
+
+    Arguments:
+        requirements (List[str]): List of module requirements
+        path (str): Path to write the lockfile to
+
+    Returns:
+        list of ModuleSpecs written to the lockfile
+    """
+
+    resolver = Resolver(get_repos())
+    module_specs = resolver.resolve(requirements, ignore_unresolved)
+    lockfile.write_lockfile(path, module_specs, requirements)
+    return module_specs
+
+
+def export_env(
+    path,
+    requirements=None,
+    format=None,
+    ignore_unresolved=False,
+    lockfile=None,
+):
+    """Resolve a list of module requirements and write their environment to a
+    file that can be loaded without python.
+
+    Modules are localized, but not activated, so the exported paths exist on
+    this machine. Every variable the modules set is exported, independent of
+    the current environment. Values appended or prepended to list variables
+    like PATH are added to their value in the environment that loads the
+    export. A fingerprint of the requirements and modules is stored in the
+    file, use cpenv.export.is_stale to check if it is outdated.
+
+    Usage:
+        >>> cpenv.export_env('cpenv.sh', ['moduleA', 'moduleB'])
+        >>> cpenv.export_env('cpenv.json', lockfile='cpenv.lock')
+
+    Arguments:
+        path (str): Path to write the environment to
+        requirements (List[str]): List of module requirements
+        format (str): One of bash, zsh, fish, json or dotenv. Defaults to
+            the format matching the extension of path.
+        lockfile (str): Optional path to a lockfile created by cpenv.lock.
+
+    Returns:
+        the exported text
+    """
+
+    if lockfile:
+        module_specs = load_lockfile(lockfile)
+    else:
+        resolver = Resolver(get_repos())
+        module_specs = resolver.resolve(requirements, ignore_unresolved)
+
+    modules = Localizer(to_repo="home").localize(module_specs)
+    return export.write_export(path, modules, format, requirements)
+
+
+def activate(requirements=None, ignore_unresolved=False, lockfile=None):
     """Resolve and active a list of module requirements.
 
     Usage:
         >>> cpenv.activate('moduleA', 'moduleB')
+        >>> cpenv.activate(lockfile='cpenv.lock')
 
     Arguments:
         requirements (List[str]): List of module requirements
+        lockfile (str): Optional path to a lockfile created by cpenv.lock.
+            Locked modules are activated without resolving requirements.
 
     Returns:
         list of Module objects that have been activated
     """
 
-    # Resolve modules
-    resolver = Resolver(get_repos())
-    module_specs = resolver.resolve(requirements, ignore_unresolved)
+    if lockfile:
+        module_specs = load_lockfile(lockfile)
+    else:
+        # Skip resolving when all requirements are already active
+        active_modules = _find_active_modules(requirements)
+        if active_modules is not None:
+            return active_modules
+
+        # Resolve modules
+        resolver = Resolver(get_repos())
+        module_specs = resolver.resolve(requirements, ignore_unresolved)
 
     # Activate modules
     activator = Activator()
@@ -96,6 +196,55 @@ def activate(requirements, ignore_unresolved=False):
     return modules
 
 
+def run(command, requirements=None, ignore_unresolved=False, lockfile=None):
+    """Activate a list of module requirements and replace the current process
+    with a command.
+
+    The command is executed directly rather than through a shell, so running
+    a single executable costs no more than activating its modules. On Windows,
+    where processes can not be replaced, the command runs as a subprocess and
+    the current process exits with its returncode.
+
+    Usage:
+        >>> cpenv.run(['maya', '-batch'], ['moduleA', 'moduleB'])
+        >>> cpenv.run(['maya', '-batch'], lockfile='cpenv.lock')
+
+    Arguments:
+        command (List[str]): Executable and arguments to run
+        requirements (List[str]): List of module requirements
+        lockfile (str): Optional path to a lockfile created by cpenv.lock.
+            Locked modules are activated without resolving requirements.
+
+    Raises:
+        OSError when the command can not be executed.
+    """
+
+    if not command:
+        raise ValueError("Expected a command to run.")
+
+    activate(requirements, ignore_unresolved, lockfile)
+
+    # Buffered output is lost when the process is replaced
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    if compat.platform == "win":
+        import subprocess
+
+        sys.exit(subprocess.call(command))
+
+    os.execvp(command[0], command)
+
+
+def load_lockfile(path):
+    """Return the ModuleSpecs stored in a lockfile.
+
+    Locked modules that are already local are loaded without querying Repos.
+    """
+
+    return lockfile.load_lockfile(path, get_repos(), get_repo("home"))
+
+
 def activate_environment(environment):
     """Activate an environment by name.
 
@@ -109,23 +258,68 @@ def activate_environment(environment):
         list of Module objects that have been activated
     """
 
-    for repo in get_repos():
-        for env in repo.list_environments():
+    query = repos.RepoQuery(get_repos(), "list_environments")
+    for repo, environments in query:
+        for env in environments:
             if env.name == environment:
+                query.cancel()
                 return activate(env.requires)
     else:
         raise ResolveError("Failed to resolve Environment: %s" % environment)
 
 
 def deactivate():
-    """Deactivates an environment by restoring all env vars to a clean state
-    stored prior to activating environments
+    """Deactivate all modules activated in this process.
+
+    Environment variables changed by activating modules are restored to the
+    values they had before the first activation. Changes made by module
+    hooks are not reverted.
+    """
+
+    mappings.journal.revert()
+    _reset_active_modules()
+
+
+def switch(requirements=None, ignore_unresolved=False, lockfile=None):
+    """Switch from the modules activated in this process to a new list of
+    module requirements.
+
+    The result is the same as calling deactivate then activate, but only
+    environment variables whose values change are modified and activate
+    hooks only run for modules that were not already active.
+
+    Usage:
+        >>> cpenv.activate(['moduleA', 'moduleB'])
+        >>> cpenv.switch(['moduleA', 'moduleC'])
+
+    Arguments:
+        requirements (List[str]): List of module requirements
+        lockfile (str): Optional path to a lockfile created by cpenv.lock.
+            Locked modules are activated without resolving requirements.
+
+    Returns:
+        list of Module objects that are active after switching
     """
-    # TODO:
-    # Probably need to store a clean environment prior to activate.
-    # In practice it's uncommon to activate then deactivate in the same
-    # python session.
-    pass
+
+    if lockfile:
+        module_specs = load_lockfile(lockfile)
+    else:
+        resolver = Resolver(get_repos())
+        module_specs = resolver.resolve(requirements, ignore_unresolved)
+
+    activator = Activator()
+    modules = activator.localizer.localize(module_specs)
+    env = activator.combine_modules(modules)
+
+    previous_modules = list(get_active_modules())
+    mappings.switch_env(env)
+    _reset_active_modules()
+
+    for module in modules:
+        if module not in previous_modules:
+            module.activate()
+
+    return modules
 
 
 def create(where, name, version, **kwargs):
@@ -221,7 +415,7 @@ def clone(module, from_repo=None, where=None, overwrite=False):
 
     if not isinstance(module, (Module, ModuleSpec)):
         if from_repo is None:
-            resolver = Resolver(get_repos())
+            resolver = Resolver(get_repos(), resolve_requires=False)
             module_spec = resolver.resolve([module])[0]
         else:
             from_repo = get_repo(from_repo)
@@ -242,7 +436,7 @@ def publish(module, to_repo="home", overwrite=False):
     to_repo = get_repo(to_repo)
 
     if isinstance(module, compat.string_types):
-        resolver = Resolver(get_repos())
+        resolver = Resolver(get_repos(), resolve_requires=False)
         module = resolver.resolve([module])[0]
 
     if isinstance(module, ModuleSpec):
@@ -262,7 +456,7 @@ def copy(module, from_repo, to_repo, overwrite=False):
     to_repo = get_repo(to_repo)
 
     # Resolve module
-    resolver = Resolver([from_repo])
+    resolver = Resolver([from_repo], resolve_requires=False)
     module_spec = resolver.resolve([module])[0]
 
     copier = Copier(to_repo)
@@ -273,7 +467,8 @@ def copy(module, from_repo, to_repo, overwrite=False):
 def get_active_modules():
     """Returns a list of active :class:`Module` s"""
 
-    return _active_modules
+    _init_active_modules()
+    return list(_active_modules.values())
 
 
 def add_active_module(module):
@@ -283,11 +478,11 @@ def add_active_module(module):
         module (Module): Module to add to CPENV_ACTIVE_MODULES
     """
 
-    if module not in _active_modules:
-        _active_modules.append(module)
+    _init_active_modules()
+    _active_modules.setdefault(module.path, module)
 
-    module_names = os.pathsep.join([m.qual_name for m in _active_modules])
-    os.environ["CPENV_ACTIVE_MODULES"] = str(module_names)
+    if not _active_modules_batch["depth"]:
+        _set_active_modules_env()
 
 
 def remove_active_module(module):
@@ -297,12 +492,89 @@ def remove_active_module(module):
         module (Module): Module to remove from CPENV_ACTIVE_MODULES
     """
 
-    if module in _active_modules:
-        _active_modules.remove(module)
+    _init_active_modules()
+    _active_modules.pop(module.path, None)
 
-    module_names = os.pathsep.join([m.qual_name for m in _active_modules])
+    if not _active_modules_batch["depth"]:
+        _set_active_modules_env()
+
+
+@contextlib.contextmanager
+def batch_active_modules():
+    """Update CPENV_ACTIVE_MODULES once when the block exits rather than
+    each time a module is added or removed.
+
+    Usage:
+        >>> with cpenv.batch_active_modules():
+        ...     for module in modules:
+        ...         module.activate()
+    """
+
+    with _init_lock:
+        _active_modules_batch["depth"] += 1
+    try:
+        yield
+    finally:
+        with _init_lock:
+            _active_modules_batch["depth"] -= 1
+            if not _active_modules_batch["depth"]:
+                _set_active_modules_env()
+
+
+def _find_active_modules(requirements):
+    """Return the active Modules satisfying a list of requirements or None
+    when any of the requirements is not satisfied by an active Module.
+
+    Requirements with a version, but no version range, must match an active
+    Module's version exactly.
+    """
+
+    active_modules = get_active_modules()
+    if not active_modules:
+        return None
+
+    found = []
+    for requirement in requirements:
+        try:
+            item = Pending.create(requirement)
+        except ResolveError:
+            return None
+
+        exact = item.version is not None and item.version_range is None
+        for module in active_modules:
+            if not item.is_satisfied_by(module):
+                continue
+            if exact and not item.is_exact_match(module):
+                continue
+            found.append(module)
+            break
+        else:
+            return None
+
+    return found
+
+
+def _set_active_modules_env():
+    """Store the qual_names of active modules in CPENV_ACTIVE_MODULES and the
+    paths of local active modules in CPENV_ACTIVE_MODULE_PATHS.
+    """
+
+    mappings.journal.record("CPENV_ACTIVE_MODULES")
+    mappings.journal.record("CPENV_ACTIVE_MODULE_PATHS")
+
+    active_modules = list(_active_modules.values())
+    module_names = os.pathsep.join([m.qual_name for m in active_modules])
     os.environ["CPENV_ACTIVE_MODULES"] = str(module_names)
 
+    module_paths = os.pathsep.join(
+        [
+            m.path
+            for m in active_modules
+            if isinstance(m, Module) or m.repo.type_name == "local"
+        ]
+    )
+    os.environ["CPENV_ACTIVE_MODULE_PATHS"] = str(module_paths)
+
 
 def set_home_path(path):
     """Convenient function used to set the CPENV_HOME environment variable."""
@@ -383,6 +655,7 @@ def get_cache_path(*parts):
         *parts (str) - List of path parts to join with cache path
     """
 
+    _init_once("paths", _init_paths)
     return paths.normalize(get_home_path(), "cache", *parts)
 
 
@@ -479,8 +752,8 @@ def get_modules(*requirements):
 
     modules = []
 
-    for repo in get_repos():
-        modules.extend(repo.list())
+    for repo, module_specs in repos.RepoQuery(get_repos(), "list"):
+        modules.extend(module_specs)
 
     return sort_modules(list(modules))
 
@@ -488,6 +761,7 @@ def get_modules(*requirements):
 def update_repo(repo):
     """Update a registered repo."""
 
+    _init()
     _registry["repos"].update({repo.name: repo})
 
 
@@ -498,6 +772,7 @@ def add_repo(repo, priority=None):
         priority (int): Override the Repos priority when adding.
     """
 
+    _init()
     if priority is not None:
         repo.priority = priority
 
@@ -514,6 +789,7 @@ def add_repo(repo, priority=None):
 def remove_repo(repo):
     """Unregister a Repo."""
 
+    _init()
     _registry["repos"].pop(repo.name, None)
 
 
@@ -531,7 +807,20 @@ def get_repo(name, **query):
 
 
 def get_repos():
-    """Get a list of all registered Repos."""
+    """Get a list of all registered Repos.
+
+    Repos from config.yml are constructed the first time they are needed.
+    """
+
+    _init()
+    with _init_lock:
+        for name, repo in list(_registry["repos"].items()):
+            if isinstance(repo, RepoFactory):
+                repo = repo.build()
+                if repo is None:
+                    _registry["repos"].pop(name)
+                else:
+                    _registry["repos"][name] = repo
 
     return list(_registry["repos"].values())
 
@@ -594,12 +883,87 @@ def write_config(*args):
         f.write(yaml.dump(config))
 
 
+class RepoFactory(object):
+    """Placeholder for a Repo in the registry that is built on first use.
+
+    Used for Repos from config.yml so that constructing them, which may
+    import large dependencies or create api clients, is deferred until
+    get_repos is called.
+
+    Arguments:
+        name (str): Name of the Repo.
+        repo_cls (Type[Repo]): Repo class to construct.
+        config (dict): Keyword arguments passed to repo_cls.
+    """
+
+    def __init__(self, name, repo_cls, config):
+        self.name = name
+        self.repo_cls = repo_cls
+        self.config = config
+        self.priority = config.get("priority", None)
+        if self.priority is None:
+            self.priority = repo_cls.priority
+
+    def __repr__(self):
+        return "<RepoFactory>(name=%r, type=%r)" % (self.name, self.repo_cls.type_name)
+
+    def build(self):
+        """Construct the Repo or warn and return None on failure."""
+
+        try:
+            return self.repo_cls(**self.config)
+        except Exception as e:
+            warnings.warn(
+                "Failed to create %s repo named %s\nError: %s"
+                % (self.repo_cls.type_name, self.name, str(e))
+            )
+
+
+def _init_once(key, func):
+    """Call func the first time an _init_state key is initialized.
+
+    Other threads wait until func finishes. Calls made by func itself return
+    immediately. If func raises, the next call tries again.
+    """
+
+    if _init_state[key] == "done":
+        return
+
+    with _init_lock:
+        if _init_state[key] is not None:
+            return
+
+        _init_state[key] = "running"
+        try:
+            func()
+        except Exception:
+            _init_state[key] = None
+            raise
+        _init_state[key] = "done"
+
+
 def _init():
-    """Responsible for initially configuraing cpenv."""
+    """Responsible for initially configuring cpenv.
+
+    cpenv is initialized lazily on the first use of the Repo registry rather
+    than when cpenv is imported. Safe to call more than once.
+    """
+
+    _init_once("repos", _init_repos)
+
+
+def _init_paths():
+    """Create the home and user directories."""
 
     _init_home_path(get_home_path())
     _init_user_path(get_user_path())
 
+
+def _init_repos():
+    """Register builtin Repos and Repos from config.yml."""
+
+    _init_once("paths", _init_paths)
+
     # Register builtin repos
     cwd = repos.LocalRepo("cwd", paths.normalize(os.getcwd()))
     user = repos.LocalRepo("user", get_user_modules_path())
@@ -618,40 +982,73 @@ def _init():
         add_repo(repo)
 
     # Register additional repos from CPENV_MODULE_PATHS
-    builtin_module_paths = [repo.path for repo in get_repos()]
+    builtin_module_paths = [repo.path for repo in builtin_repos]
     for path in get_module_paths():
         if path in builtin_module_paths:
             continue
         add_repo(repos.LocalRepo(path, path))
 
-    # Register repos from config
+    # Register factories for repos from config
     configured_repos = read_config("repos", {})
     for name, config in configured_repos.items():
-        repo_type = config.pop("type")
-        repo_cls = repos.registry[repo_type]
-        try:
-            add_repo(repo_cls(**config))
-        except Exception as e:
+        repo_type = config.pop("type", None)
+        repo_cls = repos.registry.get(repo_type, None)
+        if repo_cls is None:
             warnings.warn(
-                "Failed to create %s repo named %s\nError: %s"
-                % (
-                    repo_type,
-                    config["name"],
-                    str(e),
-                )
+                "Failed to create %s repo named %s\nError: Unknown repo type."
+                % (repo_type, config.get("name", name))
             )
+            continue
+        add_repo(RepoFactory(config.get("name", name), repo_cls, config))
+
+
+def _init_active_modules():
+    """Set _active_modules from CPENV_ACTIVE_MODULES on first use."""
+
+    _init_once("active_modules", _restore_active_modules)
+
+
+def _reset_active_modules():
+    """Restore active Modules from the environment again on next use."""
+
+    with _init_lock:
+        _active_modules.clear()
+        _init_state["active_modules"] = None
+
+
+def _restore_active_modules():
+    """Restore active Modules from the paths in CPENV_ACTIVE_MODULE_PATHS.
+
+    Only active modules whose path is missing or no longer contains the same
+    version are resolved. Repos are not constructed when all paths exist.
+    """
+
+    local_modules = {}
+    module_paths = os.getenv("CPENV_ACTIVE_MODULE_PATHS", "").split(os.pathsep)
+    for path in module_paths:
+        if path and is_module(path):
+            module = Module(path)
+            local_modules.setdefault(module.qual_name, module)
 
-    # Set _active_modules from CPENV_ACTIVE_MODULES
     unresolved = []
-    resolver = Resolver(get_repos())
+    resolver = None
     active_modules = os.getenv("CPENV_ACTIVE_MODULES", "").split(os.pathsep)
-    for module in active_modules:
-        if module:
-            try:
-                resolved = resolver.resolve([module])[0]
-                _active_modules.append(resolved)
-            except ResolveError:
-                unresolved.append(module)
+    for qual_name in active_modules:
+        if not qual_name:
+            continue
+
+        if qual_name in local_modules:
+            module = local_modules[qual_name]
+            _active_modules.setdefault(module.path, module)
+            continue
+
+        if resolver is None:
+            resolver = Resolver(get_repos(), resolve_requires=False)
+        try:
+            resolved = resolver.resolve([qual_name])[0]
+            _active_modules.setdefault(resolved.path, resolved)
+        except ResolveError:
+            unresolved.append(qual_name)
 
     if unresolved:
         warnings.warn("Unable to resolve %s from $CPENV_ACTIVE_MODULES:" % unresolved)
@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+"""
+Content-addressed store of the files shared by localized modules.
+"""
+
+# Standard library imports
+import hashlib
+import logging
+import os
+import shutil
+import stat
+import threading
+import time
+
+# Local imports
+from . import paths
+from .manifest import hash_file, read_manifest
+
+__all__ = [
+    "BlobStore",
+    "blob_store_enabled",
+    "get_blob_store",
+]
+_log = logging.getLogger(__name__)
+
+
+def blob_store_enabled():
+    """Check if the blob store is enabled via CPENV_ENABLE_BLOB_STORE."""
+
+    try:
+        return bool(int(os.getenv("CPENV_ENABLE_BLOB_STORE", 0)))
+    except Exception:
+        return False
+
+
+def blob_mode(executable):
+    return 0o555 if executable else 0o444
+
+
+def remove_file(path):
+    """Remove a file, including read-only files on windows."""
+
+    try:
+        os.remove(path)
+    except PermissionError:
+        os.chmod(path, stat.S_IWRITE | stat.S_IREAD)
+        os.remove(path)
+
+
+def get_blob_store():
+    """Return a BlobStore if the blob store is enabled otherwise None."""
+
+    if blob_store_enabled():
+        return BlobStore()
+
+
+class BlobStore(object):
+    """A content-addressed store of module files shared via hardlinks.
+
+    Each file is stored once in $CPENV_HOME/cache/blobs named by the sha256 of
+    its contents. Localized modules are materialized by hardlinking their
+    files to blobs, so files shared by multiple versions of a module use disk
+    space once.
+
+    The link count of a blob is its reference count. Removing a module drops
+    its links, remove_unused removes the blobs of a removed module that are
+    no longer linked to and gc removes all blobs that no module links to.
+
+    Since linked files share a single inode, blobs are read-only, keep only
+    the executable bit of their source file and keep the mtime of the first
+    file stored. module.yml files are never stored as they are unique per
+    version and are often edited.
+
+    Hardlinks require modules and the store to be on the same filesystem.
+    Use supports to check a destination before materializing modules.
+
+    Arguments:
+        path (str): Optional path to the store. Defaults to
+            $CPENV_HOME/cache/blobs.
+    """
+
+    excluded_names = ["module.yml"]
+    chunk_size = 1024 * 1024
+    tmp_max_age = 3600
+
+    def __init__(self, path=None):
+        self._path = path
+
+    @property
+    def path(self):
+        if self._path is None:
+            from .api import get_cache_path
+
+            self._path = get_cache_path("blobs")
+        return self._path
+
+    def blob_path(self, digest, executable=False):
+        name = digest + (".x" if executable else "")
+        return os.path.join(self.path, digest[:2], name)
+
+    def supports(self, path):
+        """Check if files in path can be hardlinked to blobs in this store."""
+
+        while not os.path.exists(path):
+            parent = os.path.dirname(path)
+            if parent == path:
+                return False
+            path = parent
+
+        try:
+            paths.ensure_path_exists(self.path)
+            return os.stat(self.path).st_dev == os.stat(path).st_dev
+        except OSError:
+            return False
+
+    def is_stored(self, path):
+        return os.path.basename(path) not in self.excluded_names
+
+    def _blob_for(self, path):
+        executable = bool(os.stat(path).st_mode & stat.S_IXUSR)
+        return self.blob_path(hash_file(path), executable), executable
+
+    def _copy_and_hash(self, src, dst):
+        """Copy src to dst like shutil.copy2. Returns the sha256 of src."""
+
+        sha = hashlib.sha256()
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            for chunk in iter(lambda: fsrc.read(self.chunk_size), b""):
+                sha.update(chunk)
+                fdst.write(chunk)
+        shutil.copystat(src, dst)
+        return sha.hexdigest()
+
+    def _link_blob(self, src, blob):
+        """Link src to blob unless the blob already exists."""
+
+        paths.ensure_path_exists(os.path.dirname(blob))
+        try:
+            os.link(src, blob)
+            return True
+        except FileExistsError:
+            # Stored by another thread or process
+            return False
+
+    def copy_file(self, src, dst, size=None):
+        """Copy src to dst through the store.
+
+        src is read once, it's hashed while being copied to a temporary file
+        in the store. The temporary file becomes the blob unless the store
+        already has an identical one, then dst is linked to the blob. Used in
+        place of paths.copy_file.
+        """
+
+        if not self.is_stored(src):
+            return paths.copy_file(src, dst, size)
+
+        executable = bool(os.stat(src).st_mode & stat.S_IXUSR)
+        tmp_dir = os.path.join(self.path, "tmp")
+        paths.ensure_path_exists(tmp_dir)
+        tmp = os.path.join(
+            tmp_dir,
+            "%s.%s.tmp" % (os.getpid(), threading.get_ident()),
+        )
+        try:
+            blob = self.blob_path(self._copy_and_hash(src, tmp), executable)
+            for _ in range(3):
+                if not os.path.exists(blob) and self._link_blob(tmp, blob):
+                    os.chmod(blob, blob_mode(executable))
+                try:
+                    os.link(blob, dst)
+                    return
+                except FileNotFoundError:
+                    # Removed by gc before we could link to it
+                    continue
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+        paths.copy_file(src, dst, size)
+
+    def dedupe(self, folder):
+        """Replace the files in a folder with links to blobs.
+
+        Used for modules written by Repos that do not copy through the store,
+        like ShotgunRepo which extracts an archive.
+
+        Returns:
+            The number of bytes freed by linking to existing blobs.
+        """
+
+        freed = 0
+        manifest = paths.get_folder_manifest(folder)
+        for rel_path, size in manifest["files"]:
+            path = os.path.join(folder, rel_path)
+            if not self.is_stored(path) or os.stat(path).st_nlink > 1:
+                continue
+
+            blob, executable = self._blob_for(path)
+            if not os.path.exists(blob) and self._link_blob(path, blob):
+                os.chmod(blob, blob_mode(executable))
+                continue
+
+            tmp = "%s.%s.tmp" % (path, threading.get_ident())
+            try:
+                os.link(blob, tmp)
+            except FileNotFoundError:
+                continue
+            os.replace(tmp, path)
+            freed += size
+
+        return freed
+
+    def find_blobs(self, folder):
+        """Return the blobs only linked to by the files in a folder.
+
+        Call before removing a folder and pass the result to remove_unused
+        to drop its blobs without scanning the whole store. Digests are read
+        from the folder's manifest when it has one.
+        """
+
+        files = (read_manifest(folder) or {}).get("files", {})
+        blobs = []
+        for rel_path, _ in paths.get_folder_manifest(folder)["files"]:
+            path = os.path.join(folder, rel_path)
+            if not self.is_stored(path):
+                continue
+
+            try:
+                file_stat = os.stat(path)
+                if file_stat.st_nlink != 2:
+                    # Unlinked or shared with other modules
+                    continue
+
+                executable = bool(file_stat.st_mode & stat.S_IXUSR)
+                entry = files.get(rel_path.replace("\\", "/"), None)
+                digests = [entry["sha256"]] if entry else []
+                for digest in digests or [hash_file(path)]:
+                    blob = self.blob_path(digest, executable)
+                    if os.path.exists(blob) and os.path.samestat(
+                        os.stat(blob), file_stat
+                    ):
+                        blobs.append(blob)
+                        break
+            except OSError:
+                continue
+
+        return blobs
+
+    def remove_unused(self, blobs):
+        """Remove the blobs in a list that are no longer linked to.
+
+        Returns:
+            (int, int) - the number and size of the removed blobs.
+        """
+
+        count = 0
+        size = 0
+        for blob in blobs:
+            try:
+                blob_stat = os.stat(blob)
+                if blob_stat.st_nlink > 1:
+                    continue
+                remove_file(blob)
+            except OSError as e:
+                _log.debug("Failed to remove blob %s: %s", blob, e)
+                continue
+            count += 1
+            size += blob_stat.st_size
+
+        return count, size
+
+    def gc(self):
+        """Remove blobs that are no longer linked to by any module.
+
+        Returns:
+            (int, int) - the number and size of the removed blobs.
+        """
+
+        count = 0
+        size = 0
+        tmp_ctime = time.time() - self.tmp_max_age
+        try:
+            folders = [e.path for e in os.scandir(self.path) if e.is_dir()]
+        except OSError:
+            return count, size
+
+        for folder in folders:
+            try:
+                entries = list(os.scandir(folder))
+            except OSError:
+                continue
+
+            for entry in entries:
+                try:
+                    # DirEntry.stat does not report st_nlink on windows
+                    blob_stat = os.lstat(entry.path)
+                except OSError:
+                    continue
+
+                if entry.name.endswith(".tmp"):
+                    # Leftover from an interrupted copy
+                    if blob_stat.st_ctime > tmp_ctime:
+                        continue
+                elif blob_stat.st_nlink > 1:
+                    continue
+
+                try:
+                    remove_file(entry.path)
+                except OSError as e:
+                    _log.debug("Failed to remove blob %s: %s", entry.path, e)
+                    continue
+                count += 1
+                size += blob_stat.st_size
+
+        return count, size
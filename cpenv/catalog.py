@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent on-disk catalogs of the modules stored in LocalRepos.
+"""
+
+# Standard library imports
+import hashlib
+import json
+import logging
+import os
+
+# Local imports
+from . import paths
+from .module import ModuleSpec, read_module_spec
+from .versions import parse_version
+
+__all__ = [
+    "ModuleCatalog",
+    "catalog_enabled",
+]
+_log = logging.getLogger(__name__)
+
+
+def catalog_enabled():
+    """Check if catalogs are enabled via CPENV_ENABLE_CATALOG."""
+
+    try:
+        return bool(int(os.getenv("CPENV_ENABLE_CATALOG", 0)))
+    except Exception:
+        return False
+
+
+class ModuleCatalog(object):
+    """A persistent catalog of the modules in a LocalRepo.
+
+    The catalog is stored as a json file in the cpenv cache directory. It
+    records the name, version and module.yml mtime of every module in a repo
+    as well as the mtime of each directory that was searched for modules.
+
+    Rescanning a repo only lists the contents of directories whose mtime
+    changed and only reads module.yml files whose mtime changed. A warm scan
+    costs a stat per directory and module.yml rather than a read and yaml
+    parse per module.
+
+    Racy mtimes, see paths.is_racy, are not stored so their entries are
+    rescanned next time.
+
+    Supports the same hierarchies as the LocalRepo:
+        <repo_path>/<name>-<version>/module.yml
+        <repo_path>/<name>/<version>/module.yml
+
+    Arguments:
+        repo (LocalRepo): Repo to catalog.
+        path (str): Optional path to the catalog file. Defaults to a file in
+            $CPENV_HOME/cache/catalogs named by a hash of the repo's path.
+    """
+
+    version = 1
+    max_depth = 2
+
+    def __init__(self, repo, path=None):
+        self.repo = repo
+        self._path = path
+
+    @property
+    def path(self):
+        if self._path is None:
+            from .api import get_cache_path
+
+            repo_hash = hashlib.sha1(self.repo.path.encode("utf-8")).hexdigest()
+            self._path = get_cache_path("catalogs", repo_hash[:16] + ".json")
+        return self._path
+
+    def load(self):
+        """Load catalog data from disk."""
+
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (OSError, IOError, ValueError):
+            return {}
+
+        if data.get("version") != self.version or data.get("path") != self.repo.path:
+            return {}
+
+        return data
+
+    def save(self, data):
+        """Atomically write catalog data to disk."""
+
+        data = dict(data, version=self.version, path=self.repo.path)
+        try:
+            paths.write_json(self.path, data, separators=(",", ":"))
+        except (OSError, IOError) as e:
+            _log.debug("Failed to save catalog %s: %s", self.path, e)
+
+    def clear(self):
+        """Remove the catalog file."""
+
+        if os.path.isfile(self.path):
+            os.remove(self.path)
+
+    def list(self):
+        """Return a list of ModuleSpecs updating the catalog as necessary."""
+
+        cached = self.load()
+        cached_dirs = cached.get("dirs", {})
+        cached_modules = cached.get("modules", {})
+        dirs = {}
+        modules = {}
+
+        def trusted(mtime):
+            return None if paths.is_racy(mtime) else mtime
+
+        def visit_dir(path, depth):
+            try:
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                return
+
+            entry = cached_dirs.get(path)
+            if not entry or entry["mtime"] != mtime:
+                entry = scan_dir(path, list_subdirs=depth < self.max_depth)
+                entry["mtime"] = trusted(mtime)
+            dirs[path] = entry
+
+            if depth and entry["module"]:
+                visit_module(path)
+
+            for subdir in entry["subdirs"]:
+                visit_dir(path + "/" + subdir, depth + 1)
+
+        def visit_module(path):
+            try:
+                mtime = os.stat(path + "/module.yml").st_mtime
+            except OSError:
+                return
+
+            entry = cached_modules.get(path)
+            if not entry or entry["mtime"] != mtime:
+                module_spec = read_module_spec(path, self.repo)
+                entry = {
+                    "name": module_spec.name,
+                    "version": module_spec.version.string,
+                    "mtime": trusted(mtime),
+                }
+            modules[path] = entry
+
+        visit_dir(self.repo.path, 0)
+
+        if dirs != cached_dirs or modules != cached_modules:
+            self.save({"dirs": dirs, "modules": modules})
+
+        module_specs = []
+        for path, entry in modules.items():
+            module_specs.append(
+                ModuleSpec(
+                    name=entry["name"],
+                    qual_name=entry["name"] + "-" + entry["version"],
+                    version=parse_version(entry["version"]),
+                    path=path,
+                    repo=self.repo,
+                )
+            )
+        return module_specs
+
+
+def scan_dir(path, list_subdirs=True):
+    """List the subdirectories of path and check if it contains a module.yml.
+
+    Hidden directories are skipped to match the glob patterns used by
+    LocalRepo.
+    """
+
+    subdirs = []
+    has_module = False
+    try:
+        entries = list(os.scandir(path))
+    except OSError:
+        entries = []
+
+    for entry in entries:
+        if entry.name == "module.yml":
+            has_module = True
+        elif list_subdirs and not entry.name.startswith("."):
+            try:
+                if entry.is_dir():
+                    subdirs.append(entry.name)
+            except OSError:
+                continue
+
+    return {"subdirs": sorted(subdirs), "module": has_module}
@@ -1,3 +1,5 @@
+import threading
+
 import tqdm
 
 from cpenv import repos
@@ -9,9 +11,12 @@ from cpenv.cli import (
     create,
     edit,
     env,
+    exec,
+    gc,
     info,
     list,
     localize,
+    lock,
     publish,
     remove,
     repo,
@@ -41,8 +46,11 @@ class CpenvCLI(core.CLI):
             info.Info(self),
             edit.Edit(self),
             env.Env(self),
+            exec.Exec(self),
+            gc.Gc(self),
             list.List(self),
             localize.Localize(self),
+            lock.Lock(self),
             publish.Publish(self),
             remove.Remove(self),
             repo.Repo(self),
@@ -53,6 +61,16 @@ class CpenvCLI(core.CLI):
 class CliReporter(Reporter):
     def __init__(self):
         self._bars = {}
+        self._positions = {}
+        self._lock = threading.RLock()
+
+    def echo(self, message=""):
+        # Print above any open progress bars without breaking them
+        with self._lock:
+            if self._bars:
+                tqdm.tqdm.write(message)
+            else:
+                core.echo(message)
 
     def get_bar_style(self, desc, total, unit=None, unit_divisor=None, unit_scale=None):
         return {
@@ -89,14 +107,15 @@ class CliReporter(Reporter):
     def start_progress(self, label, max_size, data):
         if "download" in label.lower():
             spec = data["module_spec"]
-            core.echo("  Downloading %s from %s..." % (spec.qual_name, spec.repo.name))
+            message = "  Downloading %s from %s..." % (spec.qual_name, spec.repo.name)
             desc = spec.qual_name
         elif "upload" in label.lower():
             module = data["module"]
             to_repo = data["to_repo"]
-            core.echo("  Uploading %s to %s..." % (module.qual_name, to_repo.name))
+            message = "  Uploading %s to %s..." % (module.qual_name, to_repo.name)
             desc = module.qual_name
         else:
+            message = None
             desc = label
 
         style = self.get_bar_style(
@@ -106,14 +125,27 @@ class CliReporter(Reporter):
             data.get("unit_divisor", 1024),
             data.get("unit_scale", True),
         )
-        self._bars[label] = tqdm.tqdm(**style)
+        with self._lock:
+            if message:
+                self.echo(message)
+
+            # Give each concurrent bar its own line
+            positions = set(self._positions.values())
+            position = 0
+            while position in positions:
+                position += 1
+            self._positions[label] = position
+            self._bars[label] = tqdm.tqdm(position=position, **style)
 
     def update_progress(self, label, chunk_size, data):
-        bar = self._bars.get(label, None)
-        if bar:
-            bar.update(chunk_size)
+        with self._lock:
+            bar = self._bars.get(label, None)
+            if bar:
+                bar.update(chunk_size)
 
     def end_progress(self, label, data):
-        bar = self._bars.pop(label, None)
-        if bar:
-            bar.close()
+        with self._lock:
+            self._positions.pop(label, None)
+            bar = self._bars.pop(label, None)
+            if bar:
+                bar.close()
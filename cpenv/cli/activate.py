@@ -11,32 +11,49 @@ class Activate(core.CLI):
       cpenv activate module_a-1.0 module_b 0.2.0
       cpenv activate my_environment
       cpenv activate --env my_environment
+      cpenv activate --lock cpenv.lock
 
     Note:
       Use the --env flag to specifically activate an Environment by name
       rather than checking for modules first. Use the "cpenv env" command to
-      manage Environments.
+      manage Environments. Use the --lock flag to activate the modules in a
+      lockfile created by the "cpenv lock" command.
     """
 
-    usage = "cpenv activate [-h] [<modules> or <environment>...]"
+    usage = "cpenv activate [-h] [--lock <lockfile>] [<modules> or <environment>...]"
 
     def setup_parser(self, parser):
         parser.add_argument(
             "modules",
             help="Space separated list of modules.",
-            nargs="+",
+            nargs="*",
         )
         parser.add_argument(
             "--env",
             help="Activate an Environment. (False)",
             action="store_true",
         )
+        parser.add_argument(
+            "--lock",
+            help="Activate the modules in a lockfile.",
+            default=None,
+        )
 
     def run(self, args):
 
         core.echo()
 
-        if args.env:
+        if not args.modules and not args.lock:
+            core.echo("Error: Expected modules, an environment or --lock.")
+            core.exit(1)
+
+        if args.lock:
+            try:
+                api.activate(lockfile=args.lock)
+            except ResolveError as e:
+                core.echo("Error: " + str(e))
+                core.exit(1)
+        elif args.env:
             try:
                 api.activate_environment(args.modules[0])
             except ResolveError as e:
@@ -34,7 +34,9 @@ class Edit(core.CLI):
             return self.run_env(args.module_or_environment)
 
         try:
-            module_spec = api.resolve([args.module_or_environment])[0]
+            module_spec = api.resolve(
+                [args.module_or_environment], resolve_requires=False
+            )[0]
         except ResolveError:
             sys.exit(1)
 
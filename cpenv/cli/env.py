@@ -1,8 +1,10 @@
 import argparse
 import re
 
-from cpenv import api
+from cpenv import api, export
 from cpenv.cli import core
+from cpenv.repos import RepoQuery
+from cpenv.resolver import ResolveError
 
 
 class Env(core.CLI):
@@ -19,6 +21,7 @@ class Env(core.CLI):
             ListEnv(self),
             SaveEnv(self),
             RemoveEnv(self),
+            ExportEnv(self),
         ]
 
 
@@ -58,8 +61,8 @@ class ListEnv(core.CLI):
 
         found_environments = False
 
-        for repo in api.get_repos():
-            environments = repo.list_environments(filters)
+        query = RepoQuery(api.get_repos(), "list_environments", filters)
+        for repo, environments in query:
             env_names = sorted([env.name for env in environments])
             if env_names:
                 found_environments = True
@@ -196,3 +199,89 @@ class RemoveEnv(core.CLI):
             core.echo('Could not find Environment "%s".' % name)
 
         core.echo()
+
+
+class ExportEnv(core.CLI):
+    """
+    Export the environment of a list of Modules to a file.
+
+    Exported files set the variables that activating the Modules would set
+    without running cpenv. Source a bash, zsh or fish export in a shell or
+    load a json or dotenv export in other tools. Use --check to test if the
+    Modules in an export changed since it was written, pass modules along
+    with --check to also test if it was written for those modules.
+
+    Examples:
+      cpenv env export module_a module_b --output job.sh
+      cpenv env export module_a --format fish --output job.fish
+      cpenv env export --lock cpenv.lock --output job.json
+      cpenv env export --check job.sh
+      cpenv env export --check job.sh module_a module_b
+    """
+
+    name = "export"
+
+    def setup_parser(self, parser):
+        parser.add_argument(
+            "modules",
+            help="Space separated list of modules.",
+            nargs="*",
+        )
+        parser.add_argument(
+            "--format",
+            "-f",
+            help="One of %s. (bash)" % ", ".join(export.formats),
+            choices=export.formats,
+            default=None,
+        )
+        parser.add_argument(
+            "--output",
+            "-o",
+            help="Path to export. (cpenv.sh)",
+            default=None,
+        )
+        parser.add_argument(
+            "--lock",
+            help="Export the modules in a lockfile.",
+            default=None,
+        )
+        parser.add_argument(
+            "--check",
+            help="Check if an export is outdated.",
+            default=None,
+        )
+
+    def run(self, args):
+
+        core.echo()
+
+        if args.check:
+            if export.is_stale(args.check, args.modules or None):
+                core.echo("- %s is outdated." % args.check)
+                core.echo()
+                core.exit(1)
+            core.echo("- %s is up to date." % args.check)
+            core.echo()
+            return
+
+        if not args.modules and not args.lock:
+            core.echo("Error: Expected modules or --lock.")
+            core.exit(1)
+
+        output = args.output
+        if output is None:
+            output = "cpenv" + export.extensions[args.format or "bash"]
+
+        try:
+            api.export_env(
+                output,
+                args.modules,
+                format=args.format,
+                lockfile=args.lock,
+            )
+        except ResolveError as e:
+            core.echo("Error: " + str(e))
+            core.exit(1)
+
+        core.echo("- Wrote environment to %s" % output)
+        core.echo()
@@ -0,0 +1,68 @@
+import argparse
+import sys
+
+from cpenv import api
+from cpenv.cli import core
+from cpenv.resolver import ResolveError
+
+
+class Exec(core.CLI):
+    """Run a command in the environment of a list of Modules.
+
+    The command replaces the cpenv process rather than running in a subshell,
+    making this cheaper than "cpenv activate" for scripts and render farm
+    jobs that only need to run a single executable.
+
+    Examples:
+      cpenv exec module_a module_b -- maya -batch -file scene.ma
+      cpenv exec --lock cpenv.lock -- python my_script.py
+
+    Note:
+      Use "--" to separate the modules from the command and its arguments.
+      Messages from cpenv are written to stderr so stdout only contains the
+      output of the command.
+    """
+
+    usage = "cpenv exec [-h] [--lock <lockfile>] [<modules>...] -- <command>..."
+
+    def setup_parser(self, parser):
+        parser.add_argument(
+            "--lock",
+            help="Activate the modules in a lockfile.",
+            default=None,
+        )
+        parser.add_argument(
+            "args",
+            help="Space separated list of modules followed by -- and a command.",
+            nargs=argparse.REMAINDER,
+        )
+
+    def run(self, args):
+
+        if "--" not in args.args:
+            core.echo('Error: Expected "--" followed by a command.')
+            core.exit(1)
+
+        split = args.args.index("--")
+        modules, command = args.args[:split], args.args[split + 1 :]
+        if not command:
+            core.echo('Error: Expected a command after "--".')
+            core.exit(1)
+
+        if not modules and not args.lock:
+            core.echo("Error: Expected modules or --lock.")
+            core.exit(1)
+
+        # Keep stdout clean for the command, it's often piped or redirected
+        stdout = sys.stdout
+        sys.stdout = sys.stderr
+        try:
+            api.run(command, modules, lockfile=args.lock)
+        except ResolveError as e:
+            core.echo("Error: " + str(e))
+            core.exit(1)
+        except OSError as e:
+            core.echo("Error: Failed to run %s: %s" % (command[0], e))
+            core.exit(127)
+        finally:
+            sys.stdout = stdout
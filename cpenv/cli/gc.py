@@ -0,0 +1,20 @@
+from cpenv import paths
+from cpenv.blobstore import BlobStore
+from cpenv.cli import core
+
+
+class Gc(core.CLI):
+    """Remove unused files from the blob store.
+
+    When CPENV_ENABLE_BLOB_STORE is set, localized modules share files through
+    a store in $CPENV_HOME/cache/blobs. Files are removed from the store when
+    modules are removed with "cpenv remove". Run this command after deleting
+    modules by hand.
+    """
+
+    def run(self, args):
+
+        core.echo()
+        count, size = BlobStore().gc()
+        core.echo("- Removed %d unused blobs (%s)" % (count, paths.format_size(size)))
+        core.echo()
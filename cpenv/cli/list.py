@@ -1,6 +1,7 @@
 from cpenv import api
 from cpenv.cli import core
 from cpenv.module import is_partial_match, sort_modules
+from cpenv.repos import RepoQuery
 
 
 class List(core.CLI):
@@ -50,11 +51,12 @@ class List(core.CLI):
         if args.repo:
             repos = [api.get_repo(args.repo)]
 
-        for repo in repos:
-            if args.requirement:
-                repo_modules = repo.find(args.requirement)
-            else:
-                repo_modules = repo.list()
+        if args.requirement:
+            query = RepoQuery(repos, "find", args.requirement)
+        else:
+            query = RepoQuery(repos, "list")
+
+        for repo, repo_modules in query:
 
             module_names = []
             for module in sort_modules(repo_modules):
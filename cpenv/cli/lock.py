@@ -0,0 +1,42 @@
+from cpenv import api
+from cpenv.cli import core
+from cpenv.resolver import ResolveError
+
+
+class Lock(core.CLI):
+    """Resolve a list of Modules and write them to a lockfile.
+
+    A lockfile records the exact modules resolved for a list of requirements.
+    Use "cpenv activate --lock <lockfile>" to activate the locked modules
+    without resolving requirements again.
+
+    Examples:
+      cpenv lock module_a module_b
+      cpenv lock module_a module_b --output shot.lock
+    """
+
+    def setup_parser(self, parser):
+        parser.add_argument(
+            "modules",
+            help="Space separated list of modules.",
+            nargs="+",
+        )
+        parser.add_argument(
+            "--output",
+            "-o",
+            help="Path to lockfile. (cpenv.lock)",
+            default="cpenv.lock",
+        )
+
+    def run(self, args):
+
+        core.echo()
+
+        try:
+            api.lock(args.modules, args.output)
+        except ResolveError as e:
+            core.echo("Error: " + str(e))
+            core.exit(1)
+
+        core.echo("- Wrote lockfile to %s" % args.output)
+        core.echo()
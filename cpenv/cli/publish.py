@@ -39,7 +39,7 @@ class Publish(core.CLI):
             )
 
         # Resolve module
-        resolver = Resolver(api.get_repos())
+        resolver = Resolver(api.get_repos(), resolve_requires=False)
         module_spec = resolver.resolve([args.module])[0]
         core.echo()
 
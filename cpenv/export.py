@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+"""
+Export the environment of a list of modules to files that shells and other
+tools can load without running python.
+"""
+
+# Standard library imports
+import hashlib
+import json
+import os
+from string import Template
+
+# Local imports
+from . import __version__, compat, paths
+from .mappings import Mapping, compile_dict, expand_changes
+
+__all__ = [
+    "export_env",
+    "write_export",
+    "read_export_header",
+    "fingerprint",
+    "is_stale",
+    "formats",
+]
+export_version = 2
+extensions = {
+    "bash": ".sh",
+    "zsh": ".zsh",
+    "fish": ".fish",
+    "json": ".json",
+    "dotenv": ".env",
+}
+formats = list(extensions.keys())
+
+
+def fingerprint(module_paths, requirements=None, qual_names=None):
+    """Return a sha1 hexdigest of the inputs of an export.
+
+    Combines the platform, requirements and resolved qual_names with the
+    path, mtime and size of each module's module.yml so a stale export can be
+    detected with a stat per module.
+
+    Arguments:
+        module_paths (List[str]): Paths of the exported modules in order.
+        requirements (List[str]): Requirements used to resolve the modules.
+        qual_names (List[str]): qual_names of the exported modules in order.
+    """
+
+    parts = [str(export_version), __version__, compat.platform]
+    parts.extend(["requirement:" + r for r in requirements or []])
+    parts.extend(["module:" + q for q in qual_names or []])
+    for path in module_paths:
+        try:
+            stat = os.stat(paths.normalize(path, "module.yml"))
+            parts.extend([path, str(stat.st_mtime_ns), str(stat.st_size)])
+        except OSError:
+            parts.extend([path, "missing"])
+
+    blob = "\n".join(parts).encode("utf-8")
+    return hashlib.sha1(blob).hexdigest()
+
+
+def compute_env(*env_dicts):
+    """Return the changes that apply a list of environments to any shell.
+
+    Variables that are set are written as absolute values, expanded against
+    an empty environment so the export does not depend on the environment it
+    was written in. Values appended and prepended to list variables, like
+    PATH, are kept relative to the value the variable has wherever the export
+    is loaded. Removals only apply to values added by env_dicts, values
+    already in the loading shell can not be removed.
+
+    Arguments:
+        *env_dicts: Dictionaries or plans returned by `compile_dict` in the
+            order they are joined. Usually the plans of a list of Modules.
+
+    Returns:
+        dict containing set, unset, prepend and append. set maps variables
+        to values, unset lists variable names and prepend and append map
+        variables to lists of values.
+    """
+
+    # Simulate join_dicts with a marker standing in for the shell's value
+    shell = object()
+
+    def same_value(item, value):
+        return item is not shell and item.lower() == value.lower()
+
+    keys = {}
+    values = {}
+    for data in env_dicts:
+        plan = compile_dict(data) if isinstance(data, Mapping) else data
+        for key, value, op in plan:
+            lkey = key.lower()
+            keys[lkey] = key
+            items = values.get(lkey, [shell])
+            if op == "unset":
+                items = None
+            elif op == "set":
+                items = [value]
+            elif op == "remove":
+                items = [i for i in items or [] if not same_value(i, value)]
+            elif not any(same_value(i, value) for i in items or []):
+                items = list(items or [])
+                if op == "prepend":
+                    items.insert(0, value)
+                else:
+                    items.append(value)
+            values[lkey] = items
+
+    set_vars = {}
+    unset_vars = []
+    relative = {}
+    for lkey, items in values.items():
+        key = keys[lkey]
+        if items is None:
+            unset_vars.append(key)
+        elif shell not in items:
+            set_vars[key] = os.pathsep.join(items)
+        elif len(items) > 1:
+            index = items.index(shell)
+            relative[key] = (items[:index], items[index + 1 :])
+
+    # Values may reference other variables like $MODULE
+    set_vars = expand_changes(set_vars, {})
+    prepend_vars = {}
+    append_vars = {}
+    for key, (before, after) in relative.items():
+        expand = [Template(v).safe_substitute(set_vars) for v in before + after]
+        if before:
+            prepend_vars[key] = expand[: len(before)]
+        if after:
+            append_vars[key] = expand[len(before) :]
+
+    return {
+        "set": dict(sorted(set_vars.items())),
+        "unset": sorted(unset_vars),
+        "prepend": dict(sorted(prepend_vars.items())),
+        "append": dict(sorted(append_vars.items())),
+    }
+
+
+def quote_sh(value):
+    return "'" + value.replace("'", "'\\''") + "'"
+
+
+def quote_fish(value):
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def quote_dotenv(value):
+    for char, escaped in [("\\", "\\\\"), ('"', '\\"'), ("$", "\\$"), ("\n", "\\n")]:
+        value = value.replace(char, escaped)
+    return '"' + value + '"'
+
+
+def format_header(header):
+    lines = ["# Generated by cpenv %s" % __version__]
+    lines.append("# cpenv-fingerprint: %s" % header["fingerprint"])
+    for requirement in header["requirements"]:
+        lines.append("# cpenv-requirement: %s" % requirement)
+    for qual_name in header["qual_names"]:
+        lines.append("# cpenv-qual-name: %s" % qual_name)
+    for module_path in header["modules"]:
+        lines.append("# cpenv-module: %s" % module_path)
+    return lines
+
+
+def format_sh(header, changes):
+    lines = format_header(header)
+    lines.extend(["unset %s" % k for k in changes["unset"]])
+    for k, v in changes["set"].items():
+        lines.append("export %s=%s" % (k, quote_sh(v)))
+    for k in relative_keys(changes):
+        prepend = os.pathsep.join(changes["prepend"].get(k, []))
+        append = os.pathsep.join(changes["append"].get(k, []))
+        if prepend and append:
+            value = '%s"${%s:+%s$%s}"%s' % (
+                quote_sh(prepend),
+                k,
+                os.pathsep,
+                k,
+                quote_sh(os.pathsep + append),
+            )
+        elif prepend:
+            value = '%s"${%s:+%s$%s}"' % (quote_sh(prepend), k, os.pathsep, k)
+        else:
+            value = '"${%s:+$%s%s}"%s' % (k, k, os.pathsep, quote_sh(append))
+        lines.append("export %s=%s" % (k, value))
+    return "\n".join(lines) + "\n"
+
+
+def format_fish(header, changes):
+    lines = format_header(header)
+    lines.extend(["set -e %s" % k for k in changes["unset"]])
+    for k, v in changes["set"].items():
+        lines.append("set -gx %s %s" % (k, quote_fish(v)))
+    for k in relative_keys(changes):
+        # Path variables are exported joined by colons
+        values = [quote_fish(v) for v in changes["prepend"].get(k, [])]
+        values.append("$" + k)
+        values.extend([quote_fish(v) for v in changes["append"].get(k, [])])
+        lines.append("set -gx --path %s %s" % (k, " ".join(values)))
+    return "\n".join(lines) + "\n"
+
+
+def format_dotenv(header, changes):
+    # dotenv files can not unset variables or test if a variable is empty.
+    # List variables must be set where the file is loaded, otherwise their
+    # value starts or ends with an empty entry.
+    lines = format_header(header)
+    for k, v in changes["set"].items():
+        lines.append("%s=%s" % (k, quote_dotenv(v)))
+    for k in relative_keys(changes):
+        values = changes["prepend"].get(k, []) + [None]
+        values.extend(changes["append"].get(k, []))
+        value = "${%s}" % k
+        parts = [value if v is None else quote_dotenv(v)[1:-1] for v in values]
+        lines.append('%s="%s"' % (k, os.pathsep.join(parts)))
+    return "\n".join(lines) + "\n"
+
+
+def format_json(header, changes):
+    data = dict(header, version=export_version, **changes)
+    return json.dumps(data, indent=2) + "\n"
+
+
+def relative_keys(changes):
+    return sorted(set(changes["prepend"]) | set(changes["append"]))
+
+
+formatters = {
+    "bash": format_sh,
+    "zsh": format_sh,
+    "fish": format_fish,
+    "json": format_json,
+    "dotenv": format_dotenv,
+}
+
+
+def export_env(modules, format="bash", requirements=None):
+    """Return the environment of a list of modules formatted for a shell.
+
+    Arguments:
+        modules (List[Module]): Modules in the order they are activated.
+        format (str): One of bash, zsh, fish, json or dotenv.
+        requirements (List[str]): Optional requirements used to resolve
+            modules. Stored for reference only.
+
+    Raises:
+        ValueError when format is not supported.
+    """
+
+    if format not in formatters:
+        raise ValueError("Expected format to be one of %s got %s" % (formats, format))
+
+    module_paths = [module.path for module in modules]
+    qual_names = [module.qual_name for module in modules]
+    requirements = list(requirements or [])
+    header = {
+        "fingerprint": fingerprint(module_paths, requirements, qual_names),
+        "requirements": requirements,
+        "qual_names": qual_names,
+        "modules": module_paths,
+    }
+    changes = compute_env(*[module.plan for module in modules])
+    return formatters[format](header, changes)
+
+
+def write_export(path, modules, format=None, requirements=None):
+    """Write the environment of a list of modules to path.
+
+    The format defaults to the one matching the extension of path.
+
+    Returns:
+        str - the exported text.
+    """
+
+    if format is None:
+        ext = os.path.splitext(path)[-1]
+        format = dict([(v, k) for k, v in extensions.items()]).get(ext, "bash")
+
+    text = export_env(modules, format, requirements)
+    with open(path, "w") as f:
+        f.write(text)
+
+    return text
+
+
+def read_export_header(path):
+    """Read the fingerprint and module paths from an exported file.
+
+    Returns:
+        dict containing fingerprint, requirements, qual_names and modules.
+    """
+
+    with open(path, "r") as f:
+        text = f.read()
+
+    if text.startswith("{"):
+        data = json.loads(text)
+        return {
+            "fingerprint": data.get("fingerprint", None),
+            "requirements": data.get("requirements", []),
+            "qual_names": data.get("qual_names", []),
+            "modules": data.get("modules", []),
+        }
+
+    header = {"fingerprint": None, "requirements": [], "qual_names": [], "modules": []}
+    for line in text.splitlines():
+        if not line.startswith("#"):
+            break
+        key, _, value = line[1:].strip().partition(": ")
+        if key == "cpenv-fingerprint":
+            header["fingerprint"] = value
+        elif key == "cpenv-requirement":
+            header["requirements"].append(value)
+        elif key == "cpenv-qual-name":
+            header["qual_names"].append(value)
+        elif key == "cpenv-module":
+            header["modules"].append(value)
+    return header
+
+
+def is_stale(path, requirements=None):
+    """Check if an exported file is missing or any of its modules changed.
+
+    Arguments:
+        path (str): Path to an exported file.
+        requirements (List[str]): Optional requirements the export is
+            expected to be written for. The export is stale when they differ
+            from the requirements it was written for.
+    """
+
+    try:
+        header = read_export_header(path)
+    except (OSError, IOError, ValueError):
+        return True
+
+    if not header["fingerprint"]:
+        return True
+
+    if requirements is not None and list(requirements) != header["requirements"]:
+        return True
+
+    expected = fingerprint(
+        header["modules"],
+        header["requirements"],
+        header["qual_names"],
+    )
+    return expected != header["fingerprint"]
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+Lockfiles record the result of resolving a list of requirements so that the
+same ModuleSpecs can be activated later without resolving them again.
+"""
+
+# Standard library imports
+import hashlib
+import json
+
+# Local imports
+from . import paths
+from .module import ModuleSpec, is_module
+from .repos import LocalRepo
+from .resolver import ResolveError
+from .vendor import yaml
+from .versions import parse_version
+
+__all__ = [
+    "read_lockfile",
+    "write_lockfile",
+    "load_lockfile",
+    "fingerprint",
+]
+lockfile_version = 1
+
+
+def fingerprint(data):
+    """Return a sha1 hexdigest of the parts of a module's config that affect
+    resolution and activation.
+
+    Arguments:
+        data (dict): Module config as returned by Repo.get_data.
+    """
+
+    blob = json.dumps(fingerprint_fields(data), sort_keys=True, default=str)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+
+def fingerprint_fields(data):
+    """Return the fields of a module's config used to compute fingerprints.
+
+    Repos fill in missing fields differently, ShotgunRepo.get_data defaults
+    requires to [] where a module.yml may leave it empty, so empty fields
+    are normalized before hashing.
+    """
+
+    return {
+        "name": data.get("name", None),
+        "version": str(data.get("version", None)),
+        "requires": data.get("requires", None) or [],
+        "environment": data.get("environment", None) or {},
+    }
+
+
+def fingerprint_path(path):
+    """Return the fingerprint of the module at path or None."""
+
+    try:
+        with open(paths.normalize(path, "module.yml"), "r") as f:
+            return fingerprint(yaml.safe_load(f.read()) or {})
+    except (OSError, IOError, yaml.YAMLError):
+        return None
+
+
+def write_lockfile(path, module_specs, requirements=None):
+    """Write a list of resolved ModuleSpecs to a lockfile.
+
+    Arguments:
+        path (str): Path to the lockfile.
+        module_specs (List[ModuleSpec]): Resolved ModuleSpecs in the order
+            they should be activated.
+        requirements (List[str]): Optional requirements used to resolve
+            module_specs. Stored for reference only.
+
+    Returns:
+        dict of lockfile data
+    """
+
+    modules = []
+    for module_spec in module_specs:
+        modules.append(
+            {
+                "name": module_spec.name,
+                "version": module_spec.version.string,
+                "repo": module_spec.repo.name,
+                "path": module_spec.path,
+                "fingerprint": fingerprint(module_spec.repo.get_data(module_spec)),
+            }
+        )
+
+    data = {
+        "version": lockfile_version,
+        "requirements": list(requirements or []),
+        "modules": modules,
+    }
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+    return data
+
+
+def read_lockfile(path):
+    """Read lockfile data from disk.
+
+    Raises:
+        ResolveError when the lockfile is missing or invalid.
+    """
+
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except (OSError, IOError, ValueError) as e:
+        raise ResolveError("Failed to read lockfile %s: %s" % (path, e))
+
+    if not isinstance(data, dict) or data.get("version") != lockfile_version:
+        raise ResolveError("Unsupported lockfile version: %s" % path)
+
+    return data
+
+
+def load_lockfile(path, repos, to_repo=None):
+    """Return the ModuleSpecs stored in a lockfile.
+
+    Locked modules that are available locally are returned without querying
+    any Repos. A module is available locally when its locked path is in a
+    LocalRepo or when it was previously localized to to_repo. Remaining
+    modules are looked up by qual_name in the Repo they were locked from.
+
+    Arguments:
+        path (str): Path to the lockfile.
+        repos (List[Repo]): Registered Repos.
+        to_repo (LocalRepo): Optional LocalRepo that modules are localized
+            to. Defaults to the "home" repo.
+
+    Raises:
+        ResolveError when a locked module is missing or changed since it was
+        locked.
+    """
+
+    repos_by_name = dict([(repo.name, repo) for repo in repos])
+    if to_repo is None:
+        to_repo = repos_by_name.get("home", None)
+
+    module_specs = []
+    for entry in read_lockfile(path)["modules"]:
+        module_spec = load_local_entry(entry, repos_by_name, to_repo)
+        if module_spec is None:
+            module_spec = load_remote_entry(entry, repos_by_name)
+        module_specs.append(module_spec)
+
+    return module_specs
+
+
+def entry_to_spec(entry, path, repo):
+    return ModuleSpec(
+        name=entry["name"],
+        qual_name=entry["name"] + "-" + entry["version"],
+        version=parse_version(entry["version"]),
+        path=path,
+        repo=repo,
+    )
+
+
+def load_local_entry(entry, repos_by_name, to_repo):
+    """Return a ModuleSpec for a lockfile entry if it's available locally."""
+
+    repo = repos_by_name.get(entry["repo"], None)
+    candidates = []
+    if isinstance(repo, LocalRepo):
+        candidates.append((entry["path"], repo))
+    elif isinstance(to_repo, LocalRepo):
+        qual_name = entry["name"] + "-" + entry["version"]
+        candidates.append((to_repo.relative_path(qual_name), to_repo))
+        candidates.append(
+            (to_repo.relative_path(entry["name"], entry["version"]), to_repo)
+        )
+
+    for path, local_repo in candidates:
+        if not is_module(path):
+            continue
+        if fingerprint_path(path) != entry["fingerprint"]:
+            if local_repo is repo:
+                raise ResolveError(
+                    "Locked module %s-%s has changed: %s"
+                    % (entry["name"], entry["version"], path)
+                )
+            continue
+        return entry_to_spec(entry, path, local_repo)
+
+
+def load_remote_entry(entry, repos_by_name):
+    """Lookup a lockfile entry in the Repo it was locked from."""
+
+    qual_name = entry["name"] + "-" + entry["version"]
+    repo = repos_by_name.get(entry["repo"], None)
+    if repo is None:
+        raise ResolveError(
+            "Locked module %s is from an unknown repo: %s" % (qual_name, entry["repo"])
+        )
+
+    for module_spec in repo.find(qual_name):
+        if module_spec.qual_name != qual_name:
+            continue
+        if fingerprint(repo.get_data(module_spec)) != entry["fingerprint"]:
+            raise ResolveError(
+                "Locked module %s has changed in %s" % (qual_name, repo.name)
+            )
+        return module_spec
+
+    raise ResolveError("Locked module %s is missing from %s" % (qual_name, repo.name))
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Per-file manifests of published modules.
+
+A manifest records the size, mtime and sha256 of every file in a module. They
+are written when modules are uploaded to a LocalRepo and let downloads reuse
+the files that are identical in versions of a module that are already local.
+"""
+
+# Standard library imports
+import hashlib
+import json
+import os
+from glob import glob
+
+# Local imports
+from . import paths
+
+__all__ = [
+    "create_manifest",
+    "write_manifest",
+    "read_manifest",
+    "find_local_sources",
+    "hash_file",
+]
+manifest_version = 1
+manifest_name = ".cpenv_manifest.json"
+max_siblings = 3
+chunk_size = 1024 * 1024
+
+
+def hash_file(path):
+    """Return the sha256 hexdigest of a file's contents."""
+
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def create_manifest(folder, hash_folder=None):
+    """Return a manifest of the files in a module folder.
+
+    Arguments:
+        folder (str): Module folder to stat files in.
+        hash_folder (str): Optional folder with identical contents to read
+            files from. Useful to avoid reading files back from a network
+            share right after uploading them.
+    """
+
+    files = {}
+    for rel_path, _ in paths.get_folder_manifest(folder)["files"]:
+        if rel_path == manifest_name:
+            continue
+        file_stat = os.stat(os.path.join(folder, rel_path))
+        files[rel_path.replace("\\", "/")] = {
+            "size": file_stat.st_size,
+            "mtime_ns": file_stat.st_mtime_ns,
+            "sha256": hash_file(os.path.join(hash_folder or folder, rel_path)),
+        }
+
+    return {"version": manifest_version, "files": files}
+
+
+def write_manifest(folder, manifest=None):
+    """Write a manifest to a module folder. Returns the manifest."""
+
+    if manifest is None:
+        manifest = create_manifest(folder)
+
+    with open(os.path.join(folder, manifest_name), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    return manifest
+
+
+def read_manifest(folder):
+    """Read the manifest of a module folder or return None."""
+
+    try:
+        with open(os.path.join(folder, manifest_name), "r") as f:
+            manifest = json.load(f)
+    except (OSError, IOError, ValueError):
+        return None
+
+    if not isinstance(manifest, dict) or manifest.get("version") != manifest_version:
+        return None
+
+    return manifest
+
+
+def find_siblings(where, module_spec):
+    """Return the paths of other versions of a module next to where.
+
+    Supports both flat and nested LocalRepos. Versions closest to module_spec
+    come first.
+    """
+
+    from .module import read_module_spec
+
+    where = paths.normalize(where)
+    siblings = []
+    pattern = os.path.join(os.path.dirname(where), "*", "module.yml")
+    for module_file in glob(pattern):
+        module_path = paths.parent(module_file)
+        if module_path == where:
+            continue
+        try:
+            spec = read_module_spec(module_path, None)
+        except Exception:
+            continue
+        if spec.name == module_spec.name and spec.version != module_spec.version:
+            siblings.append(spec)
+
+    older = [s for s in siblings if s.version < module_spec.version]
+    newer = [s for s in siblings if s.version > module_spec.version]
+    older.sort(key=lambda s: s.version, reverse=True)
+    newer.sort(key=lambda s: s.version)
+    return [s.path for s in (older + newer)[:max_siblings]]
+
+
+def is_identical(path, entry, local_entry=None):
+    """Check if the file at path matches a manifest entry.
+
+    Files are only hashed when they changed since their local manifest entry
+    was written or when they have no local manifest entry.
+    """
+
+    try:
+        file_stat = os.stat(path)
+    except OSError:
+        return False
+
+    if file_stat.st_size != entry["size"]:
+        return False
+
+    if local_entry and is_unchanged(path, local_entry, file_stat):
+        return local_entry["sha256"] == entry["sha256"]
+
+    return hash_file(path) == entry["sha256"]
+
+
+def is_unchanged(path, entry, file_stat=None):
+    """Check if a file still has the size and mtime of its manifest entry."""
+
+    try:
+        file_stat = file_stat or os.stat(path)
+    except OSError:
+        return False
+    return (file_stat.st_size, file_stat.st_mtime_ns) == (
+        entry["size"],
+        entry["mtime_ns"],
+    )
+
+
+def find_local_sources(module_spec, where):
+    """Find files of a module that are identical in local versions of it.
+
+    Looks for other versions of the module next to where, like the versions
+    of a module already localized to the same LocalRepo. Requires the module
+    to have a manifest. Files are matched by content, so renamed files are
+    found too.
+
+    Arguments:
+        module_spec (ModuleSpec): Module about to be copied to where.
+        where (str): Destination of the module.
+
+    Returns:
+        dict mapping paths of files in module_spec to identical local files.
+    """
+
+    manifest = read_manifest(module_spec.path)
+    if not manifest:
+        return {}
+
+    by_path = {}
+    by_hash = {}
+    for sibling in find_siblings(where, module_spec):
+        sibling_files = (read_manifest(sibling) or {}).get("files", {})
+        for rel_path in manifest["files"]:
+            local_path = os.path.join(sibling, rel_path)
+            local_entry = sibling_files.get(rel_path, None)
+            if local_entry is not None or os.path.isfile(local_path):
+                by_path.setdefault(rel_path, []).append((local_path, local_entry))
+
+        # Index files by hash to find files that moved between versions
+        for rel_path, local_entry in sibling_files.items():
+            by_hash.setdefault(local_entry["sha256"], []).append(
+                (os.path.join(sibling, rel_path), local_entry)
+            )
+
+    sources = {}
+    for rel_path, entry in manifest["files"].items():
+        path = os.path.join(module_spec.path, rel_path)
+        matches = by_path.get(rel_path, []) + by_hash.get(entry["sha256"], [])
+        for local_path, local_entry in matches:
+            if is_identical(local_path, entry, local_entry):
+                # Only trust the manifest while the file is unchanged
+                if is_unchanged(path, entry):
+                    sources[paths.normalize(path)] = local_path
+                break
+
+    return sources
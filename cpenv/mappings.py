@@ -68,10 +68,79 @@ class CaseInsensitiveDict(MutableMapping):
             return {key.lower(): value for key, value in mapping.items()}
 
 
+class CaseInsensitiveSet(object):
+    """An insertion ordered set of strings with case insensitive membership.
+
+    Used by EnvironmentDict to store list values like PATH. Checking
+    membership, appending, prepending and removing a value are O(1) where
+    a list would compare against every item.
+    """
+
+    def __init__(self, values=None):
+        self._items = collections.OrderedDict()
+        for value in values or []:
+            self.append(value)
+
+    def __repr__(self):
+        return "{}({!r})".format(self.__class__.__name__, list(self))
+
+    def __contains__(self, value):
+        return value.lower() in self._items
+
+    def __iter__(self):
+        return iter(self._items.values())
+
+    def __len__(self):
+        return len(self._items)
+
+    def __eq__(self, other):
+        if isinstance(other, (CaseInsensitiveSet, list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def append(self, value):
+        """Add a value to the tail of the set if it's not already present."""
+
+        key = value.lower()
+        if key not in self._items:
+            self._items[key] = value
+
+    def prepend(self, value):
+        """Add a value to the head of the set if it's not already present."""
+
+        key = value.lower()
+        if key not in self._items:
+            self._items[key] = value
+            self._items.move_to_end(key, last=False)
+
+    def discard(self, value):
+        """Remove a value from the set if present."""
+
+        self._items.pop(value.lower(), None)
+
+
+class ValueList(list):
+    """A list of values with the methods of CaseInsensitiveSet.
+
+    Used by EnvironmentDict to store list values when a custom add_condition
+    decides which values are added.
+    """
+
+    def prepend(self, value):
+        self.insert(0, value)
+
+    def discard(self, value):
+        if value in self:
+            self.remove(value)
+
+
 class EnvironmentDict(CaseInsensitiveDict):
     """A dict suited to storing and manipulating environment variables.
 
-    Lowercase comparisons are used to ensure unique keys and values.
+    Lowercase comparisons are used to ensure unique keys and values. List
+    values are stored in a CaseInsensitiveSet while the dict is modified and
+    returned as lists. Pass add_condition to decide which values are added
+    to lists instead, list values are then stored in a ValueList.
 
     The following methods make it easy to build an Environment.
     - set: insert or overwrite the value of a key.
@@ -94,15 +163,28 @@ class EnvironmentDict(CaseInsensitiveDict):
         self._add_condition = kwargs.pop("add_condition", ignore_case)
         super(EnvironmentDict, self).__init__(*args, **kwargs)
 
-    def _get_list(self, key):
-        value = self.get(key, None)
-        if value is None:
-            return []
-        if isinstance(value, env_value_types):
-            return [value]
-        if isinstance(value, Sequence):
+    def __getitem__(self, key):
+        value = super(EnvironmentDict, self).__getitem__(key)
+        if isinstance(value, (CaseInsensitiveSet, ValueList)):
             return list(value)
-        raise ValueError("%s could not be converted to a list." % value)
+        return value
+
+    def _new_values(self, values=()):
+        if self._add_condition is ignore_case:
+            return CaseInsensitiveSet(values)
+        return ValueList(values)
+
+    def _get_set(self, key):
+        item = self._items.get(key.lower(), None)
+        if item is None or item.value is None:
+            return self._new_values()
+        if isinstance(item.value, (CaseInsensitiveSet, ValueList)):
+            return item.value
+        if isinstance(item.value, env_value_types):
+            return self._new_values([item.value])
+        if isinstance(item.value, Sequence):
+            return self._new_values(item.value)
+        raise ValueError("%s could not be converted to a list." % item.value)
 
     def _coerce_value(self, value):
         if isinstance(value, env_value_types):
@@ -112,13 +194,17 @@ class EnvironmentDict(CaseInsensitiveDict):
             for v in value:
                 if v in (None, ""):
                     continue
-                result.append(str(value))
+                result.append(str(v))
             return result
         else:
             raise ValueError(self._value_error % type(value))
 
-    def _remove_condition(self, current_value, value):
-        return not self._add_condition(current_value, value)
+    def _add(self, result, value, add):
+        if self._add_condition is ignore_case:
+            # Already enforced by CaseInsensitiveSet
+            add(value)
+        elif self._add_condition(result, value):
+            add(value)
 
     def unset(self, key, value=None):
         """Unset a key."""
@@ -138,14 +224,12 @@ class EnvironmentDict(CaseInsensitiveDict):
         if key not in self:
             return
 
-        result = self._get_list(key)
+        result = self._get_set(key)
         if isinstance(value, env_value_types):
-            if self._remove_condition(result, value):
-                result.remove(value)
+            result.discard(value)
         elif isinstance(value, Sequence):
             for v in value:
-                if self._remove_condition(result, v):
-                    result.remove(v)
+                result.discard(v)
 
         if not result:
             self.pop(key, None)
@@ -158,16 +242,14 @@ class EnvironmentDict(CaseInsensitiveDict):
         Sets the value if the key does not exist.
         """
 
-        result = self._get_list(key)
+        result = self._get_set(key)
         value = self._coerce_value(value)
 
         if isinstance(value, env_value_types):
-            if self._add_condition(result, value):
-                result.insert(0, value)
+            self._add(result, value, result.prepend)
         elif isinstance(value, Sequence):
             for v in value:
-                if self._add_condition(result, v):
-                    result.insert(0, v)
+                self._add(result, v, result.prepend)
 
         self[key] = result
 
@@ -177,16 +259,14 @@ class EnvironmentDict(CaseInsensitiveDict):
         Sets the value if the key does not exist.
         """
 
-        result = self._get_list(key)
+        result = self._get_set(key)
         value = self._coerce_value(value)
 
         if isinstance(value, env_value_types):
-            if self._add_condition(result, value):
-                result.append(value)
+            self._add(result, value, result.append)
         elif isinstance(value, Sequence):
             for v in value:
-                if self._add_condition(result, v):
-                    result.append(v)
+                self._add(result, v, result.append)
 
         self[key] = result
 
@@ -312,28 +392,44 @@ def tokenize_dict(data):
     return EnvironmentDictTokenizer.tokenize(data)
 
 
+def compile_dict(data):
+    """Compile a dict into a plan that can be passed to `join_dicts` in place
+    of the dict.
+
+    A plan is a tuple of Ops for the current platform. Compiling a dict once
+    avoids tokenizing it each time it's joined. Plans only contain strings so
+    they can be serialized, Ops may be loaded back as lists of
+    [key, value, op].
+    """
+
+    return tuple(tokenize_dict(data))
+
+
 def join_dicts(*dicts, **kwargs):
     """Join a bunch of dicts.
 
     Arguments:
-        *dicts: Dictionaries to merge
+        *dicts: Dictionaries or plans returned by `compile_dict` to merge
         add_condition (fn): Used to check if a value should be added to a key
     """
 
     env_dict = EnvironmentDict(**kwargs)
     for data in dicts:
-        tokens = tokenize_dict(data)
-        for token in tokens:
-            if token.op == "unset":
-                env_dict.unset(token.key, token.value)
-            elif token.op == "set":
-                env_dict.set(token.key, token.value)
-            elif token.op == "remove":
-                env_dict.remove(token.key, token.value)
-            elif token.op == "prepend":
-                env_dict.prepend(token.key, token.value)
-            elif token.op == "append":
-                env_dict.append(token.key, token.value)
+        if isinstance(data, Mapping):
+            tokens = tokenize_dict(data)
+        else:
+            tokens = data
+        for key, value, op in tokens:
+            if op == "unset":
+                env_dict.unset(key, value)
+            elif op == "set":
+                env_dict.set(key, value)
+            elif op == "remove":
+                env_dict.remove(key, value)
+            elif op == "prepend":
+                env_dict.prepend(key, value)
+            elif op == "append":
+                env_dict.append(key, value)
     return dict(env_dict)
 
 
@@ -399,6 +495,96 @@ def expand_envvars(env):
     return out_env
 
 
+def get_template_names(value):
+    """Return the names of the variables referenced in a template string."""
+
+    if "$" not in value:
+        return []
+
+    names = []
+    for match in Template.pattern.finditer(value):
+        name = match.group("named") or match.group("braced")
+        if name:
+            names.append(name)
+    return names
+
+
+def expand_changes(changes, env):
+    """Expand the variables in a dict of changed environment variables.
+
+    Values are expanded in dependency order. References to other changed
+    variables use their expanded value, and all other references use the
+    value in env. A variable referencing itself, directly or through a cycle,
+    uses its value in env.
+
+    :param changes: Dict of changed environment variables
+    :param env: Environment the changes are applied to
+    """
+
+    expanded = {}
+
+    def expand(key, stack):
+        if key in expanded:
+            return expanded[key]
+
+        stack.add(key)
+        mapping = {}
+        for name in get_template_names(changes[key]):
+            if name in changes and name not in stack:
+                mapping[name] = expand(name, stack)
+            elif name in env:
+                mapping[name] = env[name]
+        stack.discard(key)
+
+        expanded[key] = Template(changes[key]).safe_substitute(mapping)
+        return expanded[key]
+
+    for key in changes:
+        expand(key, set())
+    return expanded
+
+
+def env_delta(*env_dicts, **kwargs):
+    """Return the changes that joining env_dicts makes to an environment.
+
+    Only the variables touched by env_dicts are read from the environment,
+    joined and expanded. Activating modules costs time proportional to the
+    size of their environments rather than the size of the environment they
+    are activated in.
+
+    Arguments:
+        *env_dicts: Dictionaries or plans returned by `compile_dict` to join
+        env (dict): Environment to join with. Defaults to os.environ.
+        pathsep (str): Path separator used to split and join lists.
+
+    Returns:
+        (dict, list) - variables to set and names of variables to unset.
+    """
+
+    env = kwargs.get("env", None)
+    if env is None:
+        env = os.environ
+    pathsep = kwargs.get("pathsep", os.pathsep)
+
+    plans = []
+    touched = set()
+    for data in env_dicts:
+        plan = compile_dict(data) if isinstance(data, Mapping) else data
+        touched.update([key.lower() for key, _, _ in plan])
+        plans.append(plan)
+
+    if not touched:
+        return {}, []
+
+    old_env = dict([(k, v) for k, v in env.items() if k.lower() in touched])
+    new_env_dict = join_dicts(env_to_dict(old_env, pathsep), *plans)
+    new_env = expand_changes(dict_to_env(new_env_dict, pathsep), env)
+
+    set_vars = dict([(k, v) for k, v in new_env.items() if env.get(k) != v])
+    unset_vars = [k for k in old_env if k not in new_env]
+    return set_vars, unset_vars
+
+
 def get_store_env_tmp():
     """Returns an unused random filepath."""
 
@@ -450,14 +636,93 @@ def restore_env_from_file(env_file):
     restore_env(env_dict)
 
 
+class EnvJournal(object):
+    """Records the original values of the environment variables changed by
+    `set_env` and `switch_env` so they can be restored.
+
+    Only the first change to a variable is recorded, reverting restores the
+    value it had before it was first changed.
+    """
+
+    def __init__(self):
+        self.original = {}
+
+    def __len__(self):
+        return len(self.original)
+
+    def record(self, key):
+        """Record the current value of key unless it was already recorded."""
+
+        if key not in self.original:
+            self.original[key] = os.environ.get(key, None)
+
+    def original_env(self):
+        """Return a copy of os.environ with recorded variables restored."""
+
+        env = dict(os.environ)
+        for k, v in self.original.items():
+            if v is None:
+                env.pop(k, None)
+            else:
+                env[k] = v
+        return env
+
+    def revert(self):
+        """Restore recorded variables in os.environ and clear the journal."""
+
+        for k, v in self.original.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+        self.original.clear()
+
+
+# Journal of the changes made to os.environ in this process
+journal = EnvJournal()
+
+
 def set_env(*env_dicts):
     """Set environment variables in the current python process from a dict
-    containing envvars and values."""
+    containing envvars and values.
+
+    Only the variables touched by env_dicts are changed, see `env_delta`.
+    Changes are recorded in the journal.
+    """
 
-    old_env_dict = env_to_dict(dict(os.environ))
-    new_env_dict = join_dicts(old_env_dict, *env_dicts)
-    new_env = dict_to_env(new_env_dict)
-    replace_osenviron(expand_envvars(new_env))
+    set_vars, unset_vars = env_delta(*env_dicts)
+    for k in unset_vars:
+        journal.record(k)
+        os.environ.pop(k, None)
+
+    for k, v in set_vars.items():
+        journal.record(k)
+        os.environ[k] = v
+
+
+def switch_env(*env_dicts):
+    """Replace the changes recorded in the journal with env_dicts.
+
+    The result is the same as reverting the journal and calling `set_env`,
+    but only variables whose values differ from the result are changed.
+    """
+
+    env = journal.original_env()
+    set_vars, unset_vars = env_delta(*env_dicts, env=env)
+    env.update(set_vars)
+    for k in unset_vars:
+        env.pop(k, None)
+
+    for k in set(journal.original) | set(set_vars) | set(unset_vars):
+        value = env.get(k, None)
+        if os.environ.get(k, None) == value:
+            continue
+
+        journal.record(k)
+        if value is None:
+            os.environ.pop(k, None)
+        else:
+            os.environ[k] = value
 
 
 def set_env_from_file(env_file):
@@ -3,19 +3,30 @@ from __future__ import absolute_import, print_function
 
 # Standard library imports
 import os
+import re
 import sys
+import threading
 from collections import namedtuple
+from functools import lru_cache
 from string import Template
 
 # Local imports
-from . import compat, paths
+from . import compat, mappings, paths
 from .hooks import HookFinder, get_global_hook_path
 from .vendor import yaml
-from .versions import ParseError, Version, default_version, parse_version
+from .vendor.cachetools import LRUCache
+from .versions import (
+    ParseError,
+    Version,
+    default_version,
+    parse_version,
+    parse_version_range,
+)
 
 __all__ = [
     "Module",
     "ModuleSpec",
+    "Requirement",
 ]
 
 
@@ -31,6 +42,15 @@ module_header = """
 """
 
 
+module_header_pattern = re.compile(r"^(?P<key>name|version)\s*:\s*(?P<value>.*?)\s*$")
+config_cache_size = 1024
+config_cache = LRUCache(maxsize=config_cache_size)
+config_cache_lock = threading.Lock()
+requirement_range_pattern = re.compile(
+    r"^(?P<name>[^<>=!~\s]+)\s*(?P<range>[<>=!~].*)$"
+)
+
+
 ModuleSpec = namedtuple(
     "ModuleSpec",
     ["name", "qual_name", "version", "path", "repo"],
@@ -41,19 +61,13 @@ class Module(object):
     def __init__(self, path, name=None, version=None, repo=None):
 
         self.path = paths.normalize(path)
-        if repo is None:
-            from . import repos
 
-            self.repo = repos.LocalRepo("_tmp", paths.parent(self.path))
-        else:
-            self.repo = repo
+        # Default LocalRepo is created on first use
+        self._repo = repo
 
-        # Create HookFinder for this module
+        # HookFinder is created on first use
         self.hook_path = self.relative_path("hooks")
-        self.hook_finder = HookFinder(
-            self.hook_path,
-            get_global_hook_path(),
-        )
+        self._hook_finder = None
 
         # Setup config
         self.config_path = self.relative_path("module.yml")
@@ -64,7 +78,9 @@ class Module(object):
         }
         self._raw_config = None
         self._config = None
+        self._plans = None
         self._env = None
+        self._plan = None
 
         # Determine name, version, qual_name
         if name and version:
@@ -75,10 +91,12 @@ class Module(object):
 
         else:
 
-            # Check config
+            # Check config - try the header first to avoid parsing the whole file
             if self.exists:
-                name = self.config.get("name", None)
-                version = self.config.get("version", None)
+                name, version = read_module_header(self.config_path)
+                if name is None or version is None:
+                    name = self.config.get("name", None)
+                    version = self.config.get("version", None)
                 if version:
                     version = parse_version(version)
 
@@ -130,6 +148,27 @@ class Module(object):
             version=kwargs.get("version", self.version),
         )
 
+    @property
+    def repo(self):
+        if self._repo is None:
+            from . import repos
+
+            self._repo = repos.LocalRepo("_tmp", paths.parent(self.path))
+        return self._repo
+
+    @repo.setter
+    def repo(self, value):
+        self._repo = value
+
+    @property
+    def hook_finder(self):
+        if self._hook_finder is None:
+            self._hook_finder = HookFinder(
+                self.hook_path,
+                get_global_hook_path(),
+            )
+        return self._hook_finder
+
     def relative_path(self, *args):
         """Get a path relative to this module"""
 
@@ -165,7 +204,7 @@ class Module(object):
     def is_active(self):
         from . import api
 
-        return self.qual_name in api.get_active_modules()
+        return self in api.get_active_modules()
 
     @property
     def exists(self):
@@ -182,19 +221,15 @@ class Module(object):
 
         return self._raw_config
 
+    def _read_config(self):
+        entry = get_config_entry(self.config_path, self.config_vars)
+        self._config = dict(entry[1])
+        self._plans = entry[2]
+
     @property
     def config(self):
         if self._config is None:
-
-            if not self.raw_config:
-                self._config = {}
-                return self._config
-
-            self._config = read_config(
-                self.config_path,
-                self.config_vars,
-                self._raw_config,
-            )
+            self._read_config()
 
         return self._config
 
@@ -213,14 +248,34 @@ class Module(object):
     @property
     def environment(self):
         if self._env is None:
-            self._env = self.config.get("environment", {})
+            self._env = dict(self.config.get("environment", None) or {})
             self._env["CPENV_ACTIVE_MODULES"] = {"append": self.qual_name}
+            self._env["CPENV_ACTIVE_MODULE_PATHS"] = {"append": self.path}
 
         return self._env
 
+    @property
+    def plan(self):
+        """The environment compiled for the current platform.
+
+        Plans are cached with the module's config, so Modules created for the
+        same path only compile it once. See mappings.compile_dict.
+        """
+
+        if self._plan is None:
+            if self._plans is None:
+                self._read_config()
+            plan = self._plans.get(self.qual_name, None)
+            if plan is None:
+                plan = mappings.compile_dict(self.environment)
+                self._plans[self.qual_name] = plan
+            self._plan = plan
+
+        return self._plan
+
     @property
     def requires(self):
-        return self.config.get("email", [])
+        return self.config.get("requires", None) or []
 
     @property
     def icon(self):
@@ -231,6 +286,42 @@ class Module(object):
         return os.path.isfile(self.icon)
 
 
+def get_config_entry(module_file, config_vars):
+    """Read and format a module.yml file caching the result in memory.
+
+    Cached entries are reused while the mtime and size of module_file are
+    unchanged, so Modules created for the same path in one process only parse
+    it once. Files with a racy mtime, see paths.is_racy, are not cached. The
+    config_cache keeps the most recently used config_cache_size entries.
+
+    Returns:
+        (stamp, config, plans) tuple where plans maps qual_names to the
+        compiled environment of the module, see Module.plan. Callers must
+        copy config before modifying it.
+    """
+
+    try:
+        stat = os.stat(module_file)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        stat = stamp = None
+
+    with config_cache_lock:
+        cached = config_cache.get(module_file, None)
+    if stamp and cached and cached[0] == stamp:
+        return cached
+
+    data = read_raw_config(module_file)
+    config = (read_config(module_file, config_vars, data) if data else None) or {}
+    entry = (stamp, config, {})
+
+    if stamp and not paths.is_racy(stat.st_mtime):
+        with config_cache_lock:
+            config_cache[module_file] = entry
+
+    return entry
+
+
 def read_raw_config(module_file):
     """'Read the raw text data of a module.yml file"""
 
@@ -238,6 +329,86 @@ def read_raw_config(module_file):
         return f.read()
 
 
+def read_module_header(module_file):
+    """Read the name and version from a module.yml without parsing all of it.
+
+    Only top-level plain or quoted scalars are supported. Reading stops as
+    soon as both keys are found.
+
+    Returns:
+        (name, version) - either may be None when it could not be read.
+    """
+
+    header = {}
+    with open(module_file, "r") as f:
+        for line in f:
+            match = module_header_pattern.match(line)
+            if not match:
+                continue
+
+            key = match.group("key")
+            if key not in header:
+                header[key] = parse_header_value(match.group("value"))
+
+            if len(header) == 2:
+                break
+
+    return header.get("name", None), header.get("version", None)
+
+
+def parse_header_value(value):
+    """Parse a simple yaml scalar from a module.yml header.
+
+    Returns None for values that need a full yaml parse or Template
+    substitution.
+    """
+
+    if value[:1] in ("'", '"'):
+        quote = value[0]
+        end = value.find(quote, 1)
+        while quote == "'" and value[end + 1 : end + 2] == "'":
+            end = value.find(quote, end + 2)
+        if end == -1 or value[end + 1 :].strip()[:1] not in ("", "#"):
+            return
+        value = value[1:end]
+        if quote == "'":
+            value = value.replace("''", "'")
+        elif "\\" in value:
+            return
+    else:
+        value = value.split(" #", 1)[0].strip()
+        if value[:1] in ("", "&", "*", "!", "|", ">", "[", "{", "#"):
+            return
+
+    if not value or "$" in value:
+        return
+
+    return value
+
+
+def read_module_spec(path, repo):
+    """Return a ModuleSpec for the module at path.
+
+    Cheaper than creating a Module because only the name and version are
+    read from the module.yml header. Falls back to creating a Module when the
+    header can not be read.
+    """
+
+    path = paths.normalize(path)
+    name, version = read_module_header(path + "/module.yml")
+    if name is None or version is None:
+        return Module(path, repo=repo).to_spec()
+
+    version = parse_version(version)
+    return ModuleSpec(
+        name=name,
+        qual_name=name + "-" + version.string,
+        version=version,
+        path=path,
+        repo=repo,
+    )
+
+
 def read_config(module_file, config_vars=None, data=None):
     """Read and formats a module.yml file"""
 
@@ -290,21 +461,87 @@ def parse_module_path(path, default_version=default_version):
     return name, version
 
 
+class Requirement(str):
+    """A requirement string with its name and version parsed.
+
+    Requirements are strings so they can be passed anywhere a requirement
+    string is expected. Use parse_requirement to create them, it caches
+    Requirements by their raw string so each string is only parsed once.
+
+    Requirements may include a version range like "my_module>=2.0,<3".
+
+    Attributes:
+        name (str): Name of the required module.
+        version (Version): Required version or None. For version ranges this
+            is the version of an == clause.
+        version_range (VersionRange): Required version range or None.
+    """
+
+    def __new__(cls, requirement, name, version, version_range=None):
+        obj = str.__new__(cls, requirement)
+        obj.name = name
+        obj.version = version
+        obj.version_range = version_range
+        return obj
+
+    def __reduce__(self):
+        return (
+            Requirement,
+            (str(self), self.name, self.version, self.version_range),
+        )
+
+
+def parse_requirement(requirement):
+    """Return a Requirement for a requirement string.
+
+    Raises:
+        ParseError when the requirement has an invalid version range.
+    """
+
+    if isinstance(requirement, Requirement):
+        return requirement
+    return _parse_requirement(requirement)
+
+
+@lru_cache(maxsize=4096)
+def _parse_requirement(requirement):
+    match = requirement_range_pattern.match(requirement)
+    if match:
+        version_range = parse_version_range(match.group("range"))
+        return Requirement(
+            requirement,
+            match.group("name"),
+            version_range.exact,
+            version_range,
+        )
+
+    name, version = _parse_module_requirement(requirement)
+    return Requirement(requirement, name, version)
+
+
 def parse_module_requirement(requirement, default_version=None):
     """Given a requirement, return a name and version."""
 
+    requirement = parse_requirement(requirement)
+    if requirement.version is not None or default_version is None:
+        return requirement.name, requirement.version
+
+    if callable(default_version):
+        return requirement.name, default_version()
+    return requirement.name, default_version
+
+
+def _parse_module_requirement(requirement):
+    """Parse a requirement string into a name and version."""
+
     if "\\" in requirement or "/" in requirement:
         # Probably a system path - lets parse it.
-        return parse_module_path(requirement, default_version=default_version)
+        return parse_module_path(requirement, default_version=None)
 
     try:
         version = parse_version(requirement)
     except ParseError:
-        if callable(default_version):
-            default = default_version()
-        else:
-            default = default_version
-        return requirement, default
+        return requirement, None
 
     name = requirement
     head = requirement.replace(version.string, "")
@@ -314,31 +551,118 @@ def parse_module_requirement(requirement, default_version=None):
     return name, version
 
 
+class ModuleSpecIndex(object):
+    """Lookup table of ModuleSpecs keyed by name.
+
+    Each name maps to a list of ModuleSpecs sorted from lowest to highest
+    version along with a parallel list of version sort keys. This allows
+    Repos to answer a requirement by parsing it once and comparing it against
+    only the ModuleSpecs sharing its name. Version ranges are answered by
+    bisecting the sort keys.
+
+    Arguments:
+        module_specs (List[ModuleSpec]): ModuleSpecs to index.
+    """
+
+    def __init__(self, module_specs=None):
+        self.names = {}
+        self.keys = {}
+        self.qual_names = {}
+        for module_spec in module_specs or []:
+            self.names.setdefault(module_spec.name, []).append(module_spec)
+            self.qual_names.setdefault(module_spec.qual_name, []).append(module_spec)
+
+        for name, specs in self.names.items():
+            specs.sort(key=lambda spec: spec.version.sort_key)
+            self.keys[name] = [spec.version.sort_key for spec in specs]
+
+    def find(self, requirement):
+        """Return ModuleSpecs matching requirement ordered from best to worst.
+
+        Exact matches come first followed by partial matches sorted from
+        highest to lowest version. Requirements with a version range only
+        match ModuleSpecs in range, sorted from highest to lowest version.
+        """
+
+        requirement = parse_requirement(requirement)
+        name, version = requirement.name, requirement.version
+
+        if requirement.version_range:
+            return self.find_range(name, requirement.version_range)
+
+        exact_matches = []
+        partial_matches = []
+        for module_spec in reversed(self.names.get(name, [])):
+            if module_spec.qual_name == requirement or (
+                version and module_spec.version == version
+            ):
+                exact_matches.append(module_spec)
+            else:
+                partial_matches.append(module_spec)
+
+        # A qual_name may parse to a different name than the one stored in
+        # the ModuleSpec, like "my_v-1.0", so also check qual_names directly.
+        for module_spec in self.qual_names.get(requirement, []):
+            if module_spec.name != name:
+                exact_matches.append(module_spec)
+
+        return exact_matches + partial_matches
+
+    def find_range(self, name, version_range):
+        """Return ModuleSpecs named name in a VersionRange from highest to
+        lowest version.
+        """
+
+        specs = self.names.get(name, [])
+        start, stop = version_range.bounds(self.keys.get(name, []))
+        return [
+            module_spec
+            for module_spec in reversed(specs[start:stop])
+            if version_range.contains(module_spec.version)
+        ]
+
+
 def is_exact_match(requirement, module_spec):
     """Is the module_spec an exact match for the provided requirement?"""
 
-    name, version = parse_module_requirement(requirement)
-    return (
-        module_spec.qual_name == requirement
-        or (version and module_spec.name == name and module_spec.version == version)
+    requirement = parse_requirement(requirement)
+    return module_spec.qual_name == requirement or (
+        requirement.version
+        and module_spec.name == requirement.name
+        and module_spec.version == requirement.version
+    )
+
+
+def is_in_range(requirement, module_spec):
+    """Is the module_spec in the version range of the provided requirement?
+
+    Requirements without a version range match any version.
+    """
+
+    requirement = parse_requirement(requirement)
+    return module_spec.name == requirement.name and (
+        requirement.version_range is None
+        or requirement.version_range.contains(module_spec.version)
     )
 
 
 def is_partial_match(requirement, module_spec):
     """Is the module_spec a partial match for the provided requirement?"""
 
-    name, version = parse_module_requirement(requirement)
-    return module_spec.name == name
+    return module_spec.name == parse_requirement(requirement).name
 
 
 def best_match(requirement, module_specs):
 
-    name, version = parse_module_requirement(
-        requirement, Version(0, 0, 0, None, None, "*")
-    )
+    requirement = parse_requirement(requirement)
+    version = requirement.version
+    if version is None:
+        version = Version(0, 0, 0, None, None, "*")
 
     best_match = None
     for module_spec in module_specs:
+        if requirement.version_range and not is_in_range(requirement, module_spec):
+            continue
         if is_exact_match(requirement, module_spec):
             return module_spec
         if version < module_spec.version:
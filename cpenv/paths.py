@@ -4,12 +4,17 @@ Tools for working with paths and files.
 """
 
 # Standard library imports
+import json
 import os
 import shutil
 import stat
-import zipfile
+import threading
+import time
 from fnmatch import fnmatch
 
+default_copy_workers = 1
+racy_seconds = 2
+
 
 def normalize(*parts):
     """Join, expand, and normalize a filepath."""
@@ -29,23 +34,30 @@ def ensure_path_exists(path, *args):
     if os.path.exists(path):
         return
 
-    os.makedirs(path, *args)
+    try:
+        os.makedirs(path, *args)
+    except OSError:
+        # Created by another thread or process
+        if not os.path.isdir(path):
+            raise
 
 
 def is_writable(path):
-    """Check if a directory is writable."""
+    """Check if a directory is writable.
+
+    Missing directories are created and left in place. Removing them again
+    would pull them out from under other threads checking the same path.
+    """
 
     if os.path.exists(path):
         return os.access(path, os.X_OK | os.W_OK)
 
     try:
-        os.makedirs(path)
-        touch(normalize(path, "tmpfile"))
+        ensure_path_exists(path)
     except OSError:
         return False
-    else:
-        rmtree(path)
-        return True
+
+    return os.access(path, os.X_OK | os.W_OK)
 
 
 def rmtree(path):
@@ -88,6 +100,37 @@ def touch(filepath):
         os.utime(filepath, None)
 
 
+def is_racy(mtime):
+    """Check if an mtime is too recent to trust.
+
+    Like git's index, mtimes within racy_seconds of now are not trusted
+    because filesystems with coarse timestamps could hide changes made in
+    the same tick. Caches should not store anything validated by a racy mtime.
+    """
+
+    return mtime >= time.time() - racy_seconds
+
+
+def write_json(path, data, **kwargs):
+    """Atomically write data to a json file.
+
+    The data is written to a temporary file next to path and moved into place
+    so concurrent readers only ever see a complete file or no file. Missing
+    parent directories are created. Additional kwargs are passed to json.dump.
+    """
+
+    ensure_path_exists(os.path.dirname(path))
+    tmp_path = "%s.%s.%s.tmp" % (path, os.getpid(), threading.get_ident())
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, **kwargs)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
 def format_size(bytesize):
     """Human readable size."""
 
@@ -228,9 +271,153 @@ def get_folder_info(folder):
     return info
 
 
+def get_folder_manifest(folder):
+    """Scan a folder once and return the files to copy and their sizes.
+
+    Uses the same excludes and includes as exclusive_walk and skips symlinks.
+
+    Returns:
+        A dict containing the size, dirs, and files of a folder. dirs is a
+        list of the relative directories containing files and files is a list
+        of (rel_path, size) tuples.
+    """
+
+    manifest = {
+        "size": 0,
+        "dirs": [],
+        "files": [],
+    }
+    for root, _, files in exclusive_walk(folder):
+        rel_root = os.path.relpath(root, folder)
+        has_files = False
+        for file in files:
+            try:
+                file_stat = os.lstat(os.path.join(root, file))
+            except OSError:
+                continue
+            if stat.S_ISLNK(file_stat.st_mode):
+                continue
+            rel_path = os.path.normpath(os.path.join(rel_root, file))
+            manifest["size"] += file_stat.st_size
+            manifest["files"].append((rel_path, file_stat.st_size))
+            has_files = True
+        if has_files and rel_root != ".":
+            manifest["dirs"].append(rel_root)
+    return manifest
+
+
+def get_copy_workers():
+    """Return the max number of files to copy at once from CPENV_COPY_WORKERS."""
+
+    try:
+        return max(1, int(os.getenv("CPENV_COPY_WORKERS", default_copy_workers)))
+    except Exception:
+        return default_copy_workers
+
+
+def copy_file(src, dst, size=None):
+    """Copy a file and its metadata like shutil.copy2.
+
+    Uses os.copy_file_range where available which lets filesystems like NFS
+    and btrfs copy data without passing it through this process. Falls back
+    to shutil.copy2 which uses sendfile or fcopyfile where available.
+    """
+
+    if hasattr(os, "copy_file_range"):
+        try:
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                if size is None:
+                    size = os.fstat(fsrc.fileno()).st_size
+                remaining = size
+                while remaining > 0:
+                    copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                    if not copied:
+                        break
+                    remaining -= copied
+            if remaining <= 0:
+                shutil.copystat(src, dst)
+                return
+        except OSError:
+            # Not supported between these filesystems
+            pass
+
+    shutil.copy2(src, dst)
+
+
+def copy_folder(
+    src,
+    dst,
+    manifest=None,
+    progress_cb=None,
+    max_workers=None,
+    copy_func=None,
+):
+    """Copy the files listed in a manifest from src to dst.
+
+    Directories are created up front and files are copied one at a time by
+    default. Raise CPENV_COPY_WORKERS to copy files with a pool of threads,
+    which hides the latency of network filesystems but only slows down
+    copies between local disks.
+
+    Arguments:
+        src (str): Folder to copy.
+        dst (str): Destination folder.
+        manifest (dict): Optional manifest from get_folder_manifest.
+        progress_cb (callable): Called with the size of each copied file.
+        max_workers (int): Max number of files to copy at once. Defaults to
+            CPENV_COPY_WORKERS.
+        copy_func (callable): Called with (src, dst, size) to copy each file.
+            Defaults to copy_file.
+
+    Returns:
+        The manifest of src.
+    """
+
+    if manifest is None:
+        manifest = get_folder_manifest(src)
+
+    ensure_path_exists(dst)
+    for rel_dir in manifest["dirs"]:
+        ensure_path_exists(os.path.join(dst, rel_dir))
+
+    copy_func = copy_func or copy_file
+
+    def copy(entry):
+        rel_path, size = entry
+        copy_func(os.path.join(src, rel_path), os.path.join(dst, rel_path), size)
+        return size
+
+    files = manifest["files"]
+    max_workers = min(max_workers or get_copy_workers(), len(files))
+    if max_workers <= 1:
+        for entry in files:
+            size = copy(entry)
+            if progress_cb:
+                progress_cb(size)
+        return manifest
+
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(copy, entry) for entry in files]
+        try:
+            for future in as_completed(futures):
+                size = future.result()
+                if progress_cb:
+                    progress_cb(size)
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
+
+    return manifest
+
+
 def zip_folder_from_info(info, where, progress_cb=None):
     """Zips a folder using info provided by `get_folder_info`."""
 
+    import zipfile
+
     parent = os.path.dirname(where)
     if not os.path.isdir(parent):
         os.makedirs(parent)
@@ -245,6 +432,8 @@ def zip_folder_from_info(info, where, progress_cb=None):
 def zip_folder(folder, where):
     """Zip the contents of a folder."""
 
+    import zipfile
+
     parent = os.path.dirname(where)
     if not os.path.isdir(parent):
         os.makedirs(parent)
@@ -44,6 +44,15 @@ class ProgressBar(object):
 
 
 class Reporter(object):
+    """Receives events from Resolvers, Localizers and Repos.
+
+    Localizer.localize downloads modules concurrently, so localize_module
+    and the progress events may be called from multiple threads at once.
+    Each concurrent download reports progress under a unique label like
+    "Download my_module-0.1.0", so subclasses can show a progress bar per
+    label.
+    """
+
     ProgressBar = ProgressBar
 
     def start_resolve(self, requirements):
@@ -68,13 +77,13 @@ class Reporter(object):
         """Called when Localizer.localize is done."""
 
     def start_progress(self, label, max_size, data):
-        """Called when a download is started."""
+        """Called when a download is started. May be called from any thread."""
 
     def update_progress(self, label, chunk_size, data):
-        """Called each time a chunk is downloaded."""
+        """Called each time a chunk is downloaded. May be called from any thread."""
 
     def end_progress(self, label, data):
-        """Called when a download is finished."""
+        """Called when a download is finished. May be called from any thread."""
 
     @contextlib.contextmanager
     def progress_bar(self, label, max_size, data=None):
@@ -1,5 +1,6 @@
 # Local imports
 from .base import Repo
+from .fanout import RepoQuery
 from .filesystem import LocalRepo, RemoteRepo
 from .shotgun import ShotgunRepo
 
@@ -6,10 +6,19 @@ class Repo(object):
 
     A Repo is a source of modules. They can be local or remote so long as they
     provide this interface.
+
+    Query methods like find, find_many, list and get_requires are called
+    from a single worker thread per Repo by RepoQuery, so they never run
+    concurrently with each other. They may run while the Localizer is
+    downloading from the same Repo though, and download itself is called
+    from up to max_downloads threads at once. Subclasses that raise
+    max_downloads must guard any state shared by download and the query
+    methods.
     """
 
     type_name = "repo"
     priority = 10
+    max_downloads = 1
 
     def __init__(self, name, priority=None):
         self.name = name
@@ -37,6 +46,15 @@ class Repo(object):
 
         return NotImplemented
 
+    def find_many(self, requirements):
+        """Given a list of requirements, return a list of ModuleSpecs for each.
+
+        Results are in the same order as requirements. Repos that can look
+        up many requirements in a single request should override this method.
+        """
+
+        return [self.find(requirement) for requirement in requirements]
+
     def list(self):
         """Return a list of ModuleSpecs in this Repo."""
 
@@ -73,6 +91,16 @@ class Repo(object):
 
         return {}
 
+    def get_requires(self, module_spec):
+        """Given a module_spec, return the list of requirements of a module.
+
+        Used by the Resolver to resolve dependencies. Repos may override this
+        method when requires can be looked up more cheaply than the full
+        module data.
+        """
+
+        return self.get_data(module_spec).get("requires", None) or []
+
     def get_size(self, module_spec):
         """Given a module_spec, return the size of a module in the repo.
 
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Query multiple Repos concurrently while reading results in priority order.
+"""
+
+# Standard library imports
+import os
+import threading
+import weakref
+
+__all__ = [
+    "RepoQuery",
+    "fanout_enabled",
+    "get_max_workers",
+]
+default_max_workers = 8
+_lock = threading.Lock()
+_executors = weakref.WeakKeyDictionary()
+_semaphores = {}
+
+
+def fanout_enabled():
+    """Check if concurrent repo queries are disabled via CPENV_DISABLE_FANOUT."""
+
+    try:
+        return not int(os.getenv("CPENV_DISABLE_FANOUT", 0))
+    except Exception:
+        return True
+
+
+def get_max_workers():
+    """Return the max number of Repos to query at once from CPENV_MAX_WORKERS."""
+
+    try:
+        return max(1, int(os.getenv("CPENV_MAX_WORKERS", default_max_workers)))
+    except Exception:
+        return default_max_workers
+
+
+def get_semaphore(max_workers):
+    """Return a semaphore limiting the number of Repos queried at once."""
+
+    with _lock:
+        if max_workers not in _semaphores:
+            _semaphores[max_workers] = threading.BoundedSemaphore(max_workers)
+        return _semaphores[max_workers]
+
+
+def get_executor(repo):
+    """Return a single threaded executor for a Repo.
+
+    Repos are not required to be thread-safe, so each Repo gets a thread of
+    its own and queries to the same Repo run one at a time.
+    """
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    with _lock:
+        executor = _executors.get(repo, None)
+        if executor is None:
+            executor = _executors[repo] = ThreadPoolExecutor(max_workers=1)
+        return executor
+
+
+class RepoQuery(object):
+    """Call a method on a list of Repos and iterate over the results.
+
+    The method is called on all Repos at once, up to CPENV_MAX_WORKERS Repos
+    at a time. Iterating yields (repo, result) tuples in the order of repos,
+    so results keep repo priority regardless of which Repo responds first.
+    Stop iterating to avoid waiting for lower priority Repos and call cancel
+    to drop their queries if they have not started yet. Iterating again
+    continues where the last iteration stopped.
+
+    Repos are queried sequentially and lazily when fan-out is disabled by
+    setting CPENV_DISABLE_FANOUT or when there is only a single Repo.
+
+    Arguments:
+        repos (List[Repo]): Repos to query in priority order.
+        method (str): Name of the Repo method to call.
+        *args: Arguments passed to the method.
+
+    Examples:
+        >>> query = RepoQuery(cpenv.get_repos(), 'find', 'my_module')
+        >>> for repo, module_specs in query:
+        ...     if module_specs:
+        ...         query.cancel()
+        ...         break
+    """
+
+    def __init__(self, repos, method, *args):
+        self.repos = list(repos)
+        self.method = method
+        self.args = args
+        self._results = []
+        self._futures = None
+
+        max_workers = get_max_workers()
+        if len(self.repos) > 1 and max_workers > 1 and fanout_enabled():
+            self._semaphore = get_semaphore(max_workers)
+            self._futures = [self._submit(repo) for repo in self.repos]
+
+    def _submit(self, repo):
+        return get_executor(repo).submit(self._call, repo)
+
+    def _call(self, repo):
+        with self._semaphore:
+            return getattr(repo, self.method)(*self.args)
+
+    def __iter__(self):
+        for i, repo in enumerate(self.repos):
+            if i == len(self._results):
+                if self._futures is None:
+                    result = getattr(repo, self.method)(*self.args)
+                elif self._futures[i].cancelled():
+                    result = self._submit(repo).result()
+                else:
+                    result = self._futures[i].result()
+                self._results.append(result)
+            yield repo, self._results[i]
+
+    def results(self):
+        """Return a list of the results from all Repos."""
+
+        return [result for _, result in self]
+
+    def cancel(self):
+        """Cancel queries that have not started yet."""
+
+        for future in self._futures or []:
+            future.cancel()
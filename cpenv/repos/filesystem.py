@@ -3,15 +3,17 @@
 # Standard library imports
 import logging
 import os
-import shutil
 from fnmatch import fnmatch
 from functools import partial
 from glob import glob
 
 # Local imports
 from .. import compat, paths
+from ..blobstore import get_blob_store
+from ..catalog import ModuleCatalog, catalog_enabled
 from ..environment import Environment
-from ..module import Module, is_exact_match, is_partial_match, sort_modules
+from ..manifest import create_manifest, find_local_sources, write_manifest
+from ..module import Module, ModuleSpecIndex, read_module_spec, sort_modules
 from ..reporter import get_reporter
 from ..vendor import yaml
 from ..vendor.cachetools import TTLCache, cachedmethod, keys
@@ -38,12 +40,16 @@ class LocalRepo(Repo):
             precedence over higher priority. Defaults to 10.
         nested (bool): When True the Repository will use the Nested hierarchy. Defaults
             to False.
+        catalog (bool): When True the Repository will persist a ModuleCatalog in
+            the cpenv cache directory to speed up listing modules. Defaults to the
+            value of CPENV_ENABLE_CATALOG.
     """
 
     type_name = "local"
     priority = 10
+    max_downloads = 4
 
-    def __init__(self, name, path, priority=None, nested=None):
+    def __init__(self, name, path, priority=None, nested=None, catalog=None):
         super(LocalRepo, self).__init__(name, priority)
         self.path = paths.normalize(path)
         self.cache = TTLCache(maxsize=10, ttl=60)
@@ -52,44 +58,57 @@ class LocalRepo(Repo):
         if nested is None:
             self.nested = bool(os.getenv("CPENV_LOCALREPO_NESTED", False))
 
+        if catalog is None:
+            catalog = catalog_enabled()
+        self.catalog = ModuleCatalog(self) if catalog else None
+
     def relative_path(self, *parts):
         return paths.normalize(self.path, *parts)
 
     def clear_cache(self):
         self.cache.clear()
 
-    @cachedmethod(lambda self: self.cache, key=partial(keys.hashkey, "find"))
     def find(self, requirement):
-        matches = []
-        for module_spec in self.list():
-            if is_exact_match(requirement, module_spec):
-                matches.insert(0, module_spec)
-                continue
-            if is_partial_match(requirement, module_spec):
-                matches.append(module_spec)
+        return self.index().find(requirement)
+
+    @cachedmethod(lambda self: self.cache, key=partial(keys.hashkey, "index"))
+    def index(self):
+        """Return a ModuleSpecIndex of all ModuleSpecs in this Repo."""
 
-        return matches
+        return ModuleSpecIndex(self.list())
 
     @cachedmethod(lambda self: self.cache, key=partial(keys.hashkey, "list"))
     def list(self):
+        if self.catalog:
+            return sort_modules(self.catalog.list(), reverse=True)
+
         module_specs = []
 
         # Find flat module_specs
         for module_file in glob(self.relative_path("*", "module.yml")):
             module_path = paths.parent(module_file)
-            module = Module(module_path, repo=self)
-            module_specs.append(module.to_spec())
+            module_specs.append(read_module_spec(module_path, self))
 
         # Find nested module_specs
         versions = glob(self.relative_path("*", "*", "module.yml"))
         for version_file in versions:
             version_dir = paths.parent(version_file)
-            module = Module(version_dir, repo=self)
-            module_specs.append(module.to_spec())
+            module_specs.append(read_module_spec(version_dir, self))
 
         return sort_modules(module_specs, reverse=True)
 
-    def download(self, module_spec, where, overwrite=False):
+    def download(self, module_spec, where, overwrite=False, blob_store=None):
+        """Copy a module to where.
+
+        Arguments:
+            module_spec (ModuleSpec): Module in this repo to copy.
+            where (str): Destination of the module.
+            overwrite (bool): Replace an existing module at where.
+            blob_store (BlobStore): Optional store to link files from. Only
+                the Localizer passes one, copies that may be edited, like
+                clones, must never link to blobs.
+        """
+
         if os.path.isdir(where):
             if not overwrite:
                 raise OSError("%s already exists..." % where)
@@ -98,29 +117,35 @@ class LocalRepo(Repo):
 
         src = module_spec.path
         dst = where
+        manifest = paths.get_folder_manifest(src)
+
+        # Link files shared with other modules from the blob store
+        copy_file = paths.copy_file
+        if blob_store and blob_store.supports(dst):
+            copy_file = blob_store.copy_file
+
+        # Copy files that are identical in local versions of this module from
+        # the local version instead of from this repo
+        local_sources = find_local_sources(module_spec, dst)
+
+        def copy_func(src_path, dst_path, size):
+            src_path = local_sources.get(paths.normalize(src_path), src_path)
+            copy_file(src_path, dst_path, size)
 
         reporter = get_reporter()
         progress_bar = reporter.progress_bar(
-            label="Download %s" % module_spec.name,
-            max_size=self.get_size(module_spec),
+            label="Download %s" % module_spec.qual_name,
+            max_size=manifest["size"],
             data={"module_spec": module_spec},
         )
         with progress_bar as progress_bar:
-            for root, _, files in paths.exclusive_walk(src):
-                for file in files:
-                    src_path = os.path.join(root, file)
-                    rel_path = os.path.relpath(src_path, src)
-                    dst_path = os.path.join(dst, rel_path)
-
-                    if os.path.islink(src_path):
-                        continue
-
-                    dst_dir = os.path.dirname(dst_path)
-                    if not os.path.isdir(dst_dir):
-                        os.makedirs(dst_dir)
-
-                    shutil.copy2(src_path, dst_path)
-                    progress_bar.update(os.path.getsize(src_path))
+            paths.copy_folder(
+                src,
+                dst,
+                manifest,
+                progress_cb=progress_bar.update,
+                copy_func=copy_func,
+            )
 
             module = Module(where)
             progress_bar.update(
@@ -153,29 +178,19 @@ class LocalRepo(Repo):
 
         src = module.path
         dst = new_module_path
+        manifest = paths.get_folder_manifest(src)
 
         reporter = get_reporter()
         progress_bar = reporter.progress_bar(
             label="Upload %s" % module.name,
-            max_size=self.get_size(module),
+            max_size=manifest["size"],
             data={"module": module, "to_repo": self},
         )
         with progress_bar as progress_bar:
-            for root, _, files in paths.exclusive_walk(src):
-                for file in files:
-                    src_path = os.path.join(root, file)
-                    rel_path = os.path.relpath(src_path, src)
-                    dst_path = os.path.join(dst, rel_path)
-
-                    if os.path.islink(src_path):
-                        continue
+            paths.copy_folder(src, dst, manifest, progress_cb=progress_bar.update)
 
-                    dst_dir = os.path.dirname(dst_path)
-                    if not os.path.isdir(dst_dir):
-                        os.makedirs(dst_dir)
-
-                    shutil.copy2(src_path, dst_path)
-                    progress_bar.update(os.path.getsize(src_path))
+            # Hash the local files rather than reading them back from dst
+            write_manifest(dst, create_manifest(dst, hash_folder=src))
 
             module_spec = Module(new_module_path).to_spec()
             progress_bar.update(
@@ -196,9 +211,16 @@ class LocalRepo(Repo):
                 "that the module is actually in!"
             )
 
+        # Find blobs that are only linked to by this module
+        blob_store = get_blob_store()
+        blobs = blob_store.find_blobs(module_spec.path) if blob_store else []
+
         module = Module(module_spec.path)
         module.remove()
 
+        if blobs:
+            blob_store.remove_unused(blobs)
+
     def get_data(self, module_spec):
         """Read a modules config data."""
 
@@ -208,6 +230,14 @@ class LocalRepo(Repo):
         module = Module(module_spec.path)
         return yaml.safe_load(module.raw_config)
 
+    def get_requires(self, module_spec):
+        """Read a modules requires."""
+
+        if not os.path.isdir(module_spec.path):
+            raise OSError("module_spec.path does not appear to exist.")
+
+        return Module(module_spec.path, repo=self).requires
+
     def get_size(self, module_spec):
         """Sums the size of all files in the modules directory."""
 
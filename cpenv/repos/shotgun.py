@@ -1,17 +1,22 @@
 # -*- coding: utf-8 -*-
 # Standard library imports
-import io
 import os
-import zipfile
+import tempfile
+import threading
 from functools import partial
 
 # Local imports
-from .. import http, paths
-from ..module import Module, ModuleSpec, parse_module_requirement, sort_modules
+from .. import paths
+from ..module import (
+    Module,
+    ModuleSpec,
+    ModuleSpecIndex,
+    parse_requirement,
+    sort_modules,
+)
 from ..reporter import get_reporter
 from ..vendor import yaml
 from ..vendor.cachetools import TTLCache, cachedmethod, keys
-from ..vendor.shotgun_api3 import Shotgun
 from ..versions import parse_version
 from .base import Repo
 
@@ -67,6 +72,11 @@ class ShotgunRepo(Repo):
 
     type_name = "shotgun"
     priority = 20
+    max_downloads = 4
+
+    # Archives are read in large chunks and written to a temporary file in
+    # $CPENV_HOME/cache/downloads.
+    download_chunk_size = 1024 * 1024
 
     def __init__(
         self,
@@ -84,6 +94,10 @@ class ShotgunRepo(Repo):
             # This will be done via the tk-cpenv shotgun app
             self._api = api
         else:
+            # shotgun_api3 is slow to import so only import it when needed
+            from .. import http
+            from ..vendor.shotgun_api3 import Shotgun
+
             self._api = Shotgun(
                 base_url=base_url,
                 script_name=script_name,
@@ -107,6 +121,11 @@ class ShotgunRepo(Repo):
         self._supports_large_modules = None
         self.cache = TTLCache(maxsize=10, ttl=60)
 
+        # Shotgun instances are not thread-safe so api calls made by queries
+        # and concurrent downloads are serialized. Archives are still
+        # downloaded concurrently.
+        self._api_lock = threading.RLock()
+
     @property
     def shotgun(self):
         return self._api
@@ -116,41 +135,104 @@ class ShotgunRepo(Repo):
 
     @cachedmethod(lambda self: self.cache, key=partial(keys.hashkey, "find"))
     def find(self, requirement):
-        name, version = parse_module_requirement(requirement)
+        requirement = parse_requirement(requirement)
+        name, version = requirement.name, requirement.version
 
         # Build filters
         filters = [["code", "is", name]]
         exact_filters = list(filters)
-        if version:
+        if version and not requirement.version_range:
             exact_filters.append(["sg_version", "is", version.string])
 
-        # Try exact match first
-        entities = self.shotgun.find(
-            self.module_entity,
-            filters=exact_filters,
-            fields=self.resolve_fields,
-        )
-        if not entities:
-            # Fall back to simple name match
+        with self._api_lock:
+            # Try exact match first
             entities = self.shotgun.find(
                 self.module_entity,
-                filters=filters,
+                filters=exact_filters,
                 fields=self.resolve_fields,
             )
+            if not entities and exact_filters != filters:
+                # Fall back to simple name match
+                entities = self.shotgun.find(
+                    self.module_entity,
+                    filters=filters,
+                    fields=self.resolve_fields,
+                )
 
         module_specs = []
         for entity in entities:
             module_specs.append(entity_to_module_spec(entity, self))
 
+        # Version ranges are filtered locally from the versions sorted by
+        # ModuleSpecIndex
+        if requirement.version_range:
+            return ModuleSpecIndex(module_specs).find(requirement)
+
         return sort_modules(module_specs, reverse=True)
 
+    def find_many(self, requirements):
+        """Find many requirements using a single query.
+
+        Entities are matched to requirements client-side using the same rules
+        as find. Results are cached for later calls to find when they fit in
+        the cache.
+        """
+
+        with self._api_lock:
+            return self._find_many(requirements)
+
+    def _find_many(self, requirements):
+        results = {}
+        parsed = {}
+        for requirement in requirements:
+            cached = self.cache.get(keys.hashkey("find", requirement), None)
+            if cached is not None:
+                results[requirement] = cached
+            else:
+                parsed[requirement] = parse_requirement(requirement)
+
+        names = sorted(set([r.name for r in parsed.values()]))
+        entities = []
+        if names:
+            entities = self.shotgun.find(
+                self.module_entity,
+                filters=[["code", "in", names]],
+                fields=self.resolve_fields,
+            )
+
+        index = None
+        for requirement, req in parsed.items():
+            if req.version_range:
+                if index is None:
+                    index = ModuleSpecIndex(
+                        [entity_to_module_spec(e, self) for e in entities]
+                    )
+                results[requirement] = index.find(req)
+            else:
+                name, version = req.name, req.version
+                matches = [e for e in entities if e["code"] == name]
+                if version:
+                    exact = [e for e in matches if e["sg_version"] == version.string]
+                    matches = exact or matches
+
+                module_specs = [entity_to_module_spec(e, self) for e in matches]
+                results[requirement] = sort_modules(module_specs, reverse=True)
+
+        # Caching a batch larger than the cache would only evict other results
+        if len(parsed) <= self.cache.maxsize:
+            for requirement in parsed:
+                self.cache[keys.hashkey("find", requirement)] = results[requirement]
+
+        return [results[requirement] for requirement in requirements]
+
     @cachedmethod(lambda self: self.cache, key=partial(keys.hashkey, "list"))
     def list(self):
-        entities = self.shotgun.find(
-            self.module_entity,
-            filters=[],
-            fields=self.resolve_fields,
-        )
+        with self._api_lock:
+            entities = self.shotgun.find(
+                self.module_entity,
+                filters=[],
+                fields=self.resolve_fields,
+            )
         module_specs = []
         for entity in entities:
             module_specs.append(entity_to_module_spec(entity, self))
@@ -158,12 +240,17 @@ class ShotgunRepo(Repo):
         return sort_modules(module_specs, reverse=True)
 
     def download(self, module_spec, where, overwrite=False):
+        import zipfile
 
-        entity = self.shotgun.find_one(
-            self.module_entity,
-            filters=module_spec_to_filters(module_spec),
-            fields=self.archive_fields,
-        )
+        from .. import api, http
+
+        with self._api_lock:
+            entity = self.shotgun.find_one(
+                self.module_entity,
+                filters=module_spec_to_filters(module_spec),
+                fields=self.archive_fields,
+            )
+            download_size = kb(self.get_size(module_spec))
         archive = entity["sg_archive"]
 
         if not archive:
@@ -179,10 +266,8 @@ class ShotgunRepo(Repo):
         # Download archive data - we add a chunk to download_size for zip
         # progress reporting.
         reporter = get_reporter()
-        chunk_size = 8192
-        download_size = kb(self.get_size(module_spec))
         progress_bar = reporter.progress_bar(
-            label="Download %s" % module_spec.name,
+            label="Download %s" % module_spec.qual_name,
             max_size=download_size,
             data={
                 "module_spec": module_spec,
@@ -190,18 +275,27 @@ class ShotgunRepo(Repo):
             },
         )
         with progress_bar as progress_bar:
-            response = http.get(archive["url"])
-            data = io.BytesIO()
-            while True:
-                chunk = response.read(chunk_size)
-                if not chunk:
-                    break
-                progress_bar.update(kb(len(chunk)))
-                data.write(chunk)
-
-            # Construct and extract in-memory zip archive
-            zip_file = zipfile.ZipFile(data)
-            zip_file.extractall(where)
+            # Write the archive to disk so memory use does not grow with the
+            # size of the module. SpooledTemporaryFile is not seekable enough
+            # for zipfile before python 3.11.
+            downloads_path = api.get_cache_path("downloads")
+            paths.ensure_path_exists(downloads_path)
+            with tempfile.TemporaryFile(dir=downloads_path) as data:
+                buffer = bytearray(self.download_chunk_size)
+                view = memoryview(buffer)
+                response = http.get(archive["url"])
+                try:
+                    while True:
+                        size = response.readinto(buffer)
+                        if not size:
+                            break
+                        progress_bar.update(kb(size))
+                        data.write(view[:size])
+                finally:
+                    response.close()
+
+                with zipfile.ZipFile(data) as zip_file:
+                    zip_file.extractall(where)
 
             module = Module(where)
             progress_bar.update(
@@ -307,11 +401,12 @@ class ShotgunRepo(Repo):
             self.shotgun.delete(self.module_entity, entity["id"])
 
     def get_data(self, module_spec):
-        entity = self.shotgun.find_one(
-            self.module_entity,
-            filters=module_spec_to_filters(module_spec),
-            fields=self.data_fields,
-        )
+        with self._api_lock:
+            entity = self.shotgun.find_one(
+                self.module_entity,
+                filters=module_spec_to_filters(module_spec),
+                fields=self.data_fields,
+            )
         if not entity:
             raise Exception(
                 "Failed to locate %s in %s"
@@ -4,13 +4,20 @@
 import contextlib
 import os
 import shlex
+import threading
+import weakref
+from collections import OrderedDict
+from functools import partial
 
 # Local imports
 from . import mappings, paths
-from .module import Module, best_match, is_exact_match, is_module
+from .activation_cache import ActivationCache, activation_cache_enabled
+from .blobstore import get_blob_store
+from .module import Module, is_exact_match, is_module, parse_requirement
 from .reporter import get_reporter
 from .repos import LocalRepo
-from .vendor.fasteners import InterProcessLock
+from .repos.fanout import RepoQuery, get_max_workers
+from .versions import ParseError
 
 __all__ = [
     "ResolveError",
@@ -32,8 +39,8 @@ class ResolveError(Exception):
 class Resolver(object):
     """Responsible for resolving ModuleSpecs from requirement strings.
 
-    Modules will be looked up sequentially in all registered Repos. By default
-    this order is:
+    Modules will be looked up in all registered Repos concurrently, but
+    results are always considered in priority order. By default this order is:
         1. LocalRepo pointing to current working directory
         2. LocalRepo pointing to cpenv_user_modules_path
         3. LocalRepo pointing to cpenv_home_modules_path ($CPENV_HOME/modules)
@@ -43,53 +50,90 @@ class Resolver(object):
     If there are still unresolved modules, fallback to the old algorithm
     for module lookups using the resolve functions in the
     cpenv.resolver.module_resolvers list.
+
+    The requires of each resolved module are followed transitively. When
+    requirements conflict, the Resolver backtracks to pick a consistent set
+    of ModuleSpecs. A requirement with a version like "my_module-1.0" is
+    satisfied by that exact version or any greater version, preferring the
+    exact version. A requirement with a version range like
+    "my_module>=1.0,<2" is satisfied by the highest version in range. If the
+    search hits max_conflicts, it is restarted
+    preferring the latest version of each module instead.
+
+    Arguments:
+        repos (List[Repo]): Repos to lookup modules in.
+        resolve_requires (bool): Follow the requires of resolved modules.
+            Defaults to True.
     """
 
-    def __init__(self, repos):
+    max_conflicts = 200
+
+    def __init__(self, repos, resolve_requires=True):
         self.repos = repos
+        self.resolve_requires = resolve_requires
         self.reporter = get_reporter()
+        self._candidates = {}
+        self._queries = {}
+        self._unsettled = {}
+        self._requires = {}
+        self._learned = {}
+        self._conflicts = 0
+        self._prefer_latest = False
 
     def resolve(self, requirements, ignore_unresolved=False):
         """Given a list of requirement strings, resolve ModuleSpecs.
 
         Returns:
-            list of ModuleSpec objects
+            list of ModuleSpec objects ordered so that dependencies precede
+            the modules that require them.
 
         Raises:
-            ResolveError when a requirement can not be resolved.
+            ResolveError when a requirement can not be resolved or when
+            requirements conflict.
         """
 
         self.reporter.start_resolve(requirements)
+        self._candidates = {}
+        self._queries = {}
+        self._unsettled = {}
+        self._requires = {}
+        self._prefer_latest = False
         unresolved = list(requirements)
-        resolved = []
 
         # Try the old resolution alogirthm for backwards compatability
-        resolved.extend(old_resolve_algorithm(self, unresolved))
+        pinned = old_resolve_algorithm(self, unresolved)
 
-        for requirement in list(unresolved):
-            self.reporter.find_requirement(requirement)
-            # TODO: handle more complex requirements.
-            #       possibly use the new resolvelib being developed by pypa
+        decisions = OrderedDict()
+        for module_spec in pinned:
+            decisions.setdefault(module_spec.name, Decision(module_spec, set()))
 
-            match_gen = (
-                module_spec
-                for repo in self.repos
-                for module_spec in repo.find(requirement)
-            )
+        pending = [Pending.create(requirement) for requirement in unresolved]
+        if self.resolve_requires:
+            for module_spec in pinned:
+                for requirement in self._get_requires(module_spec):
+                    pending.append(Pending.create(requirement, module_spec.name))
 
-            # best_match returns the first ModuleSpec that matches
-            # both name and version or the ModuleSpec with the
-            # highest version > the required version
-            match = best_match(requirement, match_gen)
-            if match:
-                self.reporter.resolve_requirement(requirement, match)
-                unresolved.remove(requirement)
-                resolved.append(match)
-            else:
-                # TODO: once old resolve algorithm is removed
-                # report a module resolution failure here.
-                pass
+        for item in pending:
+            self.reporter.find_requirement(item.requirement)
+        self._prefetch([item.name for item in pending])
 
+        try:
+            try:
+                decisions, missing = self._solve_from(pending, decisions)
+            except TooManyConflicts:
+                self._prefer_latest = True
+                decisions, missing = self._solve_from(pending, decisions)
+        except Conflict as conflict:
+            self.reporter.end_resolve([], unresolved)
+            raise ResolveError(str(conflict))
+
+        resolved = self._order(decisions)
+        for module_spec in resolved:
+            decision = decisions[module_spec.name]
+            if decision.requirement:
+                self.reporter.resolve_requirement(decision.requirement, module_spec)
+
+        unresolved = list(missing.keys())
         self.reporter.end_resolve(resolved, unresolved)
 
         if unresolved and not ignore_unresolved:
@@ -97,28 +141,437 @@ class Resolver(object):
 
         return resolved
 
+    def _solve_from(self, pending, decisions):
+        """Reset the search state and solve."""
+
+        self._learned = {}
+        self._conflicts = 0
+        return self._solve(pending, decisions, OrderedDict())
+
+    def _get_candidates(self, name, until=None):
+        """Return ModuleSpecs named name across repos in priority order.
+
+        Repos are queried concurrently using a RepoQuery that is memoized so
+        each repo is queried at most once per name. When until is given,
+        results are read up to the first repo that yields a ModuleSpec
+        matching until. Queries to lower priority repos that have not started
+        are cancelled once no other name needs them.
+        """
+
+        if name in self._candidates:
+            return self._candidates[name]
+
+        if name not in self._queries:
+            self._prefetch([name])
+        query, index = self._queries[name]
+
+        candidates = []
+        qual_names = set()
+        for repo, results in query:
+            found = False
+            for module_spec in results[index]:
+                if module_spec.name != name:
+                    continue
+                if module_spec.qual_name in qual_names:
+                    continue
+                qual_names.add(module_spec.qual_name)
+                candidates.append(module_spec)
+                found = found or bool(until and until(module_spec))
+            if found:
+                self._settle(name)
+                return candidates
+
+        self._candidates[name] = candidates
+        return candidates
+
+    def _prefetch(self, names):
+        """Query repos for many names at once using Repo.find_many.
+
+        Each repo receives a single find_many call for all names that have
+        not been queried yet.
+        """
+
+        names = [n for n in OrderedDict.fromkeys(names) if n not in self._queries]
+        if not names:
+            return
+
+        query = RepoQuery(self.repos, "find_many", names)
+        self._unsettled[query] = set(names)
+        for index, name in enumerate(names):
+            self._queries[name] = (query, index)
+
+    def _settle(self, name):
+        """Cancel a RepoQuery once all of its names were found without it."""
+
+        query, _ = self._queries[name]
+        unsettled = self._unsettled.get(query, None)
+        if unsettled is not None:
+            unsettled.discard(name)
+            if not unsettled:
+                query.cancel()
+                self._unsettled.pop(query)
+
+    def _get_requires(self, module_spec):
+        """Return the memoized requires of a ModuleSpec."""
+
+        if not self.resolve_requires:
+            return []
+
+        if module_spec not in self._requires:
+            requires = module_spec.repo.get_requires(module_spec) or []
+            if not isinstance(requires, (list, tuple)):
+                requires = [requires]
+            self._requires[module_spec] = [str(r) for r in requires]
+        return self._requires[module_spec]
+
+    def _solve(self, pending, decisions, missing):
+        """Recursively pick a ModuleSpec for each pending requirement.
+
+        Uses conflict-directed backjumping. When a requirement conflicts with
+        an earlier decision, a Conflict containing the names of the decisions
+        involved is raised, and only frames deciding one of those names try
+        their next candidate. Requirements that caused conflicts are
+        remembered for the rest of the search and used to prefer candidates
+        that match them exactly.
+
+        Returns:
+            (decisions, missing) - missing holds the unresolvable requirements
+            of the branch that was solved. Like decisions it is copied per
+            branch, so requirements of abandoned branches are not reported.
+        """
+
+        # Skip requirements satisfied by previous decisions
+        missing = OrderedDict(missing)
+        while pending:
+            item = pending[0]
+            decision = decisions.get(item.name, None)
+            if decision is None:
+                if item.requirement in missing or not self._is_resolvable(item):
+                    missing.setdefault(item.requirement, item)
+                    pending = pending[1:]
+                    continue
+                break
+
+            self._check(item, decisions)
+            pending = pending[1:]
+        else:
+            return decisions, missing
+
+        # Decide which ModuleSpec to use for the next unresolved name
+        name = pending[0].name
+        constraints = [item for item in pending if item.name == name]
+        rest = [item for item in pending if item.name != name]
+        causes = set([item.parent for item in constraints])
+
+        # Only wait for the repos up to the first ModuleSpec that would be
+        # ranked best. The rest are read if that ModuleSpec fails.
+        until = None
+        if not self._prefer_latest:
+            until = partial(is_best_match, self._learned.get(name, []) + constraints)
+
+        conflict_names = set(causes)
+        conflict_items = list(constraints)
+        conflict_message = "No version of %s satisfies %s" % (
+            name,
+            ", ".join([item.describe() for item in constraints]),
+        )
+        tried = set()
+        candidates = self._get_satisfying(name, constraints, until, tried)
+        while candidates:
+            preferred = self._learned.get(name, []) + constraints
+            module_spec = rank_candidates(
+                preferred,
+                candidates,
+                self._prefer_latest,
+            )[0]
+            candidates.remove(module_spec)
+            tried.add(module_spec.qual_name)
+
+            next_decisions = OrderedDict(decisions)
+            next_decisions[name] = Decision(
+                module_spec,
+                causes,
+                constraints[0].requirement,
+            )
+            requires = [
+                Pending.create(requirement, name)
+                for requirement in self._get_requires(module_spec)
+            ]
+            self._prefetch([item.name for item in requires])
+            try:
+                # Check requires against previous decisions before recursing
+                # so that conflicts are found before solving a whole subtree
+                for item in requires:
+                    self._check(item, next_decisions)
+                return self._solve(rest + requires, next_decisions, missing)
+            except Conflict as conflict:
+                if name not in conflict.names:
+                    raise
+                conflict_names.update(conflict.names)
+                conflict_items.extend(conflict.items)
+                conflict_message = conflict.message
+
+            if not candidates and until:
+                until = None
+                candidates = self._get_satisfying(name, constraints, None, tried)
+
+        conflict_names.discard(name)
+        raise Conflict(conflict_names, conflict_message, conflict_items)
+
+    def _get_satisfying(self, name, constraints, until, tried):
+        """Return untried candidates satisfying all constraints."""
+
+        return [
+            module_spec
+            for module_spec in self._get_candidates(name, until)
+            if module_spec.qual_name not in tried
+            and all(item.is_satisfied_by(module_spec) for item in constraints)
+        ]
+
+    def _check(self, item, decisions):
+        """Raise a Conflict if item is not satisfied by a previous decision."""
+
+        decision = decisions.get(item.name, None)
+        if decision is None or item.is_satisfied_by(decision.module_spec):
+            return
+
+        self._conflicts += 1
+        if self._conflicts > self.max_conflicts and not self._prefer_latest:
+            raise TooManyConflicts()
+
+        self._learned.setdefault(item.name, []).append(item)
+        raise Conflict(
+            decision.causes | set([item.name, item.parent]),
+            "%s conflicts with %s" % (item.describe(), decision.module_spec.qual_name),
+            [item],
+        )
+
+    def _is_resolvable(self, item):
+        """Check if any version of a module satisfies a requirement."""
+
+        for module_spec in self._get_candidates(item.name, item.is_satisfied_by):
+            if item.is_satisfied_by(module_spec):
+                return True
+        return False
+
+    def _order(self, decisions):
+        """Order decisions so that dependencies precede their dependents."""
+
+        ordered = []
+        visited = set()
+
+        def visit(name):
+            if name in visited:
+                return
+            visited.add(name)
+            module_spec = decisions[name].module_spec
+            for requirement in self._get_requires(module_spec):
+                dependency = Pending.create(requirement).name
+                if dependency in decisions:
+                    visit(dependency)
+            ordered.append(module_spec)
+
+        for name in decisions:
+            visit(name)
+
+        return ordered
+
+
+class Conflict(Exception):
+    """Raised internally by a Resolver when requirements conflict."""
+
+    def __init__(self, names, message, items=None):
+        super(Conflict, self).__init__(message)
+        self.names = set([name for name in names if name is not None])
+        self.message = message
+        self.items = items or []
+
+
+class TooManyConflicts(Exception):
+    """Raised internally by a Resolver when a search exceeds max_conflicts."""
+
+
+class Decision(object):
+    """A ModuleSpec chosen by a Resolver and the names that constrained it."""
+
+    def __init__(self, module_spec, causes, requirement=None):
+        self.module_spec = module_spec
+        self.causes = set([cause for cause in causes if cause is not None])
+        self.requirement = requirement
+
+
+class Pending(object):
+    """A requirement waiting to be resolved and the name that required it."""
+
+    def __init__(self, requirement, name, version, parent=None, version_range=None):
+        self.requirement = requirement
+        self.name = name
+        self.version = version
+        self.parent = parent
+        self.version_range = version_range
+
+    @classmethod
+    def create(cls, requirement, parent=None):
+        try:
+            requirement = parse_requirement(requirement)
+        except ParseError as e:
+            raise ResolveError(str(e))
+
+        return cls(
+            requirement,
+            requirement.name,
+            requirement.version,
+            parent,
+            requirement.version_range,
+        )
+
+    def describe(self):
+        if self.parent:
+            return "%s (required by %s)" % (self.requirement, self.parent)
+        return self.requirement
+
+    def is_exact_match(self, module_spec):
+        return module_spec.qual_name == self.requirement or (
+            self.version and module_spec.version == self.version
+        )
+
+    def is_satisfied_by(self, module_spec):
+        """Satisfied by any version in range or when there is no range by the
+        exact version or any greater version.
+        """
+
+        if module_spec.name != self.name:
+            return False
+        if self.version_range is not None:
+            return self.version_range.contains(module_spec.version)
+        if self.version is None or self.is_exact_match(module_spec):
+            return True
+        return not module_spec.version < self.version
+
+
+def is_best_match(items, module_spec):
+    """Check if no other ModuleSpec could be ranked above module_spec.
+
+    A ModuleSpec that satisfies all items and exactly matches one of them
+    can only tie with ModuleSpecs of the same version.
+    """
+
+    return all(item.is_satisfied_by(module_spec) for item in items) and any(
+        item.is_exact_match(module_spec) for item in items
+    )
+
+
+def rank_candidates(items, module_specs, prefer_latest=False):
+    """Order ModuleSpecs from best to worst match for a list of requirements.
+
+    ModuleSpecs satisfying the most requirements come first. Ties are broken
+    by exact matches in the order of the requirements they match, followed
+    by the highest version. When prefer_latest is True, exact matches are
+    ignored and ties are broken by the highest version only.
+    """
+
+    def exact_index(module_spec):
+        for i, item in enumerate(items):
+            if item.is_exact_match(module_spec):
+                return i
+        return len(items)
+
+    by_version = sorted(
+        module_specs,
+        key=lambda spec: spec.version.sort_key,
+        reverse=True,
+    )
+    return sorted(
+        by_version,
+        key=lambda spec: (
+            -sum([item.is_satisfied_by(spec) for item in items]),
+            0 if prefer_latest else exact_index(spec),
+        ),
+    )
+
 
 class Activator(object):
-    """Responsible for activating modules."""
+    """Responsible for activating modules.
+
+    Arguments:
+        localizer (Localizer): Localizer used to download remote modules.
+        cache (ActivationCache): Cache of combined environments. Defaults to
+            an ActivationCache when CPENV_ENABLE_ACTIVATION_CACHE is set. Pass
+            False to disable caching.
+    """
 
-    def __init__(self, localizer=None):
+    def __init__(self, localizer=None, cache=None):
         self.localizer = localizer or Localizer(to_repo="home")
+        if cache is None and activation_cache_enabled():
+            cache = ActivationCache()
+        self.cache = cache
 
     def combine_modules(self, modules):
         """Combine a list of module's environments."""
-        return mappings.join_dicts(*[obj.environment for obj in modules])
+
+        key = self.cache.key(modules) if self.cache else None
+        if key:
+            env = self.cache.get(key)
+            if env is not None:
+                return env
+
+        env = mappings.join_dicts(*[obj.plan for obj in modules])
+        if key:
+            self.cache.set(key, env)
+        return env
+
+    def get_active(self, module_specs):
+        """Return a dict mapping module_specs that are already active to their
+        active Modules.
+
+        A ModuleSpec is active when an active Module has the same path and
+        version, or for ModuleSpecs in remote Repos, when a localized Module
+        with the same name and version is active.
+        """
+
+        from .api import get_active_modules
+
+        by_path = {}
+        by_qual_name = {}
+        for module in get_active_modules():
+            by_path[module.path] = module
+            by_qual_name.setdefault(module.qual_name, module)
+
+        active = {}
+        for module_spec in module_specs:
+            module = by_path.get(module_spec.path, None)
+            if module is None and module_spec.repo.type_name != "local":
+                module = by_qual_name.get(module_spec.qual_name, None)
+            if module is not None and module.version == module_spec.version:
+                active[module_spec] = module
+        return active
 
     def activate(self, module_specs):
-        """Activate a list of module specs."""
+        """Activate a list of module specs.
+
+        Only the environments of modules that are not already active are
+        merged into the current environment.
+
+        Returns:
+            list of Modules for all module_specs.
+        """
 
-        modules = self.localizer.localize(module_specs)
-        env = self.combine_modules(modules)
-        mappings.set_env(env)
+        from .api import batch_active_modules
 
-        for module in modules:
-            module.activate()
+        active = self.get_active(module_specs)
+        new_specs = [spec for spec in module_specs if spec not in active]
+        new_modules = self.localizer.localize(new_specs)
 
-        return modules
+        if new_modules:
+            env = self.combine_modules(new_modules)
+            mappings.set_env(env)
+
+            with batch_active_modules():
+                for module in new_modules:
+                    module.activate()
+
+        localized = dict(zip(new_specs, new_modules))
+        return [active.get(spec, None) or localized[spec] for spec in module_specs]
 
 
 class Copier(object):
@@ -189,13 +642,23 @@ class Localizer(object):
     This is similar to a copy operation, but skips all module_specs that are
     already in LocalRepos. If they are in LocalRepos then they are already
     available to be activated.
+
+    Modules are localized concurrently by a pool of max_workers threads.
+    Downloads from each Repo are further limited to Repo.max_downloads at a
+    time, so Repos that are not thread-safe download one module at a time.
+
+    Arguments:
+        to_repo (str or LocalRepo): Repo to localize modules to.
+        max_workers (int): Max number of modules to localize at once.
+            Defaults to CPENV_MAX_WORKERS.
     """
 
-    def __init__(self, to_repo="home"):
+    def __init__(self, to_repo="home", max_workers=None):
         from .api import get_repo
 
         self.to_repo = get_repo(to_repo)
         self.reporter = get_reporter()
+        self.max_workers = max_workers or get_max_workers()
 
         if not isinstance(self.to_repo, LocalRepo):
             raise ValueError("Localizer expected LocalRepo got %s" % type(to_repo))
@@ -208,51 +671,139 @@ class Localizer(object):
             return Module(module_spec.path)
 
         # Check if module exists in to_repo
-        matches = self.to_repo.find(module_spec.qual_name)
+        with get_thread_lock(self.to_repo):
+            matches = self.to_repo.find(module_spec.qual_name)
         for match in matches:
             if is_exact_match(module_spec.qual_name, match) and not overwrite:
                 return Module(match.path)
 
-    def localize(self, module_specs, overwrite=False):
-        """Given ModuleSpecs, download them to this Localizers repo."""
+    def _localize_module(self, module_spec, overwrite=False):
+        """Localize a single ModuleSpec and return a Module."""
 
-        self.reporter.start_localize(module_specs)
-        localized = []
-        for module_spec in module_specs:
-            self.reporter.localize_module(module_spec, None)
+        self.reporter.localize_module(module_spec, None)
 
-            with ModuleInterProcessLock(self.to_repo, module_spec):
-
-                # Resolve the module_spec in a LocalRepo if possible. Any repo will do.
-                module = self._resolve_local_module(module_spec, overwrite)
-                if module:
-                    localized.append(module)
-                    continue
+        with ModuleInterProcessLock(self.to_repo, module_spec):
 
-                # Generate a new module path in to_repo
-                if self.to_repo.nested:
-                    new_module_path = self.to_repo.relative_path(
-                        module_spec.name,
-                        module_spec.version.string,
-                    )
-                else:
-                    new_module_path = self.to_repo.relative_path(module_spec.qual_name)
+            # Resolve the module_spec in a LocalRepo if possible. Any repo will do.
+            module = self._resolve_local_module(module_spec, overwrite)
+            if module:
+                return module
 
-                module = module_spec.repo.download(
-                    module_spec,
-                    where=new_module_path,
-                    overwrite=overwrite,
+            # Generate a new module path in to_repo
+            if self.to_repo.nested:
+                new_module_path = self.to_repo.relative_path(
+                    module_spec.name,
+                    module_spec.version.string,
+                )
+            else:
+                new_module_path = self.to_repo.relative_path(module_spec.qual_name)
+
+            # LocalRepos copy through the blob store, other Repos are
+            # deduplicated once downloaded.
+            blob_store = get_blob_store()
+            if blob_store and not blob_store.supports(new_module_path):
+                blob_store = None
+
+            repo = module_spec.repo
+            kwargs = {}
+            if blob_store and isinstance(repo, LocalRepo):
+                kwargs["blob_store"] = blob_store
+
+            with get_download_semaphore(repo):
+                module = repo.download(
+                    module_spec, new_module_path, overwrite, **kwargs
                 )
-                localized.append(module)
+
+            if module and blob_store and not kwargs:
+                blob_store.dedupe(module.path)
+
+            return module
+
+    def localize(self, module_specs, overwrite=False):
+        """Given ModuleSpecs, download them to this Localizers repo.
+
+        Returns Modules in the same order as module_specs.
+        """
+
+        self.reporter.start_localize(module_specs)
+
+        remote_specs = [s for s in module_specs if s.repo.type_name != "local"]
+        max_workers = min(self.max_workers, len(remote_specs))
+        if max_workers > 1:
+            from concurrent.futures import ThreadPoolExecutor
+
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = [
+                    executor.submit(self._localize_module, module_spec, overwrite)
+                    for module_spec in module_specs
+                ]
+                try:
+                    localized = [future.result() for future in futures]
+                except Exception:
+                    # Skip modules that have not started downloading yet
+                    for future in futures:
+                        future.cancel()
+                    raise
+        else:
+            localized = [
+                self._localize_module(module_spec, overwrite)
+                for module_spec in module_specs
+            ]
 
         self.reporter.end_localize(localized)
 
         # Clear to_repo's cache as it doesn't include the localized modules
-        self.to_repo.clear_cache()
+        with get_thread_lock(self.to_repo):
+            self.to_repo.clear_cache()
 
         return localized
 
 
+class ThreadLock(object):
+    """A reentrant lock that supports weak references."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+
+    def __enter__(self):
+        return self._lock.__enter__()
+
+    def __exit__(self, *exc_info):
+        return self._lock.__exit__(*exc_info)
+
+
+_thread_locks_lock = threading.Lock()
+_thread_locks = weakref.WeakValueDictionary()
+_download_semaphores = weakref.WeakKeyDictionary()
+
+
+def get_thread_lock(key):
+    """Return a reentrant lock shared by all threads for a key.
+
+    Used to serialize access to a Repo's cache and to localize each module in
+    one thread at a time. Locks are only kept while they are in use, so keys
+    are dropped once no thread holds or waits on their lock.
+    """
+
+    with _thread_locks_lock:
+        lock = _thread_locks.get(key, None)
+        if lock is None:
+            lock = _thread_locks[key] = ThreadLock()
+        return lock
+
+
+def get_download_semaphore(repo):
+    """Return a semaphore limiting downloads from a Repo to repo.max_downloads."""
+
+    with _thread_locks_lock:
+        semaphore = _download_semaphores.get(repo, None)
+        if semaphore is None:
+            max_downloads = max(1, getattr(repo, "max_downloads", 1))
+            semaphore = threading.BoundedSemaphore(max_downloads)
+            _download_semaphores[repo] = semaphore
+        return semaphore
+
+
 def lock_required(repo):
     """Check if locks are enabled..."""
     try:
@@ -264,22 +815,30 @@ def lock_required(repo):
 @contextlib.contextmanager
 def ModuleInterProcessLock(repo, module_spec):
 
-    # We can only create locks in LocalRepos
-    if lock_required(repo):
+    # Threads localizing the same module_spec wait for each other. The thread
+    # lock is acquired first so only one thread per process waits on the
+    # interprocess lock.
+    with get_thread_lock((repo.name, module_spec.qual_name)):
 
-        # Acquire a lock for the module_spec so other processes / users
-        # pointing at the same to_repo location do not step on each others toes.
-        lock_file = repo.relative_path(".locks", module_spec.qual_name + ".lock")
-        with InterProcessLock(lock_file) as lock:
+        # We can only create locks in LocalRepos
+        if lock_required(repo):
 
-            # Clear the LocalRepo cache in case a Module was created while acquiring
-            # the lock.
-            repo.clear_cache()
+            # Acquire a lock for the module_spec so other processes / users
+            # pointing at the same to_repo location do not step on each others toes.
+            from .vendor.fasteners import InterProcessLock
 
-            yield lock
-    else:
-        # No op
-        yield
+            lock_file = repo.relative_path(".locks", module_spec.qual_name + ".lock")
+            with InterProcessLock(lock_file) as lock:
+
+                # Clear the LocalRepo cache in case a Module was created while
+                # acquiring the lock.
+                with get_thread_lock(repo):
+                    repo.clear_cache()
+
+                yield lock
+        else:
+            # No op
+            yield
 
 
 def old_resolve_algorithm(resolver, paths):
@@ -335,7 +894,7 @@ def redirect_resolver(resolver, path):
     for root, _, _ in paths.walk_up(path):
         if is_redirecting(root):
             env_paths = redirect_to_modules(paths.normalize(root, ".cpenv"))
-            r = Resolver(resolver.repos)
+            r = Resolver(resolver.repos, resolver.resolve_requires)
             return r.resolve(env_paths)
 
     raise ResolveError
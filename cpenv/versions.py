@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
 
 # Standard library imports
+import operator
 import re
+from bisect import bisect_left, bisect_right
 from collections import namedtuple
-from functools import total_ordering
+from functools import lru_cache, total_ordering
 
 # Local imports
 from . import compat
@@ -11,7 +13,9 @@ from . import compat
 __all__ = [
     "ParseError",
     "Version",
+    "VersionRange",
     "parse_version",
+    "parse_version_range",
     "default_version",
 ]
 
@@ -40,6 +44,18 @@ semver_version_pattern = (
     r"(?:\+(?P<buildmetadata>[0-9a-zA-Z-]+(?:\.[0-9a-zA-Z-]+)*))?$"
 )
 simplever_pattern = r"(?:v)?(?P<version>(\d+\.?)+)$"
+
+
+# Compiled version patterns in the order they are tried
+nuke_version_regex = re.compile(nuke_version_pattern)
+four_version_regex = re.compile(four_version_pattern)
+semver_version_regex = re.compile(semver_version_pattern)
+simplever_regex = re.compile(simplever_pattern)
+
+# Version range clauses like ">=2.0", "~=1.4" or "!=1.4.2"
+version_range_regex = re.compile(
+    r"^\s*(?P<op>~=|==|!=|<=|>=|<|>)\s*(?P<version>\S+)\s*$"
+)
 VersionBase = namedtuple(
     "Version", ["major", "minor", "patch", "prerelease", "buildmetadata", "string"]
 )
@@ -47,6 +63,16 @@ VersionBase = namedtuple(
 
 @total_ordering
 class Version(VersionBase):
+    """A parsed version.
+
+    Versions are ordered by major, minor and patch followed by prerelease and
+    buildmetadata. Numeric prereleases sort after a missing prerelease which
+    sorts after string prereleases. A missing buildmetadata sorts after
+    string buildmetadata.
+
+    The key used for ordering is computed once per Version and stored as
+    sort_key, so comparisons are plain tuple comparisons.
+    """
 
     _defaults = {
         "major": 0,
@@ -62,44 +88,43 @@ class Version(VersionBase):
     def __hash__(self):
         return super(Version, self).__hash__()
 
-    def _comparable_value(self, value, other):
-        """Return a value that will be comparable with other."""
+    def __getattr__(self, attr):
+        if attr != "sort_key":
+            raise AttributeError(attr)
 
-        types_match = type(value) is type(other)
-        if types_match or isinstance(value, compat.numeric_types):
-            return value
+        sort_key = (
+            self.major,
+            self.minor,
+            self.patch,
+            _prerelease_key(self.prerelease),
+            _buildmetadata_key(self.buildmetadata),
+        )
+        self.__dict__["sort_key"] = sort_key
+        return sort_key
 
-        if other is None:
-            return value
+    def __lt__(self, other):
+        if not isinstance(other, Version):
+            raise ValueError("Can only compare two Version objects.")
 
-        if value is None and isinstance(other, compat.string_types):
-            return "zzzzzzzz"
+        return self.sort_key < other.sort_key
 
-        if isinstance(other, compat.numeric_types):
-            return -float("inf")
+    def __gt__(self, other):
+        if not isinstance(other, Version):
+            raise ValueError("Can only compare two Version objects.")
 
-        return value
+        return self.sort_key > other.sort_key
 
-    def _comparable(self, other):
-        """Generate a comparison key for a Version object.
+    def __le__(self, other):
+        if not isinstance(other, Version):
+            raise ValueError("Can only compare two Version objects.")
 
-        Coerces types of prerelease and buildmeta to ensure that the Version
-        objects are comparable. This is required because Python 3 now raises
-        a TypeError when attempting to compare str and int.
-        """
-        return (
-            self.major,
-            self.minor,
-            self.patch,
-            self._comparable_value(self.prerelease, other.prerelease),
-            self._comparable_value(self.buildmetadata, other.buildmetadata),
-        )
+        return self.sort_key <= other.sort_key
 
-    def __lt__(self, other):
+    def __ge__(self, other):
         if not isinstance(other, Version):
             raise ValueError("Can only compare two Version objects.")
 
-        return self._comparable(other) < other._comparable(self)
+        return self.sort_key >= other.sort_key
 
     def __eq__(self, other):
         if not isinstance(other, Version):
@@ -108,6 +133,20 @@ class Version(VersionBase):
         return tuple(other) == tuple(self)
 
 
+def _prerelease_key(value):
+    if value is None:
+        return (1, "")
+    if isinstance(value, compat.numeric_types):
+        return (2, value)
+    return (0, value)
+
+
+def _buildmetadata_key(value):
+    if value is None:
+        return (1, "")
+    return (0, value)
+
+
 class ParseError(Exception):
     """Raised when a parse method fails."""
 
@@ -119,6 +158,9 @@ def parse_version(string):
       - semver / calver
       - simple versions like: 10, v2, 1.0, 2.2.4
 
+    Versions are cached by string, so parsing the same string twice returns
+    the same Version object.
+
     Arguments:
         string (str): String to parse version from.
 
@@ -128,53 +170,56 @@ def parse_version(string):
     Raises:
         ParseError when a version can not be parsed.
     """
+
+    version = _parse_version(string)
+    if version is None:
+        raise ParseError("Could not parse version from %s" % string)
+    return version
+
+
+@lru_cache(maxsize=65536)
+def _parse_version(string):
+    # Skip patterns that can not match based on the number of dots and v's
+    dots = string.count(".")
+
     # Parse weird nuke versioning
-    match = re.search(nuke_version_pattern, string)
+    match = "v" in string and nuke_version_regex.search(string)
     if match:
-        return Version(
-            major=int(match.group("major")),
-            minor=int(match.group("minor")),
-            patch=int(match.group("patch")),
-            prerelease=None,
-            buildmetadata=None,
-            string=match.group(0),
-        )
+        major, minor, patch = match.groups()
+        return Version(int(major), int(minor), int(patch), None, None, match.group())
 
     # Parse four_version - four digit version
-    match = re.search(four_version_pattern, string)
+    match = dots >= 3 and four_version_regex.search(string)
     if match:
+        major, minor, revision, build, buildmetadata = match.groups()
         return Version(
-            major=int(match.group("major")),
-            minor=int(match.group("minor")),
-            patch=int(match.group("revision")),
-            prerelease=int(match.group("build")),
-            buildmetadata=match.group("buildmetadata"),
-            string=match.group(0),
+            int(major),
+            int(minor),
+            int(revision),
+            int(build),
+            buildmetadata,
+            match.group(),
         )
 
     # Parse Semver / Calver
-    match = re.search(semver_version_pattern, string)
+    match = dots >= 2 and semver_version_regex.search(string)
     if match:
+        major, minor, patch, prerelease, buildmetadata = match.groups()
         return Version(
-            major=int(match.group("major")),
-            minor=int(match.group("minor")),
-            patch=int(match.group("patch")),
-            prerelease=match.group("prerelease"),
-            buildmetadata=match.group("buildmetadata"),
-            string=match.group(0),
+            int(major),
+            int(minor),
+            int(patch),
+            prerelease,
+            buildmetadata,
+            match.group(),
         )
 
     # Parse Simple version
-    match = re.search(simplever_pattern, string)
+    match = simplever_regex.search(string)
     if match:
-        kwargs = dict(Version._defaults)
-        kwargs["string"] = match.group(0)
-        version_parts = match.group("version").split(".")
-        for part, part_name in zip(version_parts, ["major", "minor", "patch"]):
-            kwargs[part_name] = int(part)
-        return Version(**kwargs)
-
-    raise ParseError("Could not parse version from %s" % string)
+        parts = [int(part) for part in match.group("version").split(".")[:3]]
+        parts.extend([0] * (3 - len(parts)))
+        return Version(parts[0], parts[1], parts[2], None, None, match.group())
 
 
 def default_version():
@@ -186,3 +231,121 @@ def default_version():
         buildmetadata=None,
         string="0.1.0",
     )
+
+
+class VersionRange(object):
+    """A set of version constraints like ">=2.0,<3".
+
+    Clauses are separated by commas and support the ==, !=, <, <=, >, >= and
+    ~= operators. A version is in range when it satisfies every clause.
+    Versions are compared using their sort_key so "1.0" and "1.0.0" are
+    treated as the same version.
+
+    Like PEP 440, "<3" does not include prereleases of 3.0.0 and "~=1.4"
+    is short for ">=1.4,<2". "~=1.4.2" is short for ">=1.4.2,<1.5".
+
+    Use bounds to lookup the versions in range from a sorted list of sort
+    keys using bisect rather than testing every version.
+
+    Arguments:
+        string (str): Comma separated clauses.
+
+    Raises:
+        ParseError when a clause can not be parsed.
+    """
+
+    _operators = {
+        "==": operator.eq,
+        "!=": operator.ne,
+        "<": operator.lt,
+        "<=": operator.le,
+        ">": operator.gt,
+        ">=": operator.ge,
+    }
+
+    def __init__(self, string):
+        self.string = string
+        self.clauses = []
+        self.exact = None
+
+        for clause in string.split(","):
+            match = version_range_regex.match(clause)
+            if not match:
+                raise ParseError("Could not parse version range from %s" % string)
+
+            op, version = match.group("op"), parse_version(match.group("version"))
+            if op == "~=":
+                self.clauses.append((">=", version.sort_key))
+                self.clauses.append(("<", _compatible_upper_key(version)))
+            elif op == "<" and version.prerelease is None:
+                # Exclude prereleases and buildmetadata of version
+                self.clauses.append((op, version.sort_key[:3]))
+            else:
+                self.clauses.append((op, version.sort_key))
+
+            if op == "==":
+                self.exact = version
+
+    def __repr__(self):
+        return "<VersionRange>(%r)" % self.string
+
+    def __str__(self):
+        return self.string
+
+    def contains(self, version):
+        """Check if a Version is in this range."""
+
+        key = version.sort_key
+        for op, bound in self.clauses:
+            if not self._operators[op](key, bound):
+                return False
+        return True
+
+    def bounds(self, keys):
+        """Return the start and stop index of the versions in range.
+
+        Only the upper and lower bounds are applied, so versions between
+        start and stop still need to be checked against != clauses using
+        contains.
+
+        Arguments:
+            keys (List[tuple]): Version sort keys in ascending order.
+
+        Returns:
+            (start, stop) tuple
+        """
+
+        start, stop = 0, len(keys)
+        for op, bound in self.clauses:
+            if op in (">=", "=="):
+                start = max(start, bisect_left(keys, bound))
+            if op == ">":
+                start = max(start, bisect_right(keys, bound))
+            if op in ("<=", "=="):
+                stop = min(stop, bisect_right(keys, bound))
+            if op == "<":
+                stop = min(stop, bisect_left(keys, bound))
+        return start, max(start, stop)
+
+
+def _compatible_upper_key(version):
+    """Return the exclusive upper bound of a ~= clause."""
+
+    release = version.string.lstrip("v").split("-")[0].split("+")[0]
+    parts = len(release.replace("v", ".").split("."))
+    if parts <= 2:
+        return (version.major + 1,)
+    if parts == 3:
+        return (version.major, version.minor + 1)
+    return (version.major, version.minor, version.patch + 1)
+
+
+@lru_cache(maxsize=4096)
+def parse_version_range(string):
+    """Return a cached VersionRange for a string like ">=2.0,<3".
+
+    Raises:
+        ParseError when the string is not a valid version range.
+    """
+
+    return VersionRange(string)
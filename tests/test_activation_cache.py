@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+# Standard library imports
+import os
+
+# Local imports
+import cpenv
+from cpenv import module, paths
+from cpenv.activation_cache import ActivationCache
+
+from . import data_path
+from .utils import age_files
+
+
+def setup_module():
+    for name in ["cachemod_a", "cachemod_b"]:
+        cpenv.create(
+            where=data_path("activation", "modules", name + "-0.1.0"),
+            name=name,
+            version="0.1.0",
+            environment={"CACHED_VAR": "$MODULE/cached", "CACHED_PATH": ["$MODULE/a"]},
+        )
+    age_files(data_path("activation", "modules"))
+
+
+def teardown_module():
+    paths.rmtree(data_path("activation"))
+
+
+def make_activator():
+    cache = ActivationCache(data_path("activation", "cache"))
+    return cpenv.Activator(cache=cache)
+
+
+def make_modules():
+    return [
+        cpenv.Module(data_path("activation", "modules", name + "-0.1.0"))
+        for name in ["cachemod_a", "cachemod_b"]
+    ]
+
+
+def test_activation_cache_hit(monkeypatch):
+    """ActivationCache returns combined environments without reading configs"""
+
+    expected = make_activator().combine_modules(make_modules())
+    assert expected["CACHED_VAR"].endswith("cachemod_b-0.1.0/cached")
+
+    def fail(*args, **kwargs):
+        raise AssertionError("module.yml should not be read.")
+
+    monkeypatch.setattr(module, "read_config", fail)
+    assert make_activator().combine_modules(make_modules()) == expected
+
+
+def test_activation_cache_invalidation():
+    """ActivationCache keys change when a module.yml changes"""
+
+    cache = ActivationCache(data_path("activation", "cache"))
+    key = cache.key(make_modules())
+    assert cache.get(key) is not None
+
+    # Modified modules are not cached until their mtime is old enough
+    config_path = make_modules()[0].config_path
+    with open(config_path, "a") as f:
+        f.write("\n")
+    assert cache.key(make_modules()) is None
+
+    age_files(data_path("activation", "modules"))
+    new_key = cache.key(make_modules())
+    assert new_key != key
+    assert cache.get(new_key) is None
+
+
+def test_activation_cache_prune():
+    """ActivationCache removes the least recently used entries"""
+
+    cache = ActivationCache(data_path("activation", "lru"))
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.set(key, {"VAR": key})
+        os.utime(cache.entry_path(key), (i, i))
+
+    cache.max_entries = 2
+    cache.get("a")
+    cache.set("d", {"VAR": "d"})
+    assert sorted(os.listdir(cache.path)) == ["a.json", "d.json"]
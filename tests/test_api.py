@@ -1,5 +1,12 @@
 # -*- coding: utf-8 -*-
 
+# Standard library imports
+import json
+import os
+import subprocess
+import sys
+from collections import OrderedDict
+
 # Third party imports
 import pytest
 
@@ -16,6 +23,8 @@ def setup_module():
 
 def teardown_module():
     paths.rmtree(data_path("home"))
+    paths.rmtree(data_path("lazy_home"))
+    paths.rmtree(data_path("run_home"))
 
 
 def test_create():
@@ -27,3 +36,219 @@ def test_create():
     # Second run raises error
     with pytest.raises(OSError):
         cpenv.create(data_path("home", "testmod"), name="testmod", version="0")
+
+
+LAZY_IMPORT_SCRIPT = """
+import json, os, sys
+import cpenv
+
+state = {}
+modules_path = os.path.join(os.environ["CPENV_HOME"], "modules")
+state["import_creates_home"] = os.path.isdir(modules_path)
+state["import_builds_repos"] = bool(cpenv.api._registry["repos"])
+state["import_loads_shotgun"] = "cpenv.vendor.shotgun_api3" in sys.modules
+state["repos"] = [repo.name for repo in cpenv.get_repos()]
+state["get_repos_creates_home"] = os.path.isdir(modules_path)
+print(json.dumps(state))
+"""
+
+
+def test_import_is_lazy():
+    """Importing cpenv does not create directories or construct Repos"""
+
+    home = data_path("lazy_home")
+    os.makedirs(home)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(cpenv.__file__)))
+    env = dict(os.environ, CPENV_HOME=home, PYTHONPATH=root)
+    env.pop("CPENV_MODULES", None)
+    output = subprocess.check_output(
+        [sys.executable, "-c", LAZY_IMPORT_SCRIPT],
+        env=env,
+        cwd=home,
+    )
+
+    state = json.loads(output.decode("utf-8").strip().splitlines()[-1])
+    assert "home" in state.pop("repos")
+    assert state == {
+        "import_creates_home": False,
+        "import_builds_repos": False,
+        "import_loads_shotgun": False,
+        "get_repos_creates_home": True,
+    }
+
+
+def test_repo_factory():
+    """Configured Repos are constructed on first call to get_repos"""
+
+    factory = cpenv.api.RepoFactory(
+        "factory",
+        cpenv.LocalRepo,
+        {"name": "factory", "path": data_path("home", "factory")},
+    )
+    cpenv.add_repo(factory)
+    try:
+        assert cpenv.api._registry["repos"]["factory"] is factory
+        repo = cpenv.get_repo("factory")
+        assert isinstance(repo, cpenv.LocalRepo)
+        assert cpenv.get_repo("factory") is repo
+    finally:
+        cpenv.remove_repo(factory)
+
+
+def test_restore_active_modules(monkeypatch):
+    """Active modules are restored from their paths without resolving"""
+
+    module = cpenv.create(
+        where=data_path("home", "activemod-0.1.0"),
+        name="activemod",
+        version="0.1.0",
+    )
+    active = [module.qual_name, "missingmod-0.1.0"]
+    monkeypatch.setenv("CPENV_ACTIVE_MODULES", os.pathsep.join(active))
+    monkeypatch.setenv("CPENV_ACTIVE_MODULE_PATHS", module.path)
+    monkeypatch.setattr(cpenv.api, "_active_modules", OrderedDict())
+    monkeypatch.setitem(cpenv.api._init_state, "active_modules", None)
+
+    resolved = []
+
+    class Resolver(object):
+        def __init__(self, repos, resolve_requires=True):
+            pass
+
+        def resolve(self, requirements):
+            resolved.extend(requirements)
+            raise cpenv.ResolveError()
+
+    monkeypatch.setattr(cpenv.api, "Resolver", Resolver)
+    with pytest.warns(UserWarning):
+        assert cpenv.get_active_modules() == [module]
+    assert resolved == ["missingmod-0.1.0"]
+
+
+def test_copy_resolves_requested_module():
+    """Copying a module copies the module asked for, not its requires"""
+
+    from_repo = cpenv.LocalRepo("from", data_path("home", "copy_from"))
+    to_repo = cpenv.LocalRepo("to", data_path("home", "copy_to"))
+    cpenv.create(
+        where=from_repo.relative_path("copylib-1.0.0"),
+        name="copylib",
+        version="1.0.0",
+    )
+    cpenv.create(
+        where=from_repo.relative_path("copyapp-1.0.0"),
+        name="copyapp",
+        version="1.0.0",
+        requires=["copylib"],
+    )
+
+    copied = cpenv.api.copy("copyapp", from_repo, to_repo)
+    assert [m.qual_name for m in copied] == ["copyapp-1.0.0"]
+
+
+RUN_SCRIPT = """
+import sys
+import cpenv
+
+cpenv.run([sys.executable, "-c", "import os; print(os.environ['RUN_VAR'])"], ["runmod"])
+"""
+
+
+def test_run():
+    """Run replaces the process with a command in a modules environment"""
+
+    home = data_path("run_home")
+    cpenv.create(
+        where=data_path("run_home", "modules", "runmod-0.1.0"),
+        name="runmod",
+        version="0.1.0",
+        environment={"RUN_VAR": "$CPENV_PLATFORM"},
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(cpenv.__file__)))
+    env = dict(os.environ, CPENV_HOME=home, PYTHONPATH=root)
+    env.pop("CPENV_MODULES", None)
+    output = subprocess.check_output(
+        [sys.executable, "-c", RUN_SCRIPT],
+        env=env,
+        cwd=home,
+    )
+
+    assert output.decode("utf-8").strip().splitlines()[-1] == cpenv.compat.platform
+
+
+def test_switch_and_deactivate():
+    """Switch only changes what differs and deactivate restores the environment"""
+
+    for name in ["switch_a", "switch_b", "switch_c"]:
+        cpenv.create(
+            where=data_path("home", "modules", name + "-0.1.0"),
+            name=name,
+            version="0.1.0",
+            environment={
+                name.upper(): name,
+                "SWITCH_PATH": ["$MODULE"],
+            },
+        )
+    original_env = dict(os.environ)
+    original_modules = list(cpenv.get_active_modules())
+
+    try:
+        cpenv.activate(["switch_a", "switch_b"])
+        assert os.environ["SWITCH_B"] == "switch_b"
+
+        modules = cpenv.switch(["switch_a", "switch_c"])
+        assert "SWITCH_B" not in os.environ
+        assert os.environ["SWITCH_A"] == "switch_a"
+        assert os.environ["SWITCH_C"] == "switch_c"
+        assert os.environ["SWITCH_PATH"] == os.pathsep.join(
+            [modules[1].path, modules[0].path]
+        )
+        active = [m.qual_name for m in cpenv.get_active_modules()]
+        assert active[-2:] == ["switch_a-0.1.0", "switch_c-0.1.0"]
+    finally:
+        cpenv.deactivate()
+        for name in ["switch_a", "switch_b", "switch_c"]:
+            paths.rmtree(data_path("home", "modules", name + "-0.1.0"))
+
+    assert dict(os.environ) == original_env
+    assert cpenv.get_active_modules() == original_modules
+
+
+def test_incremental_activate(monkeypatch):
+    """Activate only merges the environments of modules that are not active"""
+
+    for name in ["incr_a", "incr_b"]:
+        cpenv.create(
+            where=data_path("home", "modules", name + "-0.1.0"),
+            name=name,
+            version="0.1.0",
+            environment={name.upper(): name},
+        )
+
+    combined = []
+    combine_modules = cpenv.Activator.combine_modules
+
+    def record_combine(self, modules):
+        combined.append([m.name for m in modules])
+        return combine_modules(self, modules)
+
+    monkeypatch.setattr(cpenv.Activator, "combine_modules", record_combine)
+
+    try:
+        cpenv.activate(["incr_a"])
+        modules = cpenv.activate(["incr_a", "incr_b"])
+        assert [m.name for m in modules] == ["incr_a", "incr_b"]
+        assert combined == [["incr_a"], ["incr_b"]]
+        assert os.environ["INCR_B"] == "incr_b"
+
+        active = os.environ["CPENV_ACTIVE_MODULES"].split(os.pathsep)
+        assert active[-2:] == ["incr_a-0.1.0", "incr_b-0.1.0"]
+
+        # Requirements satisfied by active modules are not resolved
+        monkeypatch.setattr(cpenv.api, "Resolver", None)
+        assert cpenv.activate(["incr_b", "incr_a-0.1.0"]) == modules[::-1]
+        assert len(combined) == 2
+    finally:
+        cpenv.deactivate()
+        for name in ["incr_a", "incr_b"]:
+            paths.rmtree(data_path("home", "modules", name + "-0.1.0"))
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+# Standard library imports
+import os
+import stat
+
+# Local imports
+import cpenv
+from cpenv import blobstore, paths
+from cpenv.blobstore import BlobStore
+
+from . import data_path
+from .utils import make_files
+
+
+def setup_module():
+    for version in ["1.0.0", "2.0.0"]:
+        module_path = data_path("blobs", "remote", "blobmod-" + version)
+        cpenv.create(where=module_path, name="blobmod", version=version)
+        make_files(os.path.join(module_path, "lib", "shared.py"), text="shared")
+        make_files(os.path.join(module_path, "lib", "version.py"), text=version)
+
+
+def teardown_module():
+    paths.rmtree(data_path("blobs"))
+    paths.rmtree(cpenv.get_cache_path("blobs"))
+
+
+def test_localize_links_shared_files(monkeypatch):
+    """Localized modules share identical files through the blob store"""
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Unexpected call.")
+
+    monkeypatch.setenv("CPENV_ENABLE_BLOB_STORE", "1")
+    remote = cpenv.RemoteRepo("remote", data_path("blobs", "remote"))
+    to_repo = cpenv.LocalRepo("local", data_path("blobs", "local"))
+    module_specs = [remote.find("blobmod-1.0.0")[0], remote.find("blobmod-2.0.0")[0]]
+
+    # Files are hashed while they are copied
+    with monkeypatch.context() as m:
+        m.setattr(blobstore, "hash_file", fail)
+        module_a, module_b = cpenv.Localizer(to_repo).localize(module_specs)
+
+    shared_a = os.path.join(module_a.path, "lib", "shared.py")
+    shared_b = os.path.join(module_b.path, "lib", "shared.py")
+    assert os.path.samefile(shared_a, shared_b)
+    assert os.stat(shared_a).st_nlink == 3
+    assert os.stat(os.path.join(module_a.path, "lib", "version.py")).st_nlink == 2
+    assert os.stat(module_a.config_path).st_nlink == 1
+
+    # Removing a module drops its references and removes its unused blobs
+    # without scanning the whole store
+    monkeypatch.setattr(BlobStore, "gc", fail)
+    to_repo.remove(to_repo.find("blobmod-1.0.0")[0])
+    assert os.stat(shared_b).st_nlink == 2
+    to_repo.remove(to_repo.find("blobmod-2.0.0")[0])
+    monkeypatch.undo()
+    assert BlobStore().gc() == (0, 0)
+    assert not any(files for _, _, files in os.walk(cpenv.get_cache_path("blobs")))
+
+
+def test_dedupe():
+    """Files in a folder are replaced by links to existing blobs"""
+
+    store = BlobStore(data_path("blobs", "store"))
+    folder_a = data_path("blobs", "dedupe_a")
+    folder_b = data_path("blobs", "dedupe_b")
+    file_a = os.path.join(folder_a, "a.txt")
+    file_b = os.path.join(folder_b, "b.txt")
+    make_files(file_a, file_b, text="a")
+
+    assert store.dedupe(folder_a) == 0
+    assert store.dedupe(folder_b) == 1
+    assert os.path.samefile(file_a, file_b)
+
+    paths.rmtree(folder_a)
+    assert store.gc() == (0, 0)
+    paths.rmtree(folder_b)
+    assert store.gc() == (1, 1)
+
+
+def test_clone_does_not_link_blobs(monkeypatch):
+    """Clones are writable copies that never link to blobs"""
+
+    monkeypatch.setenv("CPENV_ENABLE_BLOB_STORE", "1")
+    remote = cpenv.RemoteRepo("remote", data_path("blobs", "remote"))
+    to_repo = cpenv.LocalRepo("local", data_path("blobs", "local"))
+    module_spec = remote.find("blobmod-1.0.0")[0]
+    cpenv.Localizer(to_repo).localize([module_spec])
+
+    clone_path = data_path("blobs", "clone")
+    module = cpenv.api.clone("blobmod-1.0.0", from_repo=remote, where=clone_path)
+    shared = os.path.join(module.path, "lib", "shared.py")
+    assert os.stat(shared).st_nlink == 1
+    assert os.stat(shared).st_mode & stat.S_IWUSR
+
+    to_repo.remove(to_repo.find("blobmod-1.0.0")[0])
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+# Standard library imports
+import os
+
+# Local imports
+import cpenv
+from cpenv import catalog, paths
+
+from . import data_path
+from .utils import age_files
+
+
+def setup_module():
+    cpenv.create(
+        where=data_path("catalog", "modules", "catmod-0.1.0"),
+        name="catmod",
+        version="0.1.0",
+    )
+    cpenv.create(
+        where=data_path("catalog", "modules", "nestmod", "0.1.0"),
+        name="nestmod",
+        version="0.1.0",
+    )
+
+
+def teardown_module():
+    paths.rmtree(data_path("catalog"))
+
+
+def make_repo():
+    repo = cpenv.LocalRepo("catalog", data_path("catalog", "modules"), catalog=True)
+    repo.catalog = catalog.ModuleCatalog(repo, data_path("catalog", "catalog.json"))
+    return repo
+
+
+def test_catalog_list():
+    """ModuleCatalog lists modules and persists them to disk"""
+
+    repo = make_repo()
+    qual_names = set([spec.qual_name for spec in repo.list()])
+    assert qual_names == set(["catmod-0.1.0", "nestmod-0.1.0"])
+    assert os.path.isfile(data_path("catalog", "catalog.json"))
+
+
+def test_catalog_warm_list_reads_no_modules(monkeypatch):
+    """ModuleCatalog does not read module.yml files that are unchanged"""
+
+    age_files(data_path("catalog", "modules"))
+    make_repo().list()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("module.yml should not be read.")
+
+    monkeypatch.setattr(catalog, "read_module_spec", fail)
+    qual_names = set([spec.qual_name for spec in make_repo().list()])
+    assert qual_names == set(["catmod-0.1.0", "nestmod-0.1.0"])
+
+
+def test_catalog_invalidation():
+    """ModuleCatalog picks up added, modified and removed modules"""
+
+    age_files(data_path("catalog", "modules"))
+    make_repo().list()
+
+    # Add modules
+    cpenv.create(
+        where=data_path("catalog", "modules", "catmod-0.2.0"),
+        name="catmod",
+        version="0.2.0",
+    )
+    cpenv.create(
+        where=data_path("catalog", "modules", "nestmod", "0.2.0"),
+        name="nestmod",
+        version="0.2.0",
+    )
+    qual_names = set([spec.qual_name for spec in make_repo().list()])
+    assert "catmod-0.2.0" in qual_names
+    assert "nestmod-0.2.0" in qual_names
+
+    # Modify a module.yml in place
+    module_file = data_path("catalog", "modules", "catmod-0.2.0", "module.yml")
+    with open(module_file, "r") as f:
+        data = f.read()
+    with open(module_file, "w") as f:
+        f.write(data.replace("0.2.0", "0.3.0"))
+
+    qual_names = set([spec.qual_name for spec in make_repo().list()])
+    assert "catmod-0.3.0" in qual_names
+    assert "catmod-0.2.0" not in qual_names
+
+    # Remove modules
+    paths.rmtree(data_path("catalog", "modules", "catmod-0.2.0"))
+    paths.rmtree(data_path("catalog", "modules", "nestmod", "0.2.0"))
+    qual_names = set([spec.qual_name for spec in make_repo().list()])
+    assert qual_names == set(["catmod-0.1.0", "nestmod-0.1.0"])
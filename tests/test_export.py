@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+# Standard library imports
+import json
+import os
+import subprocess
+
+# Local imports
+import cpenv
+from cpenv import export, paths
+
+from . import data_path
+
+
+def setup_module():
+    cpenv.create(
+        where=data_path("home", "modules", "exportmod-0.1.0"),
+        name="exportmod",
+        version="0.1.0",
+        environment={
+            "EXPORT_VAR": "it's $MODULE",
+            "EXPORT_PATH": ["$MODULE/bin"],
+            "EXPORT_APPEND": {"append": "tail"},
+            "EXPORT_UNSET": {"unset": 1},
+        },
+    )
+    paths.ensure_path_exists(data_path("export"))
+
+
+def teardown_module():
+    paths.rmtree(data_path("home", "modules", "exportmod-0.1.0"))
+    paths.rmtree(data_path("export"))
+
+
+def test_export_bash():
+    """Exported bash scripts set the environment of a list of modules"""
+
+    path = data_path("export", "cpenv.sh")
+    cpenv.export_env(path, ["exportmod"])
+
+    module_path = data_path("home", "modules", "exportmod-0.1.0")
+    script = '. "$0" && echo "$EXPORT_VAR" && echo "$EXPORT_PATH"'
+    output = subprocess.check_output(["bash", "-c", script, path], env={})
+    assert output.decode("utf-8").splitlines() == [
+        "it's " + module_path,
+        module_path + "/bin",
+    ]
+
+    # Lists are prepended to the value in the sourcing shell
+    output = subprocess.check_output(
+        ["bash", "-c", script, path],
+        env={"EXPORT_PATH": "/opt/bin"},
+    )
+    assert output.decode("utf-8").splitlines()[1] == os.pathsep.join(
+        [module_path + "/bin", "/opt/bin"]
+    )
+
+    output = subprocess.check_output(
+        ["bash", "-c", '. "$0" && echo "$EXPORT_APPEND"', path],
+        env={"EXPORT_APPEND": "head"},
+    )
+    assert output.decode("utf-8").strip() == os.pathsep.join(["head", "tail"])
+
+    header = export.read_export_header(path)
+    assert header["requirements"] == ["exportmod"]
+    assert header["qual_names"] == ["exportmod-0.1.0"]
+
+
+def test_export_formats(monkeypatch):
+    """Exports do not depend on the environment they are written in"""
+
+    module = cpenv.Module(data_path("home", "modules", "exportmod-0.1.0"))
+    monkeypatch.setenv("EXPORT_VAR", "it's " + module.path)
+    monkeypatch.setenv("EXPORT_PATH", module.path + "/bin")
+    text = export.export_env([module], "json")
+
+    data = json.loads(text)
+    assert data["modules"] == [module.path]
+    assert data["set"] == {"EXPORT_VAR": "it's " + module.path}
+    assert data["unset"] == ["EXPORT_UNSET"]
+    assert data["prepend"] == {"EXPORT_PATH": [module.path + "/bin"]}
+    assert data["append"] == {
+        "CPENV_ACTIVE_MODULE_PATHS": [module.path],
+        "CPENV_ACTIVE_MODULES": ["exportmod-0.1.0"],
+        "EXPORT_APPEND": ["tail"],
+    }
+
+    lines = export.export_env([module], "bash").splitlines()
+    assert "unset EXPORT_UNSET" in lines
+    assert 'export EXPORT_APPEND="${EXPORT_APPEND:+$EXPORT_APPEND:}"\'tail\'' in lines
+
+    lines = export.export_env([module], "dotenv").splitlines()
+    assert 'EXPORT_VAR="it\'s %s"' % module.path in lines
+    value = os.pathsep.join([module.path + "/bin", "${EXPORT_PATH}"])
+    assert 'EXPORT_PATH="%s"' % value in lines
+
+    lines = export.export_env([module], "fish").splitlines()
+    assert "set -e EXPORT_UNSET" in lines
+    assert "set -gx EXPORT_VAR 'it\\'s %s'" % module.path in lines
+    assert "set -gx --path EXPORT_PATH '%s/bin' $EXPORT_PATH" % module.path in lines
+    assert "set -gx --path EXPORT_APPEND $EXPORT_APPEND 'tail'" in lines
+
+
+def test_export_is_stale():
+    """Exports are stale when their modules change"""
+
+    path = data_path("export", "cpenv.json")
+    cpenv.export_env(path, ["exportmod"])
+    assert not export.is_stale(path)
+    assert not export.is_stale(path, ["exportmod"])
+    assert export.is_stale(path, ["exportmod", "othermod"])
+
+    module_file = data_path("home", "modules", "exportmod-0.1.0", "module.yml")
+    with open(module_file, "a") as f:
+        f.write("\n# modified\n")
+
+    assert export.is_stale(path)
+    assert export.is_stale(data_path("export", "missing.sh"))
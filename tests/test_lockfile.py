@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+# Standard library imports
+import json
+
+# Third party imports
+import pytest
+
+# Local imports
+import cpenv
+from cpenv import paths
+from cpenv.resolver import ResolveError
+
+from . import data_path
+from .utils import make_files, make_mockgun
+
+
+def setup_module():
+    cpenv.create(
+        where=data_path("lock", "modules", "lockmod-1.0.0"),
+        name="lockmod",
+        version="1.0.0",
+        requires=["lockdep-1.0.0"],
+    )
+    cpenv.create(
+        where=data_path("lock", "modules", "lockdep-1.0.0"),
+        name="lockdep",
+        version="1.0.0",
+    )
+
+
+def teardown_module():
+    paths.rmtree(data_path("lock"))
+    paths.rmtree(data_path("mockgun"))
+
+
+def test_lockfile_roundtrip(monkeypatch):
+    """Activate modules from a lockfile without resolving requirements"""
+
+    repo = cpenv.LocalRepo("lock", data_path("lock", "modules"))
+    cpenv.add_repo(repo)
+    try:
+        lockfile = data_path("lock", "cpenv.lock")
+        locked = cpenv.lock(["lockmod"], lockfile)
+        assert [spec.qual_name for spec in locked] == ["lockdep-1.0.0", "lockmod-1.0.0"]
+
+        with open(lockfile, "r") as f:
+            data = json.load(f)
+        assert data["requirements"] == ["lockmod"]
+        assert data["modules"][1]["repo"] == "lock"
+
+        def fail(*args, **kwargs):
+            raise AssertionError("Repos should not be queried.")
+
+        monkeypatch.setattr(cpenv.LocalRepo, "find", fail)
+        monkeypatch.setattr(cpenv.LocalRepo, "list", fail)
+        module_specs = cpenv.load_lockfile(lockfile)
+        assert module_specs == locked
+    finally:
+        cpenv.remove_repo(repo)
+
+
+def test_lockfile_detects_changes():
+    """Loading a lockfile fails when a locked module changed"""
+
+    repo = cpenv.LocalRepo("lock", data_path("lock", "modules"))
+    cpenv.add_repo(repo)
+    try:
+        lockfile = data_path("lock", "changed.lock")
+        cpenv.lock(["lockdep"], lockfile)
+
+        module_file = data_path("lock", "modules", "lockdep-1.0.0", "module.yml")
+        with open(module_file, "a") as f:
+            f.write("\nrequires: [lockmod]\n")
+
+        with pytest.raises(ResolveError):
+            cpenv.load_lockfile(lockfile)
+    finally:
+        cpenv.remove_repo(repo)
+
+
+SG_MODULE_TEXT = """
+name: sgmod
+version: 1.0.0
+environment:
+    SGMOD: $MODULE
+"""
+
+
+def test_lockfile_matches_localized_shotgun_modules(monkeypatch):
+    """Modules locked from a ShotgunRepo are loaded from their local copies"""
+
+    sg = make_mockgun(data_path("mockgun"))
+    repo = cpenv.ShotgunRepo("sg", api=sg)
+    sg.create(
+        repo.module_entity,
+        {"code": "sgmod", "sg_version": "1.0.0", "sg_data": SG_MODULE_TEXT},
+    )
+    lockfile = data_path("lock", "sg.lock")
+    cpenv.lockfile.write_lockfile(lockfile, repo.find("sgmod-1.0.0"))
+
+    to_repo = cpenv.LocalRepo("home", data_path("lock", "home"))
+    local_path = to_repo.relative_path("sgmod-1.0.0")
+    make_files(paths.normalize(local_path, "module.yml"), text=SG_MODULE_TEXT)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Repos should not be queried.")
+
+    monkeypatch.setattr(cpenv.ShotgunRepo, "find", fail)
+    module_specs = cpenv.lockfile.load_lockfile(lockfile, [repo, to_repo])
+    assert [spec.path for spec in module_specs] == [paths.normalize(local_path)]
+    assert module_specs[0].repo is to_repo
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+# Standard library imports
+import os
+
+# Local imports
+import cpenv
+from cpenv import manifest, paths
+
+from . import data_path
+from .utils import make_files
+
+
+def setup_module():
+    for version, changed in [("1.0.0", "old"), ("2.0.0", "new")]:
+        module_path = data_path("delta", "src", "deltamod-" + version)
+        cpenv.create(where=module_path, name="deltamod", version=version)
+        make_files(
+            os.path.join(module_path, "lib", "a.py"),
+            os.path.join(module_path, "lib", "b.py"),
+            text="shared",
+        )
+        make_files(os.path.join(module_path, "lib", "changed.py"), text=changed)
+
+    remote = cpenv.RemoteRepo("remote", data_path("delta", "remote"))
+    for version in ["1.0.0", "2.0.0"]:
+        remote.upload(cpenv.Module(data_path("delta", "src", "deltamod-" + version)))
+
+
+def teardown_module():
+    paths.rmtree(data_path("delta"))
+
+
+def test_upload_writes_manifest():
+    """Modules uploaded to a LocalRepo get a manifest of their files"""
+
+    module_path = data_path("delta", "remote", "deltamod-1.0.0")
+    data = manifest.read_manifest(module_path)
+    assert sorted(data["files"]) == [
+        "lib/a.py",
+        "lib/b.py",
+        "lib/changed.py",
+        "module.yml",
+    ]
+
+    entry = data["files"]["lib/a.py"]
+    assert entry["size"] == len("shared")
+    assert manifest.is_unchanged(os.path.join(module_path, "lib", "a.py"), entry)
+
+
+def test_localize_copies_changed_files(monkeypatch):
+    """Only files that changed since a local version are copied from the repo"""
+
+    remote = cpenv.RemoteRepo("remote", data_path("delta", "remote"))
+    to_repo = cpenv.LocalRepo("local", data_path("delta", "local"))
+    localizer = cpenv.Localizer(to_repo)
+    localizer.localize([remote.find("deltamod-1.0.0")[0]])
+
+    copied = []
+    copy_file = paths.copy_file
+
+    def spy(src, dst, size=None):
+        copied.append(paths.normalize(src))
+        return copy_file(src, dst, size)
+
+    monkeypatch.setattr(paths, "copy_file", spy)
+    module = localizer.localize([remote.find("deltamod-2.0.0")[0]])[0]
+
+    remote_path = data_path("delta", "remote", "deltamod-2.0.0")
+    local_path = data_path("delta", "local", "deltamod-1.0.0")
+    from_remote = sorted(p for p in copied if p.startswith(remote_path))
+    from_local = sorted(p for p in copied if p.startswith(local_path))
+    assert from_remote == [
+        remote_path + "/.cpenv_manifest.json",
+        remote_path + "/lib/changed.py",
+        remote_path + "/module.yml",
+    ]
+    assert from_local == [local_path + "/lib/a.py", local_path + "/lib/b.py"]
+
+    with open(os.path.join(module.path, "lib", "changed.py")) as f:
+        assert f.read() == "new"
+    assert module.version.string == "2.0.0"
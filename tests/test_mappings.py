@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
 
+# Standard library imports
+import json
+
 # Local imports
 from cpenv import mappings
 from cpenv.compat import platform
@@ -263,3 +266,85 @@ def test_dict_to_env():
     }
     result = mappings.dict_to_env(data, pathsep=":")
     assert result == {"PATH": "X:Y:Z", "VAR": "VALUE"}
+
+
+def test_case_insensitive_set():
+    """CaseInsensitiveSet keeps insertion order and ignores case"""
+
+    values = mappings.CaseInsensitiveSet(["B", "a", "b"])
+    assert values == ["B", "a"]
+    assert "A" in values
+
+    values.prepend("C")
+    values.prepend("c")
+    values.append("A")
+    values.discard("b")
+    assert values == ["C", "a"]
+
+    # Remove ignores case like append and prepend
+    result = mappings.join_dicts({"A": ["X", "y"]}, {"A": {"remove": "x"}})
+    assert result == {"A": ["y"]}
+
+
+def test_custom_add_condition():
+    """A custom add_condition decides which values are added to lists"""
+
+    def case_sensitive(items, value):
+        return value not in items
+
+    result = mappings.join_dicts(
+        {"PATH": ["/a", "/b"]},
+        {"PATH": {"append": ["/A", "/b"]}},
+        add_condition=case_sensitive,
+    )
+    assert result == {"PATH": ["/a", "/b", "/A"]}
+
+
+def test_compile_dict():
+    """join_dicts accepts plans compiled by compile_dict"""
+
+    a = {"A": "0", "B": ["1"]}
+    b = {
+        "A": [{"remove": "0"}, {"append": ["1", "2"]}],
+        "B": {"prepend": ["2", "3"]},
+        "C": {"linux": "linux", "mac": "mac", "win": "win"},
+    }
+    plan = mappings.compile_dict(b)
+    assert isinstance(plan, tuple)
+    assert all(isinstance(op, mappings.Op) for op in plan)
+
+    expected = mappings.join_dicts(a, b)
+    assert mappings.join_dicts(a, plan) == expected
+
+    # Plans loaded from json contain lists rather than Ops
+    loaded = json.loads(json.dumps(plan))
+    assert mappings.join_dicts(a, loaded) == expected
+
+
+def test_env_delta():
+    """env_delta only changes and expands variables touched by env_dicts"""
+
+    env = {
+        "PATH": "/usr/bin:/bin",
+        "Other": "x",
+        "UNTOUCHED": "$NOT_EXPANDED",
+        "SELF": "/self",
+    }
+    data = {
+        "PATH": ["$TOOL_ROOT/bin"],
+        "TOOL_BIN": "${TOOL_ROOT}/bin",
+        "TOOL_ROOT": "/tools/$TOOL_NAME",
+        "TOOL_NAME": "tool",
+        "SELF": "$SELF:/extra",
+        "OTHER": "y",
+    }
+    set_vars, unset_vars = mappings.env_delta(data, env=env, pathsep=":")
+    assert set_vars == {
+        "PATH": "/tools/tool/bin:/usr/bin:/bin",
+        "TOOL_BIN": "/tools/tool/bin",
+        "TOOL_ROOT": "/tools/tool",
+        "TOOL_NAME": "tool",
+        "SELF": "/self:/extra",
+        "OTHER": "y",
+    }
+    assert unset_vars == ["Other"]
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+# Local imports
+from cpenv import module, paths
+
+from . import data_path
+from .utils import age_files, make_files
+
+
+def teardown_module():
+    paths.rmtree(data_path("header"))
+
+
+def test_read_module_header():
+    """Read name and version from the header of a module.yml"""
+
+    tests = [
+        ("name: 'my_module'\nversion: '0.1.0'\n", ("my_module", "0.1.0")),
+        ('name: "my_module"\nversion: "1.2"\n', ("my_module", "1.2")),
+        ("name: my_module # comment\nversion: 2.0.0\n", ("my_module", "2.0.0")),
+        ("# name: nope\nname: 'it''s'\nversion: '1'\n", ("it's", "1")),
+        ("environment:\n  name: nope\nname: ok\n", ("ok", None)),
+        ("name: $MODULE\nversion: '0.1.0'\n", (None, "0.1.0")),
+        ("name: &anchor my_module\nversion: '0.1.0'\n", (None, "0.1.0")),
+        ("description: 'no name or version'\n", (None, None)),
+    ]
+    module_file = data_path("header", "module.yml")
+    for text, expected in tests:
+        make_files(module_file, text=text)
+        assert module.read_module_header(module_file) == expected
+
+
+def test_read_module_spec_falls_back_to_config():
+    """read_module_spec uses the full config when the header is unreadable"""
+
+    module_path = data_path("header", "templated-0.2.0")
+    make_files(
+        paths.normalize(module_path, "module.yml"),
+        text="name: ${PLATFORM}_mod\nversion: '0.2.0'\n",
+    )
+    spec = module.read_module_spec(module_path, None)
+    assert spec.name.endswith("_mod")
+    assert "$" not in spec.name
+    assert spec.version.string == "0.2.0"
+
+
+def test_parse_requirement_is_memoized():
+    """Requirements are parsed once no matter how many specs they're matched to"""
+
+    specs = []
+    for i in range(1000):
+        name = "mod_%s" % "abcdefghij"[i % 10]
+        version = "%d.%d.0" % (i // 10, i % 10)
+        specs.append(
+            module.ModuleSpec(
+                name=name,
+                qual_name=name + "-" + version,
+                version=module.parse_version(version),
+                path=None,
+                repo=None,
+            )
+        )
+    requirements = ["mod_%s-%d.0.0" % ("abcdefghij"[i % 10], i) for i in range(100)]
+
+    module._parse_requirement.cache_clear()
+    for requirement in requirements:
+        module.best_match(requirement, specs)
+        for spec in specs:
+            module.is_exact_match(requirement, spec)
+            module.is_partial_match(requirement, spec)
+    assert module._parse_requirement.cache_info().misses == len(requirements)
+
+    requirement = module.parse_requirement("mod_a-1.0.0")
+    assert requirement == "mod_a-1.0.0"
+    assert requirement.name == "mod_a"
+    assert requirement.version == module.parse_version("1.0.0")
+    assert module.parse_requirement(requirement) is requirement
+
+
+def test_cached_config(monkeypatch):
+    """Modules for the same path share a config until module.yml changes"""
+
+    module_path = data_path("header", "cached-0.1.0")
+    module_file = paths.normalize(module_path, "module.yml")
+    make_files(module_file, text="name: cached\nversion: '0.1.0'\n")
+    age_files(module_path)
+    assert module.Module(module_path).config["name"] == "cached"
+
+    def fail(*args, **kwargs):
+        raise AssertionError("module.yml should not be read.")
+
+    with monkeypatch.context() as m:
+        m.setattr(module, "read_config", fail)
+        config = module.Module(module_path).config
+        assert config["version"] == "0.1.0"
+
+    # Configs are copied so changes do not leak into the cache
+    config["name"] = "changed"
+    assert module.Module(module_path).config["name"] == "cached"
+
+    make_files(module_file, text="name: recached\nversion: '0.1.0'\n")
+    assert module.Module(module_path).config["name"] == "recached"
+
+
+def test_config_cache_is_bounded(monkeypatch):
+    """The config cache keeps the most recently used entries"""
+
+    monkeypatch.setattr(module, "config_cache", module.LRUCache(maxsize=2))
+    module_files = []
+    for name in ["lru_a", "lru_b", "lru_c"]:
+        module_path = data_path("header", name + "-0.1.0")
+        module_file = paths.normalize(module_path, "module.yml")
+        make_files(module_file, text="name: %s\nversion: '0.1.0'\n" % name)
+        age_files(module_path)
+        module_files.append(module_file)
+        module.get_config_entry(module_file, {})
+
+    assert module_files[0] not in module.config_cache
+    assert module_files[2] in module.config_cache
+
+
+def test_plan_is_cached_with_config(monkeypatch):
+    """Modules for the same path share a compiled plan"""
+
+    module_path = data_path("header", "planned-0.1.0")
+    make_files(
+        paths.normalize(module_path, "module.yml"),
+        text="name: planned\nversion: '0.1.0'\nenvironment:\n  PLANNED: '1'\n",
+    )
+    age_files(module_path)
+    plan = module.Module(module_path).plan
+
+    def fail(*args, **kwargs):
+        raise AssertionError("The plan should not be compiled.")
+
+    monkeypatch.setattr(module.mappings, "compile_dict", fail)
+    assert module.Module(module_path).plan is plan
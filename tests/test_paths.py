@@ -1,5 +1,10 @@
 # -*- coding: utf-8 -*-
 
+# Standard library imports
+import json
+import os
+import time
+
 # Local imports
 from cpenv import paths
 
@@ -34,3 +39,72 @@ def test_exclusive_walk_includes_prebuilt_pyc():
     ]
 
     assert set(expected_files) == set(walked_files)
+
+
+def test_copy_folder():
+    """Copy a folder from a single scan using a pool of threads"""
+
+    src = data_path("paths_copy", "src")
+    dst = data_path("paths_copy", "dst")
+    make_files(
+        data_path("paths_copy/src/module.yml"),
+        data_path("paths_copy/src/bin/tool.py"),
+        data_path("paths_copy/src/lib/a/b/c.py"),
+        data_path("paths_copy/src/lib/a/b/c.pyc"),
+        data_path("paths_copy/src/.git/HEAD"),
+        text="data",
+    )
+    os.symlink(
+        data_path("paths_copy/src/module.yml"),
+        data_path("paths_copy/src/link.yml"),
+    )
+
+    try:
+        manifest = paths.get_folder_manifest(src)
+        assert manifest["size"] == 12
+        assert sorted(manifest["dirs"]) == [
+            os.path.join("bin"),
+            os.path.join("lib", "a", "b"),
+        ]
+
+        progress = []
+        paths.copy_folder(src, dst, manifest, progress.append, max_workers=4)
+        assert sum(progress) == 12
+
+        copied = []
+        for root, _, files in os.walk(dst):
+            copied.extend([os.path.relpath(os.path.join(root, f), dst) for f in files])
+        assert sorted(copied) == sorted([rel_path for rel_path, _ in manifest["files"]])
+
+        src_stat = os.stat(data_path("paths_copy/src/bin/tool.py"))
+        dst_stat = os.stat(data_path("paths_copy/dst/bin/tool.py"))
+        assert int(src_stat.st_mtime) == int(dst_stat.st_mtime)
+        with open(data_path("paths_copy/dst/lib/a/b/c.py")) as f:
+            assert f.read() == "data"
+    finally:
+        paths.rmtree(data_path("paths_copy"))
+
+
+def test_write_json():
+    """Atomically write a json file creating missing parent directories"""
+
+    path = data_path("paths_json", "a", "b.json")
+    try:
+        paths.write_json(path, {"key": "value"})
+        with open(path) as f:
+            assert json.load(f) == {"key": "value"}
+        assert os.listdir(data_path("paths_json", "a")) == ["b.json"]
+
+        paths.write_json(path, {"key": "other"})
+        with open(path) as f:
+            assert json.load(f) == {"key": "other"}
+    finally:
+        paths.rmtree(data_path("paths_json"))
+
+
+def test_is_racy():
+    """Recent mtimes are racy"""
+
+    now = time.time()
+    assert paths.is_racy(now)
+    assert not paths.is_racy(now - paths.racy_seconds - 1)
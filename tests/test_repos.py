@@ -2,12 +2,18 @@
 
 # Standard library imports
 import os
+import threading
+import time
+import tracemalloc
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+from socketserver import ThreadingMixIn
 
 # Local imports
 import cpenv
 from cpenv import paths
 
 from . import data_path
+from .utils import make_mockgun
 
 
 def setup_module():
@@ -70,6 +76,17 @@ def test_LocalRepo_list():
     assert expected_names == resolved_names
 
 
+def test_LocalRepo_list_skips_home_checks(monkeypatch):
+    """Listing a LocalRepo does not check home path permissions per module"""
+
+    def fail(*args, **kwargs):
+        raise AssertionError("is_writable should not be called.")
+
+    local_repo = cpenv.LocalRepo("test_modules", data_path("modules"))
+    monkeypatch.setattr(paths, "is_writable", fail)
+    assert len(local_repo.list()) == 5
+
+
 def test_LocalRepo_find():
     """Find modules in a LocalRepo"""
 
@@ -86,6 +103,30 @@ def test_LocalRepo_find():
         assert matches[0].version.string == result[1]
 
 
+def test_LocalRepo_find_uses_index():
+    """LocalRepo.find is answered from an index cleared by clear_cache"""
+
+    local_repo = cpenv.LocalRepo("test_modules", data_path("modules"))
+    versions = [spec.version.string for spec in local_repo.find("fresh")]
+    assert versions == ["0.2.0", "0.1.0"]
+
+    cpenv.create(
+        where=data_path("modules", "fresh/0.3.0"),
+        name="fresh",
+        version="0.3.0",
+        description="A test module",
+    )
+
+    # Index is cached until clear_cache is called
+    assert local_repo.find("fresh")[0].version.string == "0.2.0"
+
+    local_repo.clear_cache()
+    assert local_repo.find("fresh")[0].version.string == "0.3.0"
+    assert local_repo.find("fresh-0.1.0")[0].version.string == "0.1.0"
+
+    paths.rmtree(data_path("modules", "fresh", "0.3.0"))
+
+
 def test_LocalRepo_download():
     """Download from a LocalRepo"""
 
@@ -156,3 +197,144 @@ def test_localize_from_RemoteRepo_to_LocalRepo():
     assert local_spec.path == data_path("local", "modules", "remote_module-0.1.0")
     assert local_spec.version.string == "0.1.0"
     assert os.path.isdir(data_path("local", "modules", "remote_module-0.1.0"))
+
+
+class EventRepo(cpenv.Repo):
+    """A Repo whose find method waits for an event before returning."""
+
+    def __init__(self, name, event=None):
+        super(EventRepo, self).__init__(name)
+        self.event = event
+        self.queries = []
+
+    def find(self, requirement):
+        if self.event:
+            assert self.event.wait(5)
+        self.queries.append(requirement)
+        return [self.name]
+
+
+def test_RepoQuery_keeps_priority_order():
+    """RepoQuery queries repos concurrently and yields results in order"""
+
+    event = threading.Event()
+    slow = EventRepo("slow", event)
+    fast = EventRepo("fast")
+
+    query = cpenv.RepoQuery([slow, fast], "find", "testmod")
+    # The fast repo answers while the slow repo is still waiting
+    for _ in range(100):
+        if fast.queries:
+            break
+        time.sleep(0.01)
+    assert fast.queries == ["testmod"]
+    assert slow.queries == []
+
+    event.set()
+    assert query.results() == [["slow"], ["fast"]]
+
+
+def test_RepoQuery_disabled(monkeypatch):
+    """RepoQuery queries repos lazily and in order when fan-out is disabled"""
+
+    monkeypatch.setenv("CPENV_DISABLE_FANOUT", "1")
+    repo_a = EventRepo("a")
+    repo_b = EventRepo("b")
+    for repo, result in cpenv.RepoQuery([repo_a, repo_b], "find", "testmod"):
+        break
+
+    assert repo_a.queries == ["testmod"]
+    assert repo_b.queries == []
+
+
+def test_ShotgunRepo_find_many():
+    """ShotgunRepo.find_many matches find using a single query"""
+
+    sg = make_mockgun(data_path("mockgun"))
+    repo = cpenv.ShotgunRepo("sg", api=sg)
+    for name, version in [("sgmod", "1.0.0"), ("sgmod", "2.0.0"), ("other", "1.0.0")]:
+        sg.create(repo.module_entity, {"code": name, "sg_version": version})
+
+    requirements = [
+        "sgmod",
+        "sgmod-1.0.0",
+        "sgmod-1.5.0",
+        "other",
+        "missing",
+        "sgmod>=1.5,<3",
+    ]
+    sg.finds = 0
+    results = repo.find_many(requirements)
+    assert sg.finds == 1
+
+    repo.clear_cache()
+    assert results == [repo.find(requirement) for requirement in requirements]
+    assert [spec.qual_name for spec in results[1]] == ["sgmod-1.0.0"]
+    assert results[4] == []
+    assert [spec.qual_name for spec in results[5]] == ["sgmod-2.0.0"]
+
+    # Batches larger than the cache do not evict cached results
+    cached = repo.find("other")
+    repo.find_many(["missing_%d" % i for i in range(repo.cache.maxsize + 1)])
+    sg.finds = 0
+    assert repo.find("other") is cached
+    assert sg.finds == 0
+
+
+def test_ShotgunRepo_download_streams_archive():
+    """ShotgunRepo.download writes archives to disk with bounded memory"""
+
+    module_path = data_path("sg_download", "src", "bigmod-1.0.0")
+    cpenv.create(where=module_path, name="bigmod", version="1.0.0")
+    payload = os.urandom(8 * 1024 * 1024)
+    with open(os.path.join(module_path, "payload.bin"), "wb") as f:
+        f.write(payload)
+    archive_path = data_path("sg_download", "www", "bigmod-1.0.0.zip")
+    paths.zip_folder(module_path, archive_path)
+
+    class Handler(SimpleHTTPRequestHandler):
+        def translate_path(self, path):
+            return data_path("sg_download", "www", path.lstrip("/"))
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+
+    server = Server(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    sg = make_mockgun(data_path("mockgun"))
+    repo = cpenv.ShotgunRepo("sg", api=sg)
+    sg.create(
+        repo.module_entity,
+        {
+            "code": "bigmod",
+            "sg_version": "1.0.0",
+            "sg_archive": {
+                "url": "http://127.0.0.1:%d/bigmod-1.0.0.zip" % server.server_port,
+                "name": "bigmod-1.0.0.zip",
+            },
+            "sg_archive_size": str(os.path.getsize(archive_path)),
+        },
+    )
+
+    try:
+        where = data_path("sg_download", "dst", "bigmod-1.0.0")
+        tracemalloc.start()
+        module = repo.download(repo.find("bigmod")[0], where)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        assert module.qual_name == "bigmod-1.0.0"
+        with open(os.path.join(where, "payload.bin"), "rb") as f:
+            assert f.read() == payload
+        assert peak < 4 * 1024 * 1024
+        assert os.listdir(cpenv.get_cache_path("downloads")) == []
+    finally:
+        server.shutdown()
+        server.server_close()
+        paths.rmtree(data_path("sg_download"))
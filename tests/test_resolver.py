@@ -2,13 +2,15 @@
 
 # Standard library imports
 import os
+import threading
+import time
 
 # Third party imports
 import pytest
 
 # Local imports
 import cpenv
-from cpenv import paths
+from cpenv import paths, resolver
 
 from . import data_path
 from .utils import cwd, make_files
@@ -71,11 +73,29 @@ def setup_module():
     )
     make_files(os.path.join(project_path, "shot_file.txt"), text="")
 
+    deps = [
+        ("app", "1.0.0", ["lib-1.0.0", "tool"]),
+        ("app", "2.0.0", ["lib-2.0.0", "missing_dep"]),
+        ("tool", "1.0.0", ["lib-2.0.0"]),
+        ("lib", "1.0.0", []),
+        ("lib", "2.0.0", []),
+        ("lib", "3.0.0", []),
+        ("greedy", "1.0.0", ["lib-9.0.0"]),
+    ]
+    for name, version, requires in deps:
+        cpenv.create(
+            where=data_path("deps", name + "-" + version),
+            name=name,
+            version=version,
+            requires=requires,
+        )
+
 
 def teardown_module():
     paths.rmtree(data_path("modules"))
     paths.rmtree(data_path("home"))
     paths.rmtree(data_path("not_home"))
+    paths.rmtree(data_path("deps"))
 
 
 def test_resolve_home():
@@ -215,3 +235,161 @@ def test_ignore_unresolved():
         ignore_unresolved=True,
     )
     assert len(resolved) == 1
+
+
+def test_resolve_requires():
+    """Resolve the requires of modules transitively"""
+
+    r = cpenv.Resolver([cpenv.LocalRepo("deps", data_path("deps"))])
+    resolved = r.resolve(["app-1.0.0"])
+
+    # lib-1.0.0 conflicts with tool's requirement so lib-2.0.0 is chosen
+    qual_names = [spec.qual_name for spec in resolved]
+    assert qual_names == ["lib-2.0.0", "tool-1.0.0", "app-1.0.0"]
+
+    # Requires can be ignored
+    r = cpenv.Resolver([cpenv.LocalRepo("deps", data_path("deps"))], False)
+    resolved = r.resolve(["app-1.0.0"])
+    assert [spec.qual_name for spec in resolved] == ["app-1.0.0"]
+
+
+def test_resolve_requires_unresolved():
+    """Raise cpenv.ResolveError when requires can not be resolved"""
+
+    r = cpenv.Resolver([cpenv.LocalRepo("deps", data_path("deps"))])
+
+    with pytest.raises(cpenv.ResolveError):
+        r.resolve(["app-2.0.0"])
+
+    with pytest.raises(cpenv.ResolveError):
+        r.resolve(["greedy"])
+
+    resolved = r.resolve(["app-2.0.0"], ignore_unresolved=True)
+    qual_names = [spec.qual_name for spec in resolved]
+    assert qual_names == ["lib-2.0.0", "app-2.0.0"]
+
+
+def test_resolve_requires_queries_repos_once_per_name():
+    """Resolver queries each repo at most once per module name"""
+
+    class CountingRepo(cpenv.LocalRepo):
+        def __init__(self, *args, **kwargs):
+            super(CountingRepo, self).__init__(*args, **kwargs)
+            self.queries = []
+
+        def find(self, requirement):
+            self.queries.append(requirement)
+            return super(CountingRepo, self).find(requirement)
+
+    repo = CountingRepo("deps", data_path("deps"))
+    cpenv.Resolver([repo]).resolve(["app-1.0.0", "tool", "lib"])
+    assert sorted(repo.queries) == ["app", "lib", "tool"]
+
+
+def test_resolve_version_ranges():
+    """Resolve requirements with version ranges"""
+
+    r = cpenv.Resolver([cpenv.LocalRepo("deps", data_path("deps"))])
+
+    def resolve(*requirements):
+        return [spec.qual_name for spec in r.resolve(list(requirements))]
+
+    assert resolve("lib>=1.0,<3") == ["lib-2.0.0"]
+    assert resolve("lib~=1.0") == ["lib-1.0.0"]
+    assert resolve("lib!=3.0.0") == ["lib-2.0.0"]
+    assert resolve("lib==1.0.0") == ["lib-1.0.0"]
+    assert resolve("lib<3", "tool") == ["lib-2.0.0", "tool-1.0.0"]
+
+    with pytest.raises(cpenv.ResolveError):
+        resolve("lib>3")
+
+    with pytest.raises(cpenv.ResolveError):
+        resolve("lib<2", "tool")
+
+    with pytest.raises(cpenv.ResolveError):
+        resolve("lib>=not_a_version")
+
+
+def test_resolve_ignores_missing_requires_of_abandoned_branches():
+    """Missing requires of candidates that were backtracked are not reported"""
+
+    deps = [
+        ("app", "1.0.0", []),
+        ("app", "2.0.0", ["missing_dep", "lib>=3"]),
+        ("zzz", "1.0.0", ["lib<2"]),
+        ("lib", "1.0.0", []),
+        ("lib", "3.0.0", []),
+    ]
+    for name, version, requires in deps:
+        cpenv.create(
+            where=data_path("deps_missing", name + "-" + version),
+            name=name,
+            version=version,
+            requires=requires,
+        )
+
+    try:
+        r = cpenv.Resolver([cpenv.LocalRepo("deps", data_path("deps_missing"))])
+        qual_names = [spec.qual_name for spec in r.resolve(["app", "zzz"])]
+        assert qual_names == ["app-1.0.0", "lib-1.0.0", "zzz-1.0.0"]
+    finally:
+        paths.rmtree(data_path("deps_missing"))
+
+
+def test_localize_concurrently():
+    """Localizer downloads modules concurrently up to Repo.max_downloads"""
+
+    class SlowRepo(cpenv.RemoteRepo):
+        def __init__(self, *args, **kwargs):
+            super(SlowRepo, self).__init__(*args, **kwargs)
+            self.lock = threading.Lock()
+            self.active = 0
+            self.max_active = 0
+
+        def download(self, module_spec, where, overwrite=False):
+            with self.lock:
+                self.active += 1
+                self.max_active = max(self.max_active, self.active)
+            time.sleep(0.1)
+            try:
+                return super(SlowRepo, self).download(module_spec, where, overwrite)
+            finally:
+                with self.lock:
+                    self.active -= 1
+
+    requirements = ["lib-1.0.0", "lib-2.0.0", "lib-3.0.0", "tool-1.0.0"]
+    for max_downloads in (1, 4):
+        repo = SlowRepo("slow", data_path("deps"))
+        repo.max_downloads = max_downloads
+        to_repo = cpenv.LocalRepo("to", data_path("localized", str(max_downloads)))
+        module_specs = [repo.find(r)[0] for r in requirements]
+
+        localizer = cpenv.Localizer(to_repo, max_workers=4)
+        modules = localizer.localize(module_specs)
+
+        assert [m.qual_name for m in modules] == requirements
+        assert all(m.path.startswith(to_repo.path) for m in modules)
+        assert repo.max_active == max_downloads
+
+        # Localized modules are not downloaded again
+        assert localizer.localize(module_specs) == modules
+        assert repo.max_active == max_downloads
+
+    paths.rmtree(data_path("localized"))
+
+
+def test_localize_releases_thread_locks():
+    """Localizer does not keep thread locks once localization finishes"""
+
+    repo = cpenv.RemoteRepo("remote", data_path("deps"))
+    to_repo = cpenv.LocalRepo("to", data_path("localized_locks"))
+    module_specs = [repo.find(r)[0] for r in ["lib-1.0.0", "tool-1.0.0"]]
+
+    try:
+        cpenv.Localizer(to_repo, max_workers=4).localize(module_specs)
+        keys = list(resolver._thread_locks.keys())
+        assert to_repo not in keys
+        assert ("to", "lib-1.0.0") not in keys
+        assert ("to", "tool-1.0.0") not in keys
+    finally:
+        paths.rmtree(data_path("localized_locks"))
@@ -4,7 +4,7 @@
 import pytest
 
 # Local imports
-from cpenv.versions import ParseError, parse_version
+from cpenv.versions import ParseError, parse_version, parse_version_range
 
 
 def test_parse_version():
@@ -169,3 +169,53 @@ def test_compare_fourver():
     version_objects = [parse_version(v) for v in version_strings]
     ordered_versions = [v.string for v in sorted(version_objects)]
     assert ordered_versions == expected_order
+
+
+def test_version_sort_key():
+    """Versions are interned and ordered by a precomputed sort key"""
+
+    assert parse_version("module-1.2.3") is parse_version("module-1.2.3")
+
+    # Numeric prerelease > no prerelease > string prerelease
+    ordered = [
+        parse_version("1.0.0-alpha"),
+        parse_version("1.0.0-beta"),
+        parse_version("1.0.0+build"),
+        parse_version("1.0.0"),
+        parse_version("1.0.0.1-build"),
+        parse_version("1.0.0.1"),
+        parse_version("1.0.0.2"),
+    ]
+    assert sorted(reversed(ordered)) == ordered
+    assert sorted(reversed(ordered), key=lambda v: v.sort_key) == ordered
+    assert ordered[0]._replace(prerelease=None).sort_key == ordered[3].sort_key
+    assert parse_version("1.0.0.1") >= parse_version("1.0.0.1-build")
+    assert parse_version("1.0.0-alpha") <= parse_version("1.0.0")
+
+
+def test_version_range():
+    """VersionRange matches versions and bisects sorted sort keys"""
+
+    strings = ["1.0.0", "1.4", "1.4.2", "1.9.0", "2.0.0-beta", "2.0.0", "3.0.0"]
+    versions = [parse_version(string) for string in strings]
+    keys = [version.sort_key for version in versions]
+
+    cases = [
+        (">=1.4,<2", ["1.4", "1.4.2", "1.9.0"]),
+        ("~=1.4", ["1.4", "1.4.2", "1.9.0"]),
+        ("~=1.4.0", ["1.4", "1.4.2"]),
+        ("!=1.4.2", [s for s in strings if s != "1.4.2"]),
+        ("==2.0.0", ["2.0.0"]),
+        (">2.0.0-beta,<=3", ["2.0.0", "3.0.0"]),
+        ("<1", []),
+    ]
+    for string, expected in cases:
+        version_range = parse_version_range(string)
+        start, stop = version_range.bounds(keys)
+        in_bounds = versions[start:stop]
+        in_range = [v.string for v in in_bounds if version_range.contains(v)]
+        assert in_range == expected, string
+        assert in_range == [v.string for v in versions if version_range.contains(v)]
+
+    with pytest.raises(ParseError):
+        parse_version_range(">=1.0,2.0")
@@ -2,10 +2,12 @@
 
 # Standard library imports
 import os
+import pickle
 from contextlib import contextmanager
 
 # Local imports
 import cpenv
+from cpenv.vendor.shotgun_api3.lib import mockgun
 
 
 @contextmanager
@@ -30,6 +32,15 @@ def touch(filepath):
         os.utime(filepath, None)
 
 
+def age_files(root, seconds=60):
+    """Backdate mtimes so mtime based caches consider them trustworthy."""
+
+    for base, subdirs, files in os.walk(root):
+        for name in [base] + [os.path.join(base, f) for f in files]:
+            stat = os.stat(name)
+            os.utime(name, (stat.st_atime, stat.st_mtime - seconds))
+
+
 def make_files(*filepaths, **kwargs):
     data = kwargs.get("text", None)
 
@@ -46,3 +57,45 @@ def make_files(*filepaths, **kwargs):
         else:
             with open(filepath, "w") as f:
                 f.write(data)
+
+
+def make_mockgun(where, module_entity="CustomNonProjectEntity01"):
+    """Create a Mockgun instance with a minimal schema for a ShotgunRepo."""
+
+    def field(data_type):
+        return {
+            "data_type": {"value": data_type},
+            "properties": {"default_value": {"value": None}},
+        }
+
+    text_fields = [
+        "code",
+        "sg_version",
+        "description",
+        "sg_author",
+        "sg_email",
+        "sg_data",
+        "sg_archive_size",
+    ]
+    module_schema = dict([(name, field("text")) for name in text_fields])
+    module_schema["sg_archive"] = field("url")
+    schema = {
+        module_entity: module_schema,
+        "EventLogEntry": {
+            "event_type": field("text"),
+            "description": field("text"),
+        },
+    }
+    schema_entity = dict([(name, {"name": {"value": name}}) for name in schema])
+
+    schema_path = os.path.join(where, "schema.pickle")
+    schema_entity_path = os.path.join(where, "schema_entity.pickle")
+    if not os.path.isdir(where):
+        os.makedirs(where)
+    with open(schema_path, "wb") as f:
+        pickle.dump(schema, f)
+    with open(schema_entity_path, "wb") as f:
+        pickle.dump(schema_entity, f)
+
+    mockgun.Shotgun.set_schema_paths(schema_path, schema_entity_path)
+    return mockgun.Shotgun("https://mockgun.cpenv.dev")